@@ -0,0 +1,368 @@
+"""Throughput and memory benchmarks of the compiler, checked against baselines.
+
+Usage:
+    python src/benchmark.py --lines 1000 100000 --baseline tests/benchmark_baseline.json
+    python src/benchmark.py --lines 1000 100000 --baseline my_machine.json --update
+
+Each size is a score from scoregen, measured phase by phase:
+
+- lex: tokens per second through the PLY lexer alone;
+- fast_lex: the same through lexer.FastLexer;
+- parse: lines per second through parse_symphony_lang, lexing included;
+- note_lookup: note spellings per second through note_to_midi_number;
+- generate: MIDI events per second through generate_midi(fast=True);
+- mido_generate: the same through the mido encoder (fast=False);
+- compact_generate: the same with compact=True and velocity-0 note-offs,
+  as symphonyc --compact writes; generate_output_bytes and
+  compact_generate_output_bytes are the sizes of the two files;
+- render: audio frames per second through synth.Synthesizer, so the
+  realtime factor is the rate over synth.SAMPLE_RATE; only measured up to
+  RENDER_LIMIT lines, as the audio is long, and only with NumPy;
+- timeline: events per second through timeline_from_composition, then
+  played back with Timeline.advance one 60 Hz frame at a time;
+- edit: live-editing updates per second through IncrementalCompiler, each
+  an update() with the whole text and a compile(), as the editor does;
+- visualizer: timeline events per second through the editor's Visualizer,
+  redrawn every 8 events;
+- highlight: keystrokes per second in an editor holding the score, each
+  rehighlighting the visible lines;
+- end_to_end: lines per second from score lines to a MIDI file on disk,
+  through the streaming compiler, so it runs at any size;
+- startup: seconds to import parser, and to import it and parse a first
+  score, in a fresh interpreter (the best of --startup-runs). It does not
+  depend on the score, so it is measured once per run, reported on a line
+  of its own and kept under "startup" in the baseline rather than a size.
+
+The visualizer and highlight phases need Tk and a display, and are left
+out without them. Unless --no-memory is given, each phase is run once more
+under tracemalloc for its peak memory. The phases that hold the whole score
+are skipped above --in-memory-limit lines. One JSON line is printed for
+startup, then one per size. Metrics that fall short of the baseline by more than --threshold are
+listed as regressions, and the exit status is 1 if there are any; --update
+records the results as the new baseline instead. Baselines only mean
+something on the machine that recorded them.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+src_dir = Path(__file__).parent
+if str(src_dir) not in sys.path:
+    sys.path.insert(0, str(src_dir))
+
+from incremental import IncrementalCompiler
+from lexer import FastLexer, lexer, tokenize
+from midi_generator import generate_midi, iter_events, note_to_midi_number
+from parser import parse_symphony_lang
+from scoregen import generate_lines, generate_score, parse_mix
+from streaming import compile_stream
+from timeline import timeline_from_composition
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_THRESHOLD = 0.25
+IN_MEMORY_LIMIT = 1000000
+STARTUP_RUNS = 20
+# Where the startup metrics are kept in results and baselines, beside the sizes.
+STARTUP = 'startup'
+RENDER_LIMIT = 10000
+
+# Rates regress when they drop, sizes and times when they grow.
+RATE_SUFFIX = '_per_s'
+BYTES_SUFFIX = '_bytes'
+
+def _measure(function, repeat, memory):
+    """Runs function; returns its result, best time of repeat runs and peak traced bytes (or None)."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            function()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result, best, peak
+
+def _lex(text, lexer_instance):
+    lexer_instance.input(text)
+    count = 0
+    for _ in iter(lexer_instance.token, None):
+        count += 1
+    return count
+
+def _lookup_notes(notes):
+    for note in notes:
+        note_to_midi_number(note)
+
+def _render(composition):
+    from synth import Synthesizer, composition_frames
+    return sum(len(chunk) for chunk in Synthesizer().render(composition_frames(composition)))
+
+def _play_timeline(composition):
+    timeline = timeline_from_composition(composition, compact=True)
+    index = 0
+    frame = 1 / 60
+    for frame_number in range(int(timeline.duration / frame) + 2):
+        index = timeline.advance(index, frame_number * frame)
+    return index
+
+def _tk_root():
+    """Returns a hidden Tk root for the GUI phases, or None without Tk or a display."""
+    try:
+        import tkinter
+    except ImportError:
+        return None
+    try:
+        root = tkinter.Tk()
+    except tkinter.TclError:
+        return None
+    root.withdraw()
+    # The gui package imports pygame, whose greeting would land in the JSON output.
+    os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+    return root
+
+def _visualize(root, events):
+    from gui.visualizer import Visualizer
+    visualizer = Visualizer(root)
+    for start in range(0, len(events), 8):
+        visualizer.apply_events(events[start:start + 8])
+        visualizer.draw_bar_chart()
+    visualizer.visualization_canvas.destroy()
+
+KEYSTROKES = 50
+
+def _highlighted_editor(root, text):
+    import tkinter
+    from gui.highlighter import SyntaxHighlighter
+    # Shown, as only the lines in view are highlighted.
+    root.deiconify()
+    root.geometry('400x300')
+    editor = tkinter.Text(root, height=20)
+    editor.pack()
+    highlighter = SyntaxHighlighter(editor)
+    editor.insert('1.0', text)
+    root.update()
+    return editor, highlighter
+
+def _type(editor, highlighter):
+    line = highlighter.visible_lines()[5]
+    for keystroke in range(KEYSTROKES):
+        editor.insert(f'{line}.0', 'E4 qn\n' if keystroke % 10 == 0 else 'C')
+        highlighter.highlight_visible()
+    return KEYSTROKES
+
+def _gui_phases(text, composition, repeat, memory, record):
+    root = _tk_root()
+    if root is None:
+        return
+    try:
+        events = timeline_from_composition(composition, compact=True).events
+        _, seconds, peak = _measure(lambda: _visualize(root, events), repeat, memory)
+        record('visualizer', 'events', len(events), seconds, peak)
+        editor, highlighter = _highlighted_editor(root, text)
+        keystrokes, seconds, peak = _measure(lambda: _type(editor, highlighter), repeat, memory)
+        record('highlight', 'keystrokes', keystrokes, seconds, peak)
+    finally:
+        root.destroy()
+
+EDITS = 50
+
+def _edit(compiler, lines):
+    # Changes a line and changes it back, like typing and undoing.
+    rng = random.Random(0)
+    for _ in range(EDITS):
+        index = rng.randrange(1, len(lines))
+        original = lines[index]
+        for line in (original + ' ', original):
+            lines[index] = line
+            compiler.update('\n'.join(lines))
+            compiler.compile()
+    return 2 * EDITS
+
+def _end_to_end(lines, seed, mix):
+    with tempfile.TemporaryFile() as output:
+        compile_stream((line + '\n' for line in generate_lines(lines, seed, mix)), output)
+
+_STARTUP_SCRIPT = """import time
+start = time.perf_counter()
+import parser
+imported = time.perf_counter()
+parser.parse_symphony_lang('tempo=120\\nC4 qn')
+print(imported - start, time.perf_counter() - start)
+"""
+
+def startup(runs=STARTUP_RUNS):
+    """Times importing parser, and that plus a first parse, in fresh interpreters; returns the best of runs."""
+    best = None
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', _STARTUP_SCRIPT], capture_output=True, text=True, check=True,
+                                env={**os.environ, 'PYTHONPATH': str(src_dir)}).stdout
+        times = [float(value) for value in output.split()]
+        best = times if best is None else [min(a, b) for a, b in zip(best, times)]
+    return {'startup_import_seconds': round(best[0], 6), 'startup_first_parse_seconds': round(best[1], 6)}
+
+def benchmark(lines, seed=0, mix=None, repeat=3, memory=True, in_memory_limit=IN_MEMORY_LIMIT):
+    """Measures every phase but startup on a generated score of lines lines; returns {metric: value}."""
+    results = {}
+
+    def record(phase, unit, count, seconds, peak):
+        results[f'{phase}_{unit}{RATE_SUFFIX}'] = round(count / seconds, 1) if seconds else float('inf')
+        if peak is not None:
+            results[f'{phase}_peak{BYTES_SUFFIX}'] = peak
+
+    if lines <= in_memory_limit:
+        text = generate_score(lines, seed, mix)
+        tokens, seconds, peak = _measure(lambda: _lex(text, lexer.clone()), repeat, memory)
+        record('lex', 'tokens', tokens, seconds, peak)
+        tokens, seconds, peak = _measure(lambda: _lex(text, FastLexer()), repeat, memory)
+        record('fast_lex', 'tokens', tokens, seconds, peak)
+        composition, seconds, peak = _measure(lambda: parse_symphony_lang(text), repeat, memory)
+        record('parse', 'lines', lines, seconds, peak)
+        compiler = IncrementalCompiler()
+        compiler.update(text)
+        score_lines = text.split('\n')
+        edits, seconds, peak = _measure(lambda: _edit(compiler, score_lines), repeat, memory)
+        record('edit', 'edits', edits, seconds, peak)
+        del compiler, score_lines
+        _gui_phases(text, composition, repeat, memory, record)
+        notes = [token.value for token in tokenize(text) if token.type == 'NOTE']
+        del text
+        _, seconds, peak = _measure(lambda: _lookup_notes(notes), repeat, memory)
+        record('note_lookup', 'notes', len(notes), seconds, peak)
+        del notes
+        events = sum(1 for _ in iter_events(composition))
+        midi_data, seconds, peak = _measure(lambda: generate_midi(composition, fast=True), repeat, memory)
+        record('generate', 'events', events, seconds, peak)
+        results['generate_output_bytes'] = len(midi_data)
+        _, seconds, peak = _measure(lambda: generate_midi(composition, fast=False), repeat, memory)
+        record('mido_generate', 'events', events, seconds, peak)
+        midi_data, seconds, peak = _measure(
+            lambda: generate_midi(composition, fast=True, compact=True, velocity_zero_note_offs=True), repeat, memory)
+        record('compact_generate', 'events', events, seconds, peak)
+        results['compact_generate_output_bytes'] = len(midi_data)
+        del midi_data
+        if lines <= RENDER_LIMIT and importlib.util.find_spec('numpy') is not None:
+            frames, seconds, peak = _measure(lambda: _render(composition), repeat, memory)
+            record('render', 'frames', frames, seconds, peak)
+        played, seconds, peak = _measure(lambda: _play_timeline(composition), repeat, memory)
+        record('timeline', 'events', played, seconds, peak)
+        del composition
+    _, seconds, peak = _measure(lambda: _end_to_end(lines, seed, mix), repeat, memory)
+    record('end_to_end', 'lines', lines, seconds, peak)
+    return results
+
+def _format(value):
+    return f"{value:,.0f}" if abs(value) >= 10 else f"{value:.3g}"
+
+def find_regressions(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Lists the metrics in results that are worse than in baseline by more than threshold.
+
+    Both map size (as a string, as in JSON), or STARTUP, to {metric: value};
+    metrics missing from either side are not compared.
+    """
+    regressions = []
+    for size, metrics in results.items():
+        where = size if size == STARTUP else f"{size} lines"
+        for name, value in metrics.items():
+            expected = baseline.get(size, {}).get(name)
+            if expected is None:
+                continue
+            if name.endswith(RATE_SUFFIX):
+                worse = value < expected * (1 - threshold)
+            else:
+                worse = value > expected * (1 + threshold)
+            if worse:
+                change = (value - expected) / expected if expected else float('inf')
+                regressions.append(f"{where}: {name} {_format(value)} vs baseline {_format(expected)} ({change:+.0%})")
+    return regressions
+
+def load_baseline(path):
+    try:
+        with open(path, 'r') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+def run(sizes=DEFAULT_SIZES, seed=0, mix=None, repeat=3, memory=True, baseline_file=None, update=False,
+        threshold=DEFAULT_THRESHOLD, in_memory_limit=IN_MEMORY_LIMIT, startup_runs=STARTUP_RUNS, out=sys.stdout):
+    """Benchmarks startup and each size and checks or updates the baseline; returns the number of regressions.
+
+    startup_runs=0 skips the startup phase.
+
+    A baseline recorded with a different seed or mix is not compared with
+    and raises ValueError.
+    """
+    config = {'seed': seed, 'mix': mix}
+    stored = load_baseline(baseline_file) if baseline_file else None
+    if stored is not None and stored['config'] != config and not update:
+        raise ValueError(f"Baseline {baseline_file} was recorded for {stored['config']}, not {config}")
+    baseline = stored['results'] if stored is not None and stored['config'] == config else {}
+
+    results = {}
+    regressions = []
+
+    def report(key, fields):
+        if not update:
+            fields['regressions'] = find_regressions({key: results[key]}, baseline, threshold)
+            regressions.extend(fields['regressions'])
+        out.write(json.dumps(fields) + '\n')
+        out.flush()
+
+    if startup_runs:
+        results[STARTUP] = startup(startup_runs)
+        report(STARTUP, dict(results[STARTUP]))
+    for lines in sizes:
+        results[str(lines)] = benchmark(lines, seed, mix, repeat, memory, in_memory_limit)
+        report(str(lines), {'lines': lines, **results[str(lines)]})
+
+    if update and baseline_file:
+        # Sizes (and startup) not benchmarked this time keep their old figures.
+        baseline.update(results)
+        with open(baseline_file, 'w') as file:
+            json.dump({'config': config, 'results': baseline}, file, indent=1, sort_keys=True)
+            file.write('\n')
+    return len(regressions)
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(prog='benchmark', description='Benchmark the SymphonyLang compiler.')
+    arg_parser.add_argument('--lines', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                            help='score sizes to benchmark, in lines (default: %(default)s)')
+    arg_parser.add_argument('--seed', type=int, default=0, help='seed of the generated scores')
+    arg_parser.add_argument('--mix', type=parse_mix, default=None,
+                            help='weights of line kinds, e.g. note=5,chord=2,rest=2,scale=1,comment=1,blank=1')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='runs per phase; the best time counts')
+    arg_parser.add_argument('--no-memory', action='store_true', help='skip the peak memory measurements')
+    arg_parser.add_argument('--baseline', help='JSON file of baseline results to compare with')
+    arg_parser.add_argument('--update', action='store_true', help='record the results as the new baseline')
+    arg_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                            help='tolerated fraction a metric may worsen by (default: %(default)s)')
+    arg_parser.add_argument('--in-memory-limit', type=int, default=IN_MEMORY_LIMIT,
+                            help='largest size for the phases that hold the whole score (default: %(default)s)')
+    arg_parser.add_argument('--startup-runs', type=int, default=STARTUP_RUNS,
+                            help='fresh interpreters timed for the startup phase; 0 skips it (default: %(default)s)')
+    args = arg_parser.parse_args(argv)
+    if args.update and not args.baseline:
+        arg_parser.error('--update needs --baseline')
+
+    try:
+        regressions = run(args.lines, args.seed, args.mix, args.repeat, not args.no_memory, args.baseline,
+                          args.update, args.threshold, args.in_memory_limit, args.startup_runs)
+    except ValueError as e:
+        arg_parser.error(str(e))
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
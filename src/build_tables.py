@@ -0,0 +1,28 @@
+"""Regenerates the LALR tables (parsetab*.py) shipped next to parser.py.
+
+Run after any change to the grammar in parser.py:
+
+    python src/build_tables.py
+"""
+import os
+import ply.yacc as yacc
+import parser
+
+def build_tables(outputdir=None):
+    """Writes a table module per start symbol into outputdir (default: src)."""
+    outputdir = outputdir or os.path.dirname(os.path.abspath(parser.__file__))
+    tabfiles = []
+    for start, tabmodule in parser.PARSETAB_MODULES.items():
+        tabfile = os.path.join(outputdir, tabmodule + '.py')
+        # yacc() keeps tables whose signature already matches, so remove the
+        # old file to guarantee a fresh write.
+        if os.path.exists(tabfile):
+            os.remove(tabfile)
+        yacc.yacc(module=parser, start=start, debug=False, write_tables=True,
+                  tabmodule=tabmodule, outputdir=outputdir)
+        tabfiles.append(tabfile)
+    return tabfiles
+
+if __name__ == "__main__":
+    for tabfile in build_tables():
+        print(f"Parse tables written to {tabfile}")
@@ -0,0 +1,237 @@
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+from compiler import COMPILER_VERSION
+from parser import Composition, block_depth, parse_symphony_lang, parse_segment, SymphonyLangParserError
+from midi_generator import generate_midi
+
+def source_digest(source):
+    """Content hash of a score, salted with the compiler version."""
+    return hashlib.sha256(f"{COMPILER_VERSION}\0{source}".encode('utf-8')).hexdigest()
+
+def file_digest(path, block_size=1 << 20):
+    """Like source_digest, but hashes a file's raw bytes without loading it whole."""
+    digest = hashlib.sha256(f"{COMPILER_VERSION}\0".encode('utf-8'))
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+# Longest run of lines kept in one segment, so that progress reports and
+# cancellation come at least this often even in a score without blank lines.
+MAX_SEGMENT_LINES = 1024
+
+def split_segments(text, max_lines=MAX_SEGMENT_LINES):
+    """Splits score text at blank lines into (first_line, segment_text) pairs.
+
+    Blank lines inside a repeat or pattern block do not split it. Segments
+    longer than max_lines are split between blocks too.
+    """
+    segments = []
+    current = []
+    first_line = 1
+    depth = 0
+    for number, line in enumerate(text.split('\n'), start=1):
+        # Only strip what the lexer ignores, so a stray '\r' still reaches it.
+        if line.strip(' \t'):
+            if len(current) >= max_lines and depth <= 0:
+                segments.append((first_line, '\n'.join(current)))
+                current = []
+            if not current:
+                first_line = number
+            current.append(line)
+            depth += block_depth(line)
+        elif depth > 0:
+            current.append(line)
+        elif current:
+            segments.append((first_line, '\n'.join(current)))
+            current = []
+    if current:
+        segments.append((first_line, '\n'.join(current)))
+    return segments
+
+class LRUCache:
+    """A thread-safe mapping that evicts least recently used entries beyond max_entries."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._entries.move_to_end(key)
+            except KeyError:
+                return default
+            return self._entries[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+class CompilationCache:
+    """Caches parsed compositions and rendered MIDI bytes by source content.
+
+    Whole scores are keyed by a hash of their source and COMPILER_VERSION and
+    kept in memory and, if cache_dir is given, on disk. On a miss the score
+    is split into blank-line separated segments and segments seen before
+    reuse their parsed elements, so editing one part of a large score only
+    re-parses that part. Returned compositions are shared with the cache and
+    must not be modified.
+    """
+
+    def __init__(self, max_entries=32, max_segments=4096, cache_dir=None, max_disk_bytes=256 * 1024 * 1024):
+        self.scores = LRUCache(max_entries)
+        self.segments = LRUCache(max_segments)
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.misses = 0
+        self.segment_hits = 0
+        self.segment_misses = 0
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def compile(self, source, progress=None, checkpoint=None):
+        """Returns (composition, midi_bytes) for source, compiling only what changed.
+
+        progress, if given, is called as progress(done, total) as segments
+        are parsed, and before falling back to a full parse; an exception it
+        raises abandons the compile. checkpoint is passed on to generate_midi
+        for the same purpose while encoding.
+        """
+        key = source_digest(source)
+        entry = self.scores.get(key)
+        if entry is None:
+            entry = self._load(key)
+            if entry is not None:
+                self.scores.put(key, entry)
+        if entry is not None:
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        composition = self.parse(source, progress)
+        entry = (composition, generate_midi(composition, fast=True, checkpoint=checkpoint))
+        self.scores.put(key, entry)
+        self._store(key, entry)
+        return entry
+
+    def parse(self, source, progress=None):
+        """Returns the Composition for source, reusing cached segments."""
+        segments = split_segments(source.strip())
+        try:
+            tempo = None
+            elements = []
+            for index, (first_line, text) in enumerate(segments):
+                # Every segment but the last is followed by a blank line, whose
+                # NEWLINE the full grammar accepts as an element; appending one
+                # keeps header-only and comment-only segments parseable.
+                if index == 0:
+                    if len(segments) > 1:
+                        text += '\n'
+                    tempo, segment_elements = self._parse_first_segment(text)
+                else:
+                    segment_elements = self._parse_segment(text + '\n', first_line)
+                elements.extend(segment_elements)
+                if progress is not None:
+                    progress(index + 1, len(segments))
+        except SymphonyLangParserError:
+            # Reparse the whole score so the error reads exactly as it would
+            # without the cache. That takes as long as a compile without it,
+            # so give progress a last chance to abandon it first.
+            if progress is not None:
+                progress(index, len(segments))
+            return parse_symphony_lang(source)
+        if tempo is None:
+            return parse_symphony_lang(source)
+        return Composition(tempo, elements)
+
+    def _parse_first_segment(self, text):
+        key = ('header', text)
+        result = self.segments.get(key)
+        if result is None:
+            self.segment_misses += 1
+            composition = parse_symphony_lang(text, strip=False)
+            result = (composition.tempo, composition.elements)
+            self.segments.put(key, result)
+        else:
+            self.segment_hits += 1
+        return result
+
+    def _parse_segment(self, text, first_line):
+        key = ('segment', text)
+        elements = self.segments.get(key)
+        if elements is None:
+            self.segment_misses += 1
+            elements = parse_segment(text, first_line)
+            self.segments.put(key, elements)
+        else:
+            self.segment_hits += 1
+        return elements
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + '.pickle')
+
+    def _load(self, key):
+        if self.cache_dir is None:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file:
+                entry = pickle.load(file)
+            os.utime(path)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None
+        return entry
+
+    def _store(self, key, entry):
+        if self.cache_dir is None:
+            return
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, 'wb') as file:
+                pickle.dump(entry, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, path)
+        except OSError:
+            return
+        self._prune()
+
+    def _prune(self):
+        """Removes least recently used files until the cache directory fits max_disk_bytes."""
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.pickle'):
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in files)
+        for _, size, name in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+            total -= size
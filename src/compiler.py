@@ -0,0 +1,47 @@
+import threading
+from lexer import get_all_tokens, new_lexer
+from parser import parse_symphony_lang, new_parser, SymphonyLangParserError
+from midi_generator import generate_midi, MIDIGenerationError
+
+# Bump whenever a change to the lexer, grammar or MIDI encoding would make
+# previously cached or previously compiled output stale.
+COMPILER_VERSION = '2'
+
+class SymphonyCompiler:
+    """Lexes, parses and renders SymphonyLang scores.
+
+    A single instance may be shared by any number of threads: every thread
+    lazily gets its own lexer and parser, so token streams and parse stacks
+    are never shared. fast_lexer selects the lexer as for lexer.new_lexer.
+    """
+
+    def __init__(self, fast_lexer=None):
+        self.fast_lexer = fast_lexer
+        self._local = threading.local()
+
+    def _instances(self):
+        instances = getattr(self._local, 'instances', None)
+        if instances is None:
+            instances = (new_lexer(self.fast_lexer), new_parser())
+            self._local.instances = instances
+        return instances
+
+    def tokenize(self, source):
+        """Returns the list of tokens for the given source."""
+        thread_lexer, _ = self._instances()
+        return get_all_tokens(source, thread_lexer)
+
+    def parse(self, source):
+        """Parses source into a Composition."""
+        thread_lexer, thread_parser = self._instances()
+        return parse_symphony_lang(source, thread_lexer, thread_parser)
+
+    def compile(self, source, output_file, compact=False):
+        """Parses source and writes the resulting MIDI file.
+
+        compact writes the smaller equivalent file described in
+        midi_generator.compact_events, with velocity-0 note-offs.
+        """
+        composition = self.parse(source)
+        generate_midi(composition, output_file, fast=True, compact=compact, velocity_zero_note_offs=compact)
+        return composition
@@ -5,6 +5,7 @@ from ttkbootstrap.constants import *
 from gui.player import MIDIPlayer
 from gui.visualizer import Visualizer
 from gui.file_handler import FileHandler
+from gui.highlighter import SyntaxHighlighter
 
 class SymphonyLangGUI:
     def __init__(self, master):
@@ -29,8 +30,9 @@ class SymphonyLangGUI:
         
         
         self.file_handler = FileHandler(self.input_text, self.update_status, 
-                                      self.player.set_midi_file,
-                                      self.player.enable_controls)
+                                      self.player.set_midi_data,
+                                      self.player.enable_controls,
+                                      self.update_progress)
         
         
         self.setup_buttons()
@@ -52,6 +54,7 @@ class SymphonyLangGUI:
         # Text input
         self.input_text = tk.Text(self.left_frame, wrap=tk.WORD, width=40, height=20)
         self.input_text.pack(fill=BOTH, expand=YES, pady=(0, 10))
+        self.highlighter = SyntaxHighlighter(self.input_text)
 
     def setup_buttons(self):
         # Buttons
@@ -66,6 +69,16 @@ class SymphonyLangGUI:
                                  command=self.file_handler.upload_txt)
         upload_button.pack(side=LEFT)
 
+        save_midi_button = ttk.Button(button_frame, text="Save MIDI",
+                                      command=self.file_handler.save_midi)
+        save_midi_button.pack(side=LEFT, padx=(5, 0))
+
+        # Live mode recompiles as the code is edited
+        self.live_mode = tk.BooleanVar(value=False)
+        live_check = ttk.Checkbutton(button_frame, text="Live", variable=self.live_mode,
+                                     command=lambda: self.file_handler.set_live_mode(self.live_mode.get()))
+        live_check.pack(side=LEFT, padx=(5, 0))
+
         # New button for generating pseudo code
         pseudo_code_button = ttk.Button(button_frame, text="Generate Pseudo Code", 
                                         command=self.file_handler.generate_pseudo_code)
@@ -76,6 +89,17 @@ class SymphonyLangGUI:
         self.status_message = ttk.Label(self.left_frame, text="", wraplength=380)
         self.status_message.pack(fill=X, pady=(10, 0))
 
+        # Compile progress, shown only while a compile runs
+        self.progress_bar = ttk.Progressbar(self.left_frame, mode="determinate", maximum=1.0)
+
+    def update_progress(self, fraction):
+        if fraction is None:
+            self.progress_bar.pack_forget()
+            return
+        if not self.progress_bar.winfo_manager():
+            self.progress_bar.pack(fill=X, pady=(5, 0))
+        self.progress_bar.config(value=fraction)
+
     def update_status(self, message, status_type):
         self.status_message.config(text=message)
         if status_type == "error":
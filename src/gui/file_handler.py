@@ -1,15 +1,28 @@
 import tkinter as tk
 from tkinter import filedialog
 import os
-from parser import parse_symphony_lang, SymphonyLangParserError
-from midi_generator import generate_midi, MIDIGenerationError
+from parser import SymphonyLangParserError
+from midi_generator import MIDIGenerationError
+from worker import CompileWorker
+from incremental import IncrementalCompiler
+
+# How often a running compile is checked for results, in milliseconds.
+POLL_MS = 20
+
+# In live mode, how long editing must pause before the code is checked, and
+# before a clean result is rendered to MIDI, in milliseconds.
+LIVE_CHECK_MS = 40
+LIVE_RENDER_MS = 500
 
 class FileHandler:
-    def __init__(self, text_widget, status_callback, set_midi_file_callback, enable_controls_callback):
+    def __init__(self, text_widget, status_callback, set_midi_data_callback, enable_controls_callback,
+                 progress_callback=None):
         self.input_text = text_widget
         self.update_status = status_callback
-        self.set_midi_file = set_midi_file_callback
+        self.set_midi_data = set_midi_data_callback
         self.enable_controls = enable_controls_callback
+        # Called with the fraction compiled so far, or None when idle.
+        self.update_progress = progress_callback or (lambda fraction: None)
         self.pseudo_code_snippets = [
             """
 tempo=120
@@ -50,20 +63,119 @@ E4 maj
         
         ]
         self.current_snippet_index = 0
+        # Unchanged scores, and unchanged segments of edited ones, are served
+        # from the worker's cache.
+        self.worker = CompileWorker()
+        self.request_id = None
+        self.poll_id = None
+        self.midi_data = None
+        # Live mode re-parses only the edited lines as the code changes.
+        self.live_mode = False
+        self.incremental = IncrementalCompiler()
+        self.live_check_id = None
+        self.live_render_id = None
+        self.input_text.bind("<<Modified>>", self._on_modified, add="+")
 
     def compile_code(self):
-        """Compiles the SymphonyLang code to MIDI."""
+        """Compiles the SymphonyLang code to MIDI in the background.
+
+        Returns at once; a compile still running for older code is
+        cancelled, and the result is picked up by _poll_compile.
+        """
         code = self.input_text.get("1.0", tk.END).strip()
+        self._submit(code)
+
+    def _submit(self, code, composition=None):
+        self.request_id = self.worker.submit(code, composition)
+        self.update_status("Compiling...", "info")
+        self.update_progress(0.0)
+        if self.poll_id is None:
+            self.poll_id = self.input_text.after(POLL_MS, self._poll_compile)
+
+    def set_live_mode(self, enabled):
+        """Turns recompiling the code as it is edited on or off."""
+        self.live_mode = enabled
+        if enabled:
+            self._schedule_live_check()
+        else:
+            for after_id in (self.live_check_id, self.live_render_id):
+                if after_id is not None:
+                    self.input_text.after_cancel(after_id)
+            self.live_check_id = self.live_render_id = None
+
+    def _on_modified(self, event=None):
+        # Tk only sends <<Modified>> when the modified flag gets set, so it
+        # is cleared after every edit; clearing it sends the event again,
+        # which is ignored.
+        if not self.input_text.edit_modified():
+            return
+        self.input_text.edit_modified(False)
+        if self.live_mode:
+            self._schedule_live_check()
+
+    def _schedule_live_check(self):
+        """Checks the code once editing has paused for LIVE_CHECK_MS."""
+        if self.live_check_id is not None:
+            self.input_text.after_cancel(self.live_check_id)
+        if self.live_render_id is not None:
+            self.input_text.after_cancel(self.live_render_id)
+            self.live_render_id = None
+        self.live_check_id = self.input_text.after(LIVE_CHECK_MS, self._live_check)
+
+    def _live_check(self):
+        """Re-parses the edited lines and reports the first error, if any."""
+        self.live_check_id = None
+        code = self.input_text.get("1.0", "end-1c")
+        self.incremental.update(code)
         try:
-            parsed_composition = parse_symphony_lang(code)
-            midi_file = "output.mid"
-            generate_midi(parsed_composition, midi_file)
-            self.set_midi_file(midi_file)
-            self.enable_controls(True)
-            self.update_status("MIDI file generated successfully!", "success")
-        except (SymphonyLangParserError, MIDIGenerationError) as e:
+            composition = self.incremental.compile()
+        except SymphonyLangParserError as e:
             self.update_status(f"Error: {str(e)}", "error")
-            self.enable_controls(False)
+            return
+        self.update_status(f"No errors ({len(composition.elements)} elements)", "success")
+        # Rendering the MIDI takes longer, so it waits for a longer pause and
+        # reuses the composition just parsed.
+        self.live_render_id = self.input_text.after(
+            LIVE_RENDER_MS, lambda: self._live_render(code.strip(), composition))
+
+    def _live_render(self, code, composition):
+        self.live_render_id = None
+        self._submit(code, composition)
+
+    def _poll_compile(self):
+        """Handles the worker's results for the latest compile request."""
+        self.poll_id = None
+        finished = False
+        for kind, request_id, payload in self.worker.poll():
+            if request_id != self.request_id:
+                continue  # a superseded compile
+            if kind == 'progress':
+                self.update_progress(payload)
+            elif kind == 'done':
+                self._compile_finished(*payload)
+                finished = True
+            elif isinstance(payload, (SymphonyLangParserError, MIDIGenerationError)):
+                self._compile_failed(f"Error: {str(payload)}")
+                finished = True
+            else:
+                self._compile_failed(f"Unexpected error: {str(payload)}")
+                finished = True
+        if finished:
+            self.update_progress(None)
+        else:
+            self.poll_id = self.input_text.after(POLL_MS, self._poll_compile)
+
+    def _compile_finished(self, composition, midi_data, timeline):
+        # The MIDI stays in memory and goes straight to the player, along
+        # with the seek index the worker built for it.
+        self.midi_data = midi_data
+        self.set_midi_data(self.midi_data, timeline)
+        self.enable_controls(True)
+        self.update_status("MIDI generated successfully!", "success")
+
+    def _compile_failed(self, message):
+        self.update_status(message, "error")
+        self.enable_controls(False)
 
     def upload_txt(self):
         """Handles text file upload."""
@@ -78,6 +190,21 @@ E4 maj
             except IOError as e:
                 self.update_status(f"Error loading file: {str(e)}", "error")
 
+    def save_midi(self):
+        """Saves the last compiled MIDI to a file chosen by the user."""
+        if not self.midi_data:
+            self.update_status("Compile the code before saving MIDI", "warning")
+            return
+        file_path = filedialog.asksaveasfilename(defaultextension=".mid",
+                                                 filetypes=[("MIDI files", "*.mid")])
+        if file_path:
+            try:
+                with open(file_path, "wb") as file:
+                    file.write(self.midi_data)
+                self.update_status(f"MIDI saved: {os.path.basename(file_path)}", "success")
+            except IOError as e:
+                self.update_status(f"Error saving MIDI: {str(e)}", "error")
+
     def generate_pseudo_code(self):
         """Generates pseudo code for testing."""
         pseudo_code = self.pseudo_code_snippets[self.current_snippet_index]
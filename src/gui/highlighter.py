@@ -0,0 +1,134 @@
+"""Syntax highlighting for the code editor.
+
+Each line is split into tokens by the lexer (see incremental.lex_line)
+and the tokens are tagged in the Text widget. Lines are only looked at when
+they are both on screen and changed: edits mark the lines they touch with a
+DIRTY tag, which Tk moves along with the text as lines are inserted above
+it, and after each edit or scroll the visible lines carrying it are
+retagged. A keystroke therefore costs the same however long the score is.
+"""
+import tkinter as tk
+from incremental import lex_line
+from cache import LRUCache
+from lexer import new_lexer
+
+# Foreground colors for the highlighted token types, for the dark theme.
+TAG_COLORS = {
+    'NOTE': '#4fc1ff',
+    'DURATION': '#ce9178',
+    'REST': '#c586c0',
+    'SCALE_TYPE': '#4ec9b0',
+    'SCALE_EXTENSION': '#4ec9b0',
+    'TEMPO': '#569cd6',
+    'REPEAT': '#569cd6',
+    'PATTERN': '#569cd6',
+    'TRACK': '#569cd6',
+    'NAME': '#dcdcaa',
+    'NUMBER': '#b5cea8',
+    'COMMENT': '#6a9955',
+}
+ERROR_TAG = 'ERROR'
+
+# Marks text edited since it was last highlighted.
+DIRTY = 'dirty'
+
+# Widget commands that change the text.
+EDITS = ('insert', 'delete', 'replace')
+
+def line_tags(line, lexer_instance=None):
+    """Returns the (tag, start, end) column ranges to highlight in line."""
+    return [(kind, start, end) for kind, start, end in lex_line(line, lexer_instance)
+            if kind in TAG_COLORS or kind == ERROR_TAG]
+
+class SyntaxHighlighter:
+    """Highlights the tokens of a tk.Text as it is edited and scrolled.
+
+    Edits are seen by standing in for the widget's Tcl command, so typing,
+    pasting, undo and programmatic inserts are all caught.
+    """
+
+    def __init__(self, text_widget, max_cached_lines=4096):
+        self.text = text_widget
+        self.line_cache = LRUCache(max_cached_lines)
+        self.lines_tagged = 0
+        self.highlight_id = None
+        self._lexer = new_lexer()
+        for tag, color in TAG_COLORS.items():
+            text_widget.tag_configure(tag, foreground=color)
+        text_widget.tag_configure(ERROR_TAG, foreground='#f44747', underline=True)
+
+        # Rename the widget's command and put ours in its place, as IDLE's
+        # redirector does.
+        widget = str(text_widget)
+        self._original = widget + '_highlighted'
+        text_widget.tk.call('rename', widget, self._original)
+        text_widget.tk.createcommand(widget, self._dispatch)
+
+        # Scrolling changes which lines are visible; keep any scrollbar
+        # the widget already reports to.
+        self._yscrollcommand = text_widget.cget('yscrollcommand')
+        text_widget.configure(yscrollcommand=self._on_scroll)
+        text_widget.bind('<Configure>', lambda event: self.schedule(), add='+')
+        self._call('tag', 'add', DIRTY, '1.0', 'end')
+        self.schedule()
+
+    def _call(self, *args):
+        return self.text.tk.call((self._original,) + args)
+
+    def _dispatch(self, operation, *args):
+        if operation not in EDITS or not args:
+            try:
+                return self._call(operation, *args)
+            except tk.TclError:
+                return ''
+        try:
+            # Where the edit starts, resolved before it moves anything.
+            start = self._call('index', args[0] + ' linestart')
+            result = self._call(operation, *args)
+        except tk.TclError:
+            return ''
+        inserted = ''.join(args[1::2] if operation == 'insert' else args[2::2])
+        newlines = inserted.count('\n')
+        self._call('tag', 'add', DIRTY, start, f'{start} + {newlines} lines lineend + 1c')
+        self.schedule()
+        return result
+
+    def _on_scroll(self, first, last):
+        if self._yscrollcommand:
+            self.text.tk.call(self.text.tk.splitlist(self._yscrollcommand) + (first, last))
+        self.schedule()
+
+    def schedule(self):
+        """Highlights the visible lines once Tk is idle, if not already pending."""
+        if self.highlight_id is None:
+            self.highlight_id = self.text.after_idle(self.highlight_visible)
+
+    def visible_lines(self):
+        """Returns the range of line numbers currently on screen."""
+        first = int(str(self._call('index', '@0,0')).split('.')[0])
+        last = int(str(self._call('index', f'@0,{self.text.winfo_height()}')).split('.')[0])
+        return range(first, last + 1)
+
+    def highlight_visible(self):
+        """Retags the visible lines that were edited since they were last tagged."""
+        self.highlight_id = None
+        # DIRTY always covers whole lines, so the first character tells.
+        for line_number in self.visible_lines():
+            if DIRTY in self.text.tk.splitlist(self._call('tag', 'names', f'{line_number}.0')):
+                self.highlight_line(line_number)
+
+    def highlight_line(self, line_number):
+        """Replaces the highlighting of one line."""
+        start, end = f'{line_number}.0', f'{line_number}.end'
+        line = self._call('get', start, end)
+        tags = self.line_cache.get(line)
+        if tags is None:
+            tags = line_tags(line, self._lexer)
+            self.line_cache.put(line, tags)
+        for tag in TAG_COLORS:
+            self._call('tag', 'remove', tag, start, end)
+        self._call('tag', 'remove', ERROR_TAG, start, end)
+        for tag, token_start, token_end in tags:
+            self._call('tag', 'add', tag, f'{line_number}.{token_start}', f'{line_number}.{token_end}')
+        self._call('tag', 'remove', DIRTY, start, f'{end} + 1c')
+        self.lines_tagged += 1
@@ -1,15 +1,33 @@
 import tkinter as tk
 import ttkbootstrap as ttk
 import pygame
-import os
-from mido import MidiFile
+from io import BytesIO
+from timeline import PlaybackClock, build_timeline
+
+def audio_position():
+    """Returns the mixer's playback position in seconds, or None if stopped."""
+    position = pygame.mixer.music.get_pos()
+    return position / 1000 if position >= 0 and pygame.mixer.music.get_busy() else None
+
+def format_time(seconds):
+    """Formats seconds as m:ss.s."""
+    minutes, seconds = divmod(seconds, 60)
+    return f"{int(minutes)}:{seconds:04.1f}"
 
 class MIDIPlayer:
     def __init__(self, parent_frame, status_callback):
         self.parent_frame = parent_frame
         self.update_status = status_callback
-        self.midi_file = None
+        self.midi_data = None
+        self.midi_stream = None
+        self.timeline = None
         self.visualizer = None  
+        self.paused = False
+        # Where the current playback started, in seconds, and the A-B loop
+        # points (None while unset).
+        self.play_position = 0.0
+        self.loop_start = None
+        self.loop_end = None
         
         
         pygame.mixer.init()
@@ -25,42 +43,188 @@ class MIDIPlayer:
                                     command=self.play_midi, state=tk.DISABLED)
         self.play_button.pack(pady=10)
 
+        self.pause_button = ttk.Button(self.parent_frame, text="Pause",
+                                    command=self.toggle_pause, state=tk.DISABLED)
+        self.pause_button.pack(pady=10)
+
         self.stop_button = ttk.Button(self.parent_frame, text="Stop", 
                                     command=self.stop_midi, state=tk.DISABLED)
         self.stop_button.pack(pady=10)
 
+        seek_frame = ttk.Frame(self.parent_frame)
+        seek_frame.pack(pady=5)
+        ttk.Label(seek_frame, text="Bar").pack(side=tk.LEFT)
+        self.bar_spinbox = ttk.Spinbox(seek_frame, from_=1, to=99999, width=6)
+        self.bar_spinbox.set(1)
+        self.bar_spinbox.pack(side=tk.LEFT, padx=5)
+        self.seek_button = ttk.Button(seek_frame, text="Go", command=self.seek_to_bar,
+                                      state=tk.DISABLED)
+        self.seek_button.pack(side=tk.LEFT)
+
+        loop_frame = ttk.Frame(self.parent_frame)
+        loop_frame.pack(pady=5)
+        self.loop_a_button = ttk.Button(loop_frame, text="Set A",
+                                        command=lambda: self.set_loop_point("A"), state=tk.DISABLED)
+        self.loop_a_button.pack(side=tk.LEFT)
+        self.loop_b_button = ttk.Button(loop_frame, text="Set B",
+                                        command=lambda: self.set_loop_point("B"), state=tk.DISABLED)
+        self.loop_b_button.pack(side=tk.LEFT, padx=5)
+        self.clear_loop_button = ttk.Button(loop_frame, text="Clear Loop",
+                                            command=self.clear_loop, state=tk.DISABLED)
+        self.clear_loop_button.pack(side=tk.LEFT)
+
     def set_visualizer(self, visualizer):
         """Sets the visualizer component."""
         self.visualizer = visualizer
 
     def play_midi(self):
-        """Plays the MIDI file and starts visualization."""
-        if self.midi_file and os.path.exists(self.midi_file):
-            try:
-                pygame.mixer.music.load(self.midi_file)
-                pygame.mixer.music.play()
-                self.update_status("Playing MIDI file", "info")
-                if self.visualizer:
-                    self.visualizer.visualize_midi(self.midi_file)
-            except pygame.error as e:
-                self.update_status(f"Error playing MIDI: {str(e)}", "error")
+        """Plays the compiled MIDI data and starts visualization."""
+        if self.midi_data:
+            self.start_playback(0.0)
+        else:
+            self.update_status("No MIDI available to play", "warning")
+
+    def get_timeline(self):
+        """Returns the time index of the MIDI data, built at compile time if possible."""
+        if self.timeline is None:
+            self.timeline = build_timeline(self.midi_data)
+        return self.timeline
+
+    def loop_enabled(self):
+        return self.loop_start is not None and self.loop_end is not None
+
+    def start_playback(self, position):
+        """Plays from position seconds, looping between A and B if both are set."""
+        timeline = self.get_timeline()
+        loop_end = None
+        if self.loop_enabled():
+            loop_end = self.loop_end
+            if not self.loop_start <= position < loop_end:
+                position = self.loop_start
+        try:
+            if position <= 0 and loop_end is None:
+                data = self.midi_data
+            else:
+                # SDL_mixer cannot seek within MIDI music, so the part to play
+                # is cut from the timeline into a file of its own; the sounding
+                # notes come from the nearest keyframe instead of a replay.
+                data = timeline.midi_from(position, loop_end)
+            # pygame streams from the file object while playing, so keep a
+            # reference to it for as long as the music is loaded.
+            self.midi_stream = BytesIO(data)
+            pygame.mixer.music.load(self.midi_stream, "mid")
+            pygame.mixer.music.play(-1 if loop_end is not None else 0)
+            self.play_position = position
+            self.paused = False
+            self.pause_button.config(text="Pause")
+            if loop_end is not None:
+                self.update_status(f"Looping {format_time(position)} - {format_time(loop_end)}", "info")
+            elif position > 0:
+                self.update_status(f"Playing from {format_time(position)}", "info")
+            else:
+                self.update_status("Playing MIDI", "info")
+            if self.visualizer:
+                # The visualizer follows the mixer's position rather than
+                # timing the notes itself, so the two cannot drift apart.
+                self.visualizer.visualize(timeline, PlaybackClock(audio_position), position, loop_end)
+        except pygame.error as e:
+            self.update_status(f"Error playing MIDI: {str(e)}", "error")
+
+    def current_position(self):
+        """Returns the playback position in seconds."""
+        if self.visualizer and self.visualizer.visualization_running:
+            return self.visualizer.position
+        return self.play_position + (audio_position() or 0.0)
+
+    def toggle_pause(self):
+        """Pauses or resumes playback and visualization."""
+        if self.paused:
+            pygame.mixer.music.unpause()
+            if self.visualizer:
+                self.visualizer.resume()
+            self.paused = False
+            self.pause_button.config(text="Pause")
+            self.update_status("Playing MIDI", "info")
+        elif pygame.mixer.music.get_busy():
+            pygame.mixer.music.pause()
+            if self.visualizer:
+                self.visualizer.pause()
+            self.paused = True
+            self.pause_button.config(text="Resume")
+            self.update_status(f"Paused at {format_time(self.current_position())}", "info")
+
+    def seek(self, position):
+        """Continues playback from position seconds."""
+        if not self.midi_data:
+            return
+        self.start_playback(min(max(position, 0.0), self.get_timeline().duration))
+
+    def seek_to_bar(self):
+        """Continues playback from the start of the bar in the bar box."""
+        try:
+            bar = int(self.bar_spinbox.get())
+            if bar < 1:
+                raise ValueError(bar)
+        except ValueError:
+            self.update_status("Bar must be a whole number from 1", "warning")
+            return
+        self.seek(self.get_timeline().bar_time(bar))
+
+    def set_loop_point(self, point):
+        """Marks the current position as loop point "A" or "B"."""
+        # Snapped to a whole tick, so a looped region lasts exactly as long
+        # as the MIDI file cut for it.
+        timeline = self.get_timeline()
+        position = timeline.tick_time(timeline.tick_at(self.current_position()))
+        if point == "A":
+            self.loop_start = position
         else:
-            self.update_status("No MIDI file available to play", "warning")
+            self.loop_end = position
+        if not self.loop_enabled():
+            self.update_status(f"Loop {point} set at {format_time(position)}", "info")
+        elif self.loop_start >= self.loop_end:
+            self.update_status("Loop A must come before loop B", "warning")
+            self.loop_end = None
+        else:
+            self.start_playback(self.loop_start)
+
+    def clear_loop(self):
+        """Removes the loop points, continuing playback without the loop."""
+        looping = self.loop_enabled() and pygame.mixer.music.get_busy()
+        position = self.current_position()
+        self.loop_start = self.loop_end = None
+        if looping:
+            self.start_playback(position)
+        else:
+            self.update_status("Loop cleared", "info")
 
     def stop_midi(self):
         """Stops MIDI playback and visualization."""
         pygame.mixer.music.stop()
+        self.paused = False
+        self.pause_button.config(text="Pause")
+        message = "Playback stopped"
         if self.visualizer:
             self.visualizer.stop_visualization()
-        self.update_status("Playback stopped", "info")
+            report = self.visualizer.sync_report()
+            if report and report['samples']:
+                message += f" (audio/visual skew: mean {report['mean_ms']:.1f} ms, max {report['max_ms']:.1f} ms)"
+        self.update_status(message, "info")
+
+    def set_midi_data(self, midi_data, timeline=None):
+        """Sets the compiled MIDI file contents to play.
 
-    def set_midi_file(self, file_path):
-        """Sets the MIDI file path."""
-        self.midi_file = file_path
-        self.player_label.config(text=f"MIDI file generated: {os.path.basename(file_path)}")
+        timeline is their time index if the compiler built it; otherwise it
+        is built from midi_data when first needed.
+        """
+        self.midi_data = midi_data
+        self.timeline = timeline
+        self.loop_start = self.loop_end = None
+        self.player_label.config(text=f"MIDI generated: {len(midi_data)} bytes")
 
     def enable_controls(self, enable=True):
         """Enables or disables player controls."""
         state = tk.NORMAL if enable else tk.DISABLED
-        self.play_button.config(state=state)
-        self.stop_button.config(state=state)
+        for button in (self.play_button, self.pause_button, self.stop_button, self.seek_button,
+                       self.loop_a_button, self.loop_b_button, self.clear_loop_button):
+            button.config(state=state)
@@ -1,12 +1,54 @@
 import tkinter as tk
 import colorsys
-from mido import MidiFile
+from timeline import ActiveNotes, PlaybackClock, build_timeline
+
+# Redraw period; one display frame at 60 Hz.
+FRAME_MS = 16
+
+# Constants for visualization
+MIN_PITCH = 21  # A0 (lowest piano key)
+MAX_PITCH = 108  # C8 (highest piano key)
+MAX_HEIGHT = 180  # Maximum bar height
+
+def _build_color_table():
+    """Returns bar colors indexed by [pitch][velocity].
+
+    The hue follows the note's position in the octave and the brightness its
+    velocity, so the 128 pitches share twelve rows of shades.
+    """
+    shades = []
+    for note_in_octave in range(12):
+        hue = note_in_octave / 12
+        row = []
+        for velocity in range(128):
+            rgb = colorsys.hsv_to_rgb(hue, 0.7, 0.8 + ((velocity / 127) * 0.2))
+            row.append(f'#{int(rgb[0]*255):02x}{int(rgb[1]*255):02x}{int(rgb[2]*255):02x}')
+        shades.append(tuple(row))
+    return tuple(shades[(pitch - MIN_PITCH) % 12] for pitch in range(128))
+
+COLOR_TABLE = _build_color_table()
+BAR_HEIGHTS = tuple((pitch - MIN_PITCH) / (MAX_PITCH - MIN_PITCH) * MAX_HEIGHT for pitch in range(128))
 
 class Visualizer:
     def __init__(self, parent_frame):
         self.parent_frame = parent_frame
         self.visualization_running = False
-        self.active_notes = []
+        self.active_notes = ActiveNotes()
+        # Pitches turned on or off since the last redraw.
+        self.dirty_pitches = set()
+        self.timeline = None
+        self.event_index = 0
+        self.clock = None
+        # Playback position in seconds, and the looped region if any.
+        self.position = 0.0
+        self.loop_start = 0.0
+        self.loop_end = None
+        self.loop_count = 0
+        self.after_id = None
+        # One canvas rectangle per piano key, created the first time the key
+        # sounds, and the color each one currently shows or None while hidden.
+        self.bars = [None] * 128
+        self.bar_colors = [None] * 128
         
         
         self.visualization_canvas = tk.Canvas(
@@ -22,90 +64,153 @@ class Visualizer:
         self.canvas_height = 200
 
     def draw_bar_chart(self):
-        """Draws a bar chart with heights based on note pitch and colors based on position in octave."""
-        self.visualization_canvas.delete("all")
-        if not self.active_notes:
-            return
+        """Draws a bar chart with heights based on note pitch and colors based on position in octave.
 
-        # Constants for visualization
-        bar_width = 30
-        min_pitch = 21  # A0 (lowest piano key)
-        max_pitch = 108  # C8 (highest piano key)
-        pitch_range = max_pitch - min_pitch
-        max_height = 180  # Maximum bar height
+        Each piano key has a fixed slot across the canvas, so only the bars
+        of pitches that changed since the last redraw are shown, recolored
+        or hidden. Notes outside the piano range are tracked but not drawn.
+        """
+        canvas = self.visualization_canvas
+        velocities = self.active_notes.velocities
+        bars = self.bars
+        bar_colors = self.bar_colors
+        key_width = self.canvas_width / (MAX_PITCH - MIN_PITCH + 1)
 
-        # Calculate spacing between bars
-        total_width = len(self.active_notes) * bar_width
-        spacing = min((self.canvas_width - total_width) / (len(self.active_notes) + 1), 50)
-        
-        # Draw each active note
-        for i, (pitch, velocity) in enumerate(self.active_notes):
-            
-            x_position = spacing + (i * (bar_width + spacing))
-
-            
-            normalized_pitch = (pitch - min_pitch) / pitch_range
-            height = normalized_pitch * max_height
-
-            x1 = x_position
-            y1 = self.canvas_height - height  # Invert the height for visualization
-            x2 = x1 + bar_width
-            y2 = self.canvas_height
-
-            # Calculate color based on note position in octave
-            note_in_octave = (pitch - min_pitch) % 12
-            hue = note_in_octave / 12
-            saturation = 0.7
-            value = 0.8 + ((velocity / 127) * 0.2)
-            rgb = colorsys.hsv_to_rgb(hue, saturation, value)
-            color = f'#{int(rgb[0]*255):02x}{int(rgb[1]*255):02x}{int(rgb[2]*255):02x}'
-
-            # Draw the bar
-            self.visualization_canvas.create_rectangle(
-                x1, y1, x2, y2,
-                fill=color,
-                outline="#2d2d2d",  # Slight outline for separation
-                width=1
-            )
-
-            # Add note name label in white
-            note_names = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
-            note_name = note_names[note_in_octave]
-            octave = (pitch - min_pitch) // 12
-            
-            # self.visualization_canvas.create_text(
-            #     (x1 + x2) / 2, y1 - 10,
-            #     text=f"{note_name}{octave}",
-            #     fill="white",  # White text for dark background
-            #     font=("Helvetica", 8)
-            # )
-
-    def visualize_midi(self, midi_file):
-        """Visualizes the MIDI notes on the bar chart."""
-        if not midi_file:
+        for pitch in self.dirty_pitches:
+            if not MIN_PITCH <= pitch <= MAX_PITCH:
+                continue
+            velocity = velocities[pitch]
+            if not velocity:
+                if bar_colors[pitch] is not None:
+                    canvas.itemconfigure(bars[pitch], state="hidden")
+                    bar_colors[pitch] = None
+                continue
+            color = COLOR_TABLE[pitch][velocity]
+            if bars[pitch] is None:
+                x1 = (pitch - MIN_PITCH) * key_width
+                bars[pitch] = canvas.create_rectangle(
+                    x1, self.canvas_height - BAR_HEIGHTS[pitch],  # Invert the height for visualization
+                    x1 + key_width, self.canvas_height,
+                    fill=color,
+                    outline="#2d2d2d",  # Slight outline for separation
+                    width=1
+                )
+            elif bar_colors[pitch] is None:
+                canvas.itemconfigure(bars[pitch], fill=color, state="normal")
+            elif bar_colors[pitch] != color:
+                canvas.itemconfigure(bars[pitch], fill=color)
+            bar_colors[pitch] = color
+        self.dirty_pitches.clear()
+
+    def visualize_midi(self, midi_data, clock=None):
+        """Starts visualizing in-memory MIDI file contents on the bar chart.
+
+        Returns immediately; the notes are played back from after()
+        callbacks on the Tk event loop, following clock (a PlaybackClock,
+        normally tied to the audio player) or the wall clock if None.
+        """
+        if not midi_data:
+            self.stop_visualization()
             return
-        midi = MidiFile(midi_file)
+        self.visualize(build_timeline(midi_data), clock)
+
+    def visualize(self, timeline, clock=None, start=0.0, loop_end=None):
+        """Starts visualizing a Timeline from start seconds.
+
+        With loop_end the region from start to loop_end repeats until
+        stopped, matching audio played in a loop.
+        """
+        self.stop_visualization()
+        self.timeline = timeline
+        self.clock = clock or PlaybackClock()
+        self.loop_start = start
+        self.loop_end = loop_end
+        self.loop_count = 0
+        self.jump_to(start)
         self.visualization_running = True
-        self.active_notes = []
-
-        # Iterate over MIDI messages and update active notes
-        for msg in midi.play():
-            if not self.visualization_running:
-                break
-
-            if msg.type == "note_on" and msg.velocity > 0:
-                # Add note to active notes
-                self.active_notes.append((msg.note, msg.velocity))
-                self.draw_bar_chart()
-            elif msg.type == "note_off" or (msg.type == "note_on" and msg.velocity == 0):
-                # Remove note from active notes
-                self.active_notes = [(n, v) for n, v in self.active_notes if n != msg.note]
-                self.draw_bar_chart()
-            
-            self.visualization_canvas.update()
+        self._tick()
+
+    def jump_to(self, position):
+        """Shows the notes sounding at position seconds and continues from there."""
+        index = self.timeline.index_at(position)
+        # Found from the nearest keyframe, not by replaying from the start.
+        notes = self.timeline.notes_at(index)
+        self.dirty_pitches.update(pitch for pitch, _ in self.active_notes)
+        self.dirty_pitches.update(pitch for pitch, _ in notes)
+        self.active_notes = notes
+        self.event_index = index
+        self.position = position
+        self.draw_bar_chart()
+
+    def pause(self):
+        """Freezes the visualization, keeping the current notes on screen."""
+        if not self.visualization_running:
+            return
+        self.clock.pause()
+        if self.after_id is not None:
+            self.visualization_canvas.after_cancel(self.after_id)
+            self.after_id = None
+
+    def resume(self):
+        """Continues a paused visualization."""
+        if self.visualization_running and self.after_id is None:
+            self.clock.resume()
+            self._tick()
+
+    def apply_events(self, events, now=0.0):
+        """Updates the active notes from (note, velocity) events without drawing."""
+        active_notes = self.active_notes
+        dirty_pitches = self.dirty_pitches
+        for note, velocity in events:
+            # velocity 0 is a note-off
+            active_notes.note_on(note, velocity, now)
+            dirty_pitches.add(note)
+
+    def _tick(self):
+        """Applies the events that have come due and schedules the next frame."""
+        self.after_id = None
+        if not self.visualization_running:
+            return
+        timeline = self.timeline
+        elapsed = self.clock.now()
+        if elapsed is None:
+            # The audio stopped or finished.
+            self.stop_visualization()
+            return
+        if self.loop_end is None:
+            now = self.loop_start + elapsed
+        else:
+            loop_count, offset = divmod(elapsed, self.loop_end - self.loop_start)
+            if loop_count != self.loop_count:
+                self.loop_count = loop_count
+                self.jump_to(self.loop_start)
+            now = self.loop_start + offset
+        self.position = now
+        start = self.event_index
+        end = timeline.advance(start, now)
+
+        # Everything due since the last frame is applied, then drawn once,
+        # so a dense chord costs one redraw rather than one per note.
+        if end > start:
+            self.apply_events(timeline.events[start:end], now)
+            self.event_index = end
+            self.draw_bar_chart()
+
+        if end >= len(timeline) and self.loop_end is None:
+            self.visualization_running = False
+            return
+        self.after_id = self.visualization_canvas.after(FRAME_MS, self._tick)
 
     def stop_visualization(self):
         """Stops the visualization."""
         self.visualization_running = False
-        self.active_notes = []  # Clear active notes
-        self.visualization_canvas.delete("all")  # Clear the canvas
+        if self.after_id is not None:
+            self.visualization_canvas.after_cancel(self.after_id)
+            self.after_id = None
+        self.dirty_pitches.update(pitch for pitch, _ in self.active_notes)
+        self.active_notes.clear()  # Clear active notes
+        self.draw_bar_chart()  # Hide the bars
+
+    def sync_report(self):
+        """Returns the audio/visual skew measured during the last playback."""
+        return self.clock.stats.summary() if self.clock else None
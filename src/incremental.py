@@ -0,0 +1,336 @@
+"""Line-by-line recompilation for live editing.
+
+Elements never span lines (a NEWLINE ends each one), so a score can be
+lexed and parsed one line at a time. IncrementalCompiler keeps the result
+of every line of the text it last saw; on an edit only the lines between
+the unchanged prefix and suffix are looked at again, and those are looked
+up by content in a cache before anything is re-lexed.
+
+The result is the same as parse_symphony_lang on the whole text, error
+messages included: line numbers count from the first non-blank line, as
+the full parse strips the text, and the last line is parsed without a
+trailing newline so errors there still read "at EOF".
+
+Repeat, pattern and track blocks span lines and only parse as a whole, so
+each top-level block is parsed as one unit instead, found with block_depth
+as the compilation cache splits scores. Block units are cached by content
+like lines, so editing outside a block does not parse it again.
+"""
+from lexer import new_lexer, SymphonyLangLexerError
+from parser import (Composition, SymphonyLangParserError, block_depth, new_parser, parse_segment,
+                    parse_symphony_lang)
+from cache import LRUCache
+
+# Roles a line can play in the stripped score.
+BLANK = 'blank'  # leading or trailing blank line, stripped by the full parse
+HEADER = 'header'  # first non-blank line, which starts with the tempo
+BODY = 'body'
+
+def lex_line(text, lexer_instance=None):
+    """Splits one line into (type, start, end) column ranges for highlighting.
+
+    Comments, which the lexer drops, are included with the type COMMENT.
+    Lexing stops at an illegal character, whose range has the type ERROR.
+    """
+    lexer_instance = lexer_instance or new_lexer()
+    lexer_instance.input(text)
+    tokens = []
+    end = 0
+    try:
+        for token in iter(lexer_instance.token, None):
+            end = lexer_instance.lexpos
+            tokens.append((token.type, token.lexpos, end))
+    except SymphonyLangLexerError:
+        position = lexer_instance.lexpos
+        tokens.append(('ERROR', position, position + 1))
+        return tokens
+    comment = text.find('#', end)
+    if comment >= 0:
+        tokens.append(('COMMENT', comment, len(text)))
+    return tokens
+
+def _common_prefix(a, b):
+    """Returns the length of the longest common prefix of strings a and b."""
+    limit = min(len(a), len(b))
+    start = 0
+    block = 4096
+    while start < limit:
+        stop = min(start + block, limit)
+        if a[start:stop] != b[start:stop]:
+            # Narrow the mismatch down by halving the block.
+            while stop - start > 1:
+                middle = (start + stop) // 2
+                if a[start:middle] == b[start:middle]:
+                    start = middle
+                else:
+                    stop = middle
+            return start
+        start = stop
+        block *= 2
+    return limit
+
+def _common_suffix(a, b, limit):
+    """Returns the length of the longest common suffix of a and b, at most limit."""
+    length_a, length_b = len(a), len(b)
+    start = 0
+    block = 4096
+    while start < limit:
+        stop = min(start + block, limit)
+        if a[length_a - stop:length_a - start] != b[length_b - stop:length_b - start]:
+            while stop - start > 1:
+                middle = (start + stop) // 2
+                if a[length_a - middle:length_a - start] == b[length_b - middle:length_b - start]:
+                    start = middle
+                else:
+                    stop = middle
+            return start
+        start = stop
+        block *= 2
+    return limit
+
+class LineResult:
+    """What one line, or one block of lines, contributes to the score.
+
+    depth is the line's block_depth; lines that open or close blocks are
+    not parsed on their own, only as part of their block.
+    """
+    __slots__ = ('role', 'is_last', 'tokens', 'tempo', 'elements', 'failed', 'depth')
+
+    def __init__(self, role, is_last, tokens, tempo=None, elements=(), failed=False, depth=0):
+        self.role = role
+        self.is_last = is_last
+        self.tokens = tokens
+        self.tempo = tempo
+        self.elements = elements
+        self.failed = failed
+        self.depth = depth
+
+class IncrementalCompiler:
+    """Keeps a score parsed as its text is edited, re-parsing only changed lines.
+
+    Call update() with the full text after each edit, then compile() for
+    the Composition. Line results are cached by content, so typing a line
+    that already appears elsewhere, or undoing an edit, parses nothing.
+    """
+
+    def __init__(self, max_cached_lines=65536, max_cached_blocks=1024):
+        self.text = ''
+        self.lines = []
+        self.results = []
+        # Indices of the first and last non-blank lines, None if there are none.
+        self.header = None
+        self.last = None
+        self.line_cache = LRUCache(max_cached_lines)
+        self.block_cache = LRUCache(max_cached_blocks)
+        self.lines_parsed = 0
+        self.blocks_parsed = 0
+        self._lexer = new_lexer()
+        self._composition_parser = new_parser()
+        self._segment_parser = new_parser('element_list')
+
+    def update(self, text):
+        """Brings the line results up to date with text.
+
+        Returns the (start, end) range of line indices that had to be
+        looked at again.
+        """
+        old_text = self.text
+        old_lines = self.lines
+        if not old_lines:
+            prefix = suffix = 0
+            new_lines = text.split('\n')
+        else:
+            # Compared as strings rather than line by line, and only the
+            # edited region is split, so an edit costs a few memcmps and
+            # list copies rather than a pass over every line in Python.
+            common = _common_prefix(old_text, text)
+            common_end = _common_suffix(old_text, text, min(len(old_text), len(text)) - common)
+            # Whole lines inside the common start and end are unchanged. A
+            # line starting exactly where the common end does counts too, as
+            # the newline before it is shared even if it is in the common
+            # start (as when a line is inserted).
+            prefix = text.count('\n', 0, common)
+            suffix_start = len(text) - common_end
+            suffix = text.count('\n', suffix_start)
+            old_suffix_start = len(old_text) - common_end
+            whole_first = (suffix_start > 0 and text[suffix_start - 1] == '\n'
+                           and old_suffix_start > 0 and old_text[old_suffix_start - 1] == '\n')
+            if whole_first:
+                suffix += 1
+            new_lines = old_lines[:prefix]
+            if text.count('\n') + 1 > prefix + suffix:
+                start_char = text.rfind('\n', 0, common) + 1
+                end_char = suffix_start - 1 if whole_first else text.find('\n', suffix_start)
+                if end_char < 0:
+                    end_char = len(text)
+                new_lines += text[start_char:end_char].split('\n')
+            new_lines += old_lines[len(old_lines) - suffix:]
+        self.text = text
+        old_end = len(old_lines) - suffix
+        delta = len(new_lines) - len(old_lines)
+
+        def moved(index, replaced):
+            # Where the line at old index now is; replaced if it was edited.
+            if prefix <= index < old_end:
+                return replaced
+            return index if index < prefix else index + delta
+
+        old_bounds = self.header, self.last
+        self.results[prefix:old_end] = [None] * (len(new_lines) - prefix - suffix)
+        self.lines = new_lines
+        self.header, self.last = header, last = self._bounds()
+
+        # Besides the edited lines, only lines between the old and the new
+        # first or last non-blank line can have changed role, such as a
+        # blank line that is no longer trailing.
+        start, end = prefix, len(new_lines) - suffix
+        if header is None or old_bounds[0] is None:
+            # All blank before or after: every other line is blank anyway.
+            recheck = range(len(new_lines))
+        else:
+            old_header = moved(old_bounds[0], min(prefix, len(new_lines) - 1))
+            old_last = moved(old_bounds[1], max(min(end, len(new_lines)) - 1, 0))
+            recheck = list(range(min(old_header, header), max(old_header, header) + 1))
+            recheck += range(min(old_last, last), max(old_last, last) + 1)
+        results = self.results
+        for index in recheck:
+            result = results[index]
+            if result is not None and (result.role, result.is_last) != self._role(index, header, last):
+                results[index] = None
+                start = min(start, index)
+                end = max(end, index + 1)
+        for index in range(start, end):
+            if results[index] is None:
+                results[index] = self._result(new_lines[index], *self._role(index, header, last))
+        return start, end
+
+    def _bounds(self):
+        """Returns the indices of the first and last non-blank lines, or (None, None)."""
+        lines = self.lines
+        header = next((i for i, line in enumerate(lines) if line.strip()), None)
+        if header is None:
+            return None, None
+        last = next(i for i in range(len(lines) - 1, -1, -1) if lines[i].strip())
+        return header, last
+
+    def _role(self, index, header, last):
+        if header is None or index < header or index > last:
+            return BLANK, False
+        return (HEADER if index == header else BODY), index == last
+
+    def _result(self, text, role, is_last):
+        key = (text, role, is_last)
+        result = self.line_cache.get(key)
+        if result is None:
+            result = self._parse_line(text, role, is_last)
+            if not result.failed:
+                self.line_cache.put(key, result)
+        return result
+
+    def _parse_line(self, text, role, is_last, line_number=1):
+        """Lexes and parses one line; raises nothing, marking failures instead."""
+        tokens = lex_line(text, self._lexer)
+        if role == BLANK:
+            return LineResult(role, is_last, tokens)
+        depth = block_depth(text)
+        if depth:
+            # Only parsed as part of its block. A line closing more blocks
+            # than it opens fails if it is not inside one.
+            return LineResult(role, is_last, tokens, failed=depth < 0, depth=depth)
+        if role == BODY and all(token[0] == 'COMMENT' for token in tokens):
+            # Blank and comment-only lines add nothing, and on their own
+            # the last line would not even parse.
+            return LineResult(role, is_last, tokens)
+        self.lines_parsed += 1
+        try:
+            tempo, elements = self._parse(text, role, is_last, line_number)
+        except SymphonyLangParserError:
+            return LineResult(role, is_last, tokens, failed=True)
+        return LineResult(role, is_last, tokens, tempo, elements)
+
+    def _parse(self, text, role, is_last, line_number):
+        if role == HEADER:
+            source = text.lstrip()
+            source = source.rstrip() if is_last else source + '\n'
+            composition = parse_symphony_lang(source, self._lexer, self._composition_parser, strip=False)
+            return composition.tempo, composition.elements
+        source = text.rstrip() if is_last else text + '\n'
+        return None, parse_segment(source, line_number, self._lexer, self._segment_parser)
+
+    def compile(self):
+        """Returns the Composition of the text last passed to update().
+
+        Raises SymphonyLangParserError with the message a full parse would
+        give for the first failing line or block.
+        """
+        header, last = self.header, self.last
+        if header is None:
+            # Nothing but blank lines; let the full parser word the error.
+            return parse_symphony_lang('\n'.join(self.lines))
+        results = self.results
+        tempo = None
+        elements = []
+        index = header
+        while index <= last:
+            result = results[index]
+            if result.depth > 0:
+                end = self._block_end(index)
+                result = self._block_result(index, end)
+            else:
+                end = index + 1
+            if result.failed:
+                self._raise_error(index, end)
+            if index == header:
+                tempo = result.tempo
+            elements.extend(result.elements)
+            index = end
+        return Composition(tempo, elements)
+
+    def _block_end(self, start):
+        """Returns the index after the line closing the block opened at line start."""
+        results = self.results
+        depth = 0
+        for index in range(start, self.last + 1):
+            depth += results[index].depth
+            if depth <= 0:
+                return index + 1
+        # Never closed: the block runs to the end, where the parse fails.
+        return self.last + 1
+
+    def _block_result(self, start, end):
+        role = self.results[start].role
+        is_last = end > self.last
+        text = '\n'.join(self.lines[start:end])
+        key = (text, role, is_last)
+        result = self.block_cache.get(key)
+        if result is None:
+            self.blocks_parsed += 1
+            try:
+                tempo, elements = self._parse(text, role, is_last, 1)
+                result = LineResult(role, is_last, None, tempo, elements)
+            except SymphonyLangParserError:
+                # Cached as well, so an unfinished block is not parsed again
+                # on every compile while the rest of the score is edited.
+                result = LineResult(role, is_last, None, failed=True)
+            self.block_cache.put(key, result)
+        return result
+
+    def _raise_error(self, start, end):
+        """Re-parses failing lines start to end in context to raise the full parse's error."""
+        lines = self.lines
+        result = self.results[start]
+        # The lexer joins a run of empty lines into one NEWLINE token, and
+        # the error may be reported at it, so the blank lines that follow
+        # are included as they are in the full text.
+        while end <= self.last and not lines[end].strip():
+            end += 1
+        text = '\n'.join(lines[start:end])
+        if end > self.last:
+            text = text.rstrip()
+        self._parse(text, result.role, end > self.last, start - self.header + 1)
+        # Not reached unless the lines parse after all.
+        raise SymphonyLangParserError(f"Syntax error at line {start - self.header + 1}")
+
+    def tokens(self, index):
+        """Returns the highlighting ranges of line index."""
+        return self.results[index].tokens
@@ -1,3 +1,6 @@
+import os
+import re
+from collections import namedtuple
 import ply.lex as lex
 
 class SymphonyLangLexerError(Exception):
@@ -15,7 +18,13 @@ tokens = (
     'CHORD',
     'REST',
     'LBRACKET',
-    'RBRACKET'
+    'RBRACKET',
+    'REPEAT',
+    'PATTERN',
+    'NAME',
+    'LBRACE',
+    'RBRACE',
+    'TRACK'
 )
 
 t_NOTE = r'[A-G](\#|b)?[0-9]'
@@ -27,6 +36,12 @@ t_SCALE_TYPE = r'maj|min'
 t_SCALE_EXTENSION = r'pent|chrom'
 t_LBRACKET = r'\['
 t_RBRACKET = r'\]'
+t_REPEAT = r'repeat'
+t_PATTERN = r'pattern'
+t_NAME = r'@[A-Za-z_][A-Za-z0-9_]*'
+t_LBRACE = r'\{'
+t_RBRACE = r'\}'
+t_TRACK = r'track|voice'
 
 
 
@@ -51,12 +66,141 @@ def t_error(t):
 
 lexer = lex.lex()
 
-def get_all_tokens(input_string):
-    lexer.input(input_string)
+# The fast lexer: the same tokens from one hand-written regex, without
+# PLY's per-token rule calls and LexToken objects. Every token alternative
+# starts with characters of its own, so unlike PLY's length-sorted string
+# rules their order cannot change what matches. Blanks and a comment are
+# skipped as part of the next match, which the catch-all ERROR and END
+# alternatives guarantee, so nothing ever backtracks.
+FAST_TOKEN_PATTERN = re.compile(r'''
+    (?:[ \t]|\#.*)*
+    (?: (\n+)
+      | (\d+)
+      | ([A-G](?:\#|b)?[0-9])
+      | (wn|hn|qn|en|sn)
+      | (wr|hr|qr|er|sr)
+      | (maj|min)
+      | (pent|chrom)
+      | (tempo)
+      | (track|voice)
+      | (repeat)
+      | (pattern)
+      | (@[A-Za-z_][A-Za-z0-9_]*)
+      | (\[)
+      | (\])
+      | (\{)
+      | (\})
+      | (=)
+      | (.)
+      | (\Z)
+    )''', re.VERBOSE)
+
+# Token types by group number in FAST_TOKEN_PATTERN.
+FAST_TOKEN_TYPES = (None, 'NEWLINE', 'NUMBER', 'NOTE', 'DURATION', 'REST', 'SCALE_TYPE', 'SCALE_EXTENSION',
+                    'TEMPO', 'TRACK', 'REPEAT', 'PATTERN', 'NAME', 'LBRACKET', 'RBRACKET', 'LBRACE', 'RBRACE',
+                    'EQUALS', 'ERROR', 'END')
+_NEWLINE_GROUP, _NUMBER_GROUP = 1, 2
+_ERROR_GROUP, _END_GROUP = len(FAST_TOKEN_TYPES) - 2, len(FAST_TOKEN_TYPES) - 1
+
+class Token(namedtuple('Token', 'type value lineno lexpos')):
+    """A token of the fast lexer, with the attributes of a PLY LexToken."""
+    __slots__ = ()
+    # PLY's parser attaches the lexer to a token it reports unless it has
+    # one already; a tuple cannot take new attributes.
+    lexer = None
+
+class FastLexer:
+    """Stands in for a clone of the PLY lexer, producing equal tokens faster.
+
+    Supports what the parser and the rest of the compiler use: input(),
+    token(), iteration, lineno and lexpos (the position after the last
+    token, or of the illegal character after an error).
+    """
+
+    def __init__(self, lineno=1):
+        self.lineno = lineno
+        self.lexdata = ''
+        self._match = None
+        self._position = 0
+        self._tokens = iter(())
+
+    def clone(self):
+        return FastLexer(self.lineno)
+
+    @property
+    def lexpos(self):
+        # Worked out when asked for, which is rarely, rather than per token.
+        return self._position if self._match is None else self._match.end()
+
+    def input(self, data):
+        self.lexdata = data
+        self._match = None
+        self._position = 0
+        self._tokens = self.scan(data)
+
+    def token(self):
+        return next(self._tokens, None)
+
+    def __iter__(self):
+        return self._tokens
+
+    def scan(self, data):
+        """Yields the Tokens of data, counting lines from lineno."""
+        new_token = tuple.__new__
+        types = FAST_TOKEN_TYPES
+        lineno = self.lineno
+        for match in FAST_TOKEN_PATTERN.finditer(data):
+            self._match = match
+            group = match.lastindex
+            if group > _NUMBER_GROUP:
+                if group >= _ERROR_GROUP:
+                    if group == _END_GROUP:
+                        break
+                    self._match = None
+                    self._position = match.start(group)
+                    raise SymphonyLangLexerError(f"Illegal character '{match[group]}' at line {lineno}")
+                yield new_token(Token, (types[group], match[group], lineno, match.start(group)))
+            elif group == _NEWLINE_GROUP:
+                value = match[group]
+                # Counted before the token is handed out, as t_NEWLINE does.
+                self.lineno = lineno + len(value)
+                yield new_token(Token, ('NEWLINE', value, lineno, match.start(group)))
+                lineno = self.lineno
+            else:
+                yield new_token(Token, ('NUMBER', int(match[group]), lineno, match.start(group)))
+        self._match = None
+        # Where PLY leaves it at the end of input.
+        self._position = len(data) + 1
+
+def tokenize(text, lineno=1):
+    """Yields the tokens of text as Token tuples, with the fast lexer."""
+    return FastLexer(lineno).scan(text)
+
+# Which lexer new_lexer() returns by default; SYMPHONYLANG_LEXER=fast in
+# the environment starts with the fast one.
+_use_fast_lexer = os.environ.get('SYMPHONYLANG_LEXER') == 'fast'
+
+def use_fast_lexer(enabled=True):
+    """Selects the lexer that new_lexer() returns from now on."""
+    global _use_fast_lexer
+    _use_fast_lexer = enabled
+
+def new_lexer(fast=None):
+    """Returns a lexer of its own: a FastLexer if fast (default: as selected), else a PLY clone."""
+    if fast is None:
+        fast = _use_fast_lexer
+    return FastLexer() if fast else lexer.clone()
+
+def get_all_tokens(input_string, lexer_instance=None):
+    # The module-level lexer is only a template; tokenizing on a clone keeps
+    # concurrent callers from sharing input position and line counters.
+    lexer_instance = lexer_instance or new_lexer()
+    lexer_instance.lineno = 1
+    lexer_instance.input(input_string)
     
     token_list = []
     while True:
-        tok = lexer.token()
+        tok = lexer_instance.token()
         if not tok:
             break
         token_list.append(tok)
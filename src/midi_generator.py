@@ -1,29 +1,26 @@
+import heapq
+import struct
+from io import BytesIO
+from itertools import islice
+from operator import itemgetter
 import mido
 from parser import Composition, MusicElement
+from notation import NOTE_TO_MIDI, DURATION_TO_TICKS, PITCH_TABLE, SCALE_PATTERNS, scale_key
+from profiling import active_profiler, phase
 
 class MIDIGenerationError(Exception):
     pass
 
-NOTE_TO_MIDI = {
-    'C': 60, 'D': 62, 'E': 64, 'F': 65, 'G': 67, 'A': 69, 'B': 71
-}
-
-DURATION_TO_TICKS = {
-    # Note durations
-    'wn': 1920, 'hn': 960, 'qn': 480, 'en': 240, 'sn': 120,
-    # Rest durations (same timing as corresponding notes)
-    'wr': 1920, 'hr': 960, 'qr': 480, 'er': 240, 'sr': 120
-}
-
-SCALE_PATTERNS = {
-    'maj': [0, 2, 4, 5, 7, 9, 11, 12],
-    'min': [0, 2, 3, 5, 7, 8, 10, 12],
-    'maj pent': [0, 2, 4, 7, 9, 12],
-    'min pent': [0, 3, 5, 7, 10, 12],
-    'chrom': [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12]
-}
-
 def note_to_midi_number(note):
+    try:
+        return PITCH_TABLE[note]
+    except (KeyError, TypeError):
+        # Not a canonical spelling: parse it the long way, which either
+        # reports why it is invalid or accepts the same lenient forms it
+        # always has.
+        return _parse_note_number(note)
+
+def _parse_note_number(note):
     try:
         base_note = note[0]
         if base_note not in NOTE_TO_MIDI:
@@ -52,90 +49,538 @@ def note_to_midi_number(note):
 def generate_scale_notes(root_note, scale_type, extension=None):
     try:
         root_midi = note_to_midi_number(root_note)
-        scale_key = f"{scale_type} {extension}" if extension else scale_type
+        key = scale_key(scale_type, extension)
         
-        if scale_key not in SCALE_PATTERNS:
-            raise MIDIGenerationError(f"Unsupported scale type: {scale_key}")
+        if key not in SCALE_PATTERNS:
+            raise MIDIGenerationError(f"Unsupported scale type: {key}")
         
-        pattern = SCALE_PATTERNS[scale_key]
+        pattern = SCALE_PATTERNS[key]
         return [root_midi + interval for interval in pattern]
     except Exception as e:
         raise MIDIGenerationError(f"Error generating scale: {str(e)}")
 
-def generate_midi(composition: Composition, output_file: str):
-    mid = mido.MidiFile()
-    track = mido.MidiTrack()
-    mid.tracks.append(track)
+NOTE_ON = 0x90
+NOTE_OFF = 0x80
+VELOCITY = 64
+# Status of the marker compact_events ends a stream with when its last
+# events were rests: the track ends after the marker's delta.
+END_OF_TRACK = None
+TICKS_PER_BEAT = 480
+# How deeply repeats and pattern calls may nest when expanded. Each level is
+# a generator frame, so an unbounded chain of calls would overflow the stack.
+MAX_NESTING = 200
+# How many events pass between calls to a checkpoint (see checkpointed).
+CHECKPOINT_EVENTS = 1 << 14
+
+def tempo_to_microseconds(bpm):
+    """Converts beats per minute to the microseconds-per-beat value of a set_tempo event."""
+    try:
+        tempo = mido.bpm2tempo(bpm)
+    except ZeroDivisionError:
+        raise MIDIGenerationError(f"Invalid tempo: {bpm}")
+    if not 0 < tempo <= 0xFFFFFF:
+        raise MIDIGenerationError(f"Invalid tempo: {bpm}")
+    return tempo
+
+def _check_note_range(midi_note, note):
+    if not 0 <= midi_note <= 127:
+        raise MIDIGenerationError(f"Note out of MIDI range: {note}")
+
+def iter_events(composition: Composition):
+    """Yields the composition's events as (delta_ticks, status, note, velocity) tuples.
+
+    status is NOTE_ON or NOTE_OFF on channel 0. Both MIDI encoders consume
+    this stream track by track (see iter_track_events), so they always
+    agree event for event; the tracks of a multi-track score are merged
+    here in time order, ties in track order, as mido.merge_tracks does.
 
-    tempo = mido.bpm2tempo(composition.tempo)
-    track.append(mido.MetaMessage('set_tempo', tempo=tempo))
+    Repeats and pattern calls are expanded here, as the events are
+    generated, so a block played many times is held only once. Patterns
+    must be defined before they are called.
+    """
+    tracks = split_tracks(composition)
+    if len(tracks) == 1:
+        return iter_track_events(tracks[0][1])
+    return _merge_events([iter_track_events(elements) for _, elements in tracks])
 
-    for element in composition.elements:
-        if not isinstance(element, MusicElement):
+def _absolute_events(events):
+    tick = 0
+    for delta, status, note, velocity in events:
+        tick += delta
+        yield (tick, status, note, velocity)
+
+def _merge_events(streams):
+    # heapq.merge breaks ties by stream order, and keeps each stream's order.
+    previous = 0
+    for tick, status, note, velocity in heapq.merge(*map(_absolute_events, streams), key=itemgetter(0)):
+        yield (tick - previous, status, note, velocity)
+        previous = tick
+
+def iter_track_events(elements):
+    """Yields the events of one element list returned by split_tracks."""
+    return _iter_element_events(elements, {}, [])
+
+def checkpointed(events, checkpoint=None, every=CHECKPOINT_EVENTS):
+    """Passes events through, calling checkpoint() after every `every` of them.
+
+    Repeats make the number of events unrelated to the length of the score,
+    so callers that may need to give up on one, such as the editor's
+    background compile, raise from checkpoint to stop it part way.
+    """
+    if checkpoint is None:
+        return events
+    return _checkpointed(iter(events), checkpoint, every)
+
+def _checkpointed(events, checkpoint, every):
+    while True:
+        batch = list(islice(events, every))
+        if not batch:
+            return
+        yield from batch
+        checkpoint()
+
+def split_tracks(composition: Composition):
+    """Splits composition into the (name, elements) of each of its MIDI tracks.
+
+    The first track, named None, holds the elements outside track blocks;
+    each track block follows as a track of its own, all starting together.
+    A block's elements are preceded by the pattern definitions before it,
+    so every track can be encoded on its own.
+    """
+    elements = composition.elements
+    if not isinstance(elements, (list, tuple)):
+        # A lazily parsed score (see streaming.parse_stream) can only be
+        # read once, so it is taken as a single track.
+        return [(None, _untracked(elements))]
+    if not any(element is not None and element.type == 'track' for element in elements):
+        return [(None, elements)]
+    first = []
+    definitions = []
+    tracks = [(None, first)]
+    for element in elements:
+        if element is None:
+            continue
+        if element.type == 'track':
+            name, body = element.value
+            tracks.append((name, definitions + body))
+        else:
+            first.append(element)
+            if element.type == 'pattern':
+                definitions.append(element)
+    return tracks
+
+def _iter_element_events(elements, patterns, calling, depth=0):
+    # patterns maps names to bodies as their definitions are reached;
+    # calling holds the patterns being expanded, to catch recursion, and
+    # depth counts the blocks being expanded.
+    for element in elements:
+        # NEWLINE placeholders are dropped by the parser; only guard against
+        # hand-built compositions that still carry them.
+        if element is None:
             continue
 
         if element.type == 'rest':
             try:
-                duration = DURATION_TO_TICKS[element.duration]
-                # For a rest, we just add the time delay without any note events
-                track.append(mido.Message('note_on', note=0, velocity=0, time=duration))
-                track.append(mido.Message('note_off', note=0, velocity=0, time=0))
+                duration = element.ticks if element.ticks is not None else DURATION_TO_TICKS[element.duration]
             except KeyError:
                 raise MIDIGenerationError(f"Invalid rest duration: {element.duration}")
+            # For a rest, we just add the time delay without any note events
+            yield (duration, NOTE_ON, 0, 0)
+            yield (0, NOTE_OFF, 0, 0)
 
         elif element.type == 'note':
-            try:
-                midi_note = note_to_midi_number(element.value)
-                duration = DURATION_TO_TICKS[element.duration]
-            except KeyError:
-                raise MIDIGenerationError(f"Invalid duration: {element.duration}")
+            if element.pitches is not None:
+                midi_note, duration = element.pitches[0], element.ticks
+            else:
+                try:
+                    midi_note = note_to_midi_number(element.value)
+                    duration = DURATION_TO_TICKS[element.duration]
+                except KeyError:
+                    raise MIDIGenerationError(f"Invalid duration: {element.duration}")
+            if not 0 <= midi_note <= 127:
+                _check_note_range(midi_note, element.value)
 
-            velocity = 64
-            track.append(mido.Message('note_on', note=midi_note, velocity=velocity, time=0))
-            track.append(mido.Message('note_off', note=midi_note, velocity=velocity, time=duration))
+            yield (0, NOTE_ON, midi_note, VELOCITY)
+            yield (duration, NOTE_OFF, midi_note, VELOCITY)
 
         elif element.type == 'scale':
             try:
                 scale_value = element.value
-                scale_notes = generate_scale_notes(
-                    scale_value['root'],
-                    scale_value['type'],
-                    scale_value['extension']
-                )
-                
-                note_duration = DURATION_TO_TICKS['qn']
-                velocity = 64
-                
-                for i, midi_note in enumerate(scale_notes):
-                    time = 0 if i == 0 else note_duration
-                    track.append(mido.Message('note_on', note=midi_note, velocity=velocity, time=time))
-                    track.append(mido.Message('note_off', note=midi_note, velocity=velocity, time=note_duration))
-                
-                for midi_note in reversed(scale_notes[:-1]):
-                    track.append(mido.Message('note_on', note=midi_note, velocity=velocity, time=note_duration))
-                    track.append(mido.Message('note_off', note=midi_note, velocity=velocity, time=note_duration))
-                
+                scale_notes = element.pitches
+                if scale_notes is None:
+                    scale_notes = generate_scale_notes(
+                        scale_value['root'],
+                        scale_value['type'],
+                        scale_value['extension']
+                    )
+                for midi_note in scale_notes:
+                    _check_note_range(midi_note, scale_value['root'])
             except Exception as e:
                 raise MIDIGenerationError(f"Error processing scale: {str(e)}")
 
+            note_duration = DURATION_TO_TICKS['qn']
+            for i, midi_note in enumerate(scale_notes):
+                time = 0 if i == 0 else note_duration
+                yield (time, NOTE_ON, midi_note, VELOCITY)
+                yield (note_duration, NOTE_OFF, midi_note, VELOCITY)
+
+            for midi_note in reversed(scale_notes[:-1]):
+                yield (note_duration, NOTE_ON, midi_note, VELOCITY)
+                yield (note_duration, NOTE_OFF, midi_note, VELOCITY)
+
         elif element.type == 'chord':
-            try:
-                chord_notes = [note_to_midi_number(note) for note in element.value]
-                duration = DURATION_TO_TICKS[element.duration]
-            except KeyError:
-                raise MIDIGenerationError(f"Invalid duration: {element.duration}")
+            if element.pitches is not None:
+                chord_notes, duration = element.pitches, element.ticks
+            else:
+                try:
+                    chord_notes = [note_to_midi_number(note) for note in element.value]
+                    duration = DURATION_TO_TICKS[element.duration]
+                except KeyError:
+                    raise MIDIGenerationError(f"Invalid duration: {element.duration}")
+            for midi_note, note in zip(chord_notes, element.value):
+                _check_note_range(midi_note, note)
+
+            for midi_note in chord_notes:
+                yield (0, NOTE_ON, midi_note, VELOCITY)
 
-            velocity = 64
-            for i, midi_note in enumerate(chord_notes):
-                time = 0 if i == 0 else 0
-                track.append(mido.Message('note_on', note=midi_note, velocity=velocity, time=time))
-            
             for i, midi_note in enumerate(chord_notes):
                 time = duration if i == 0 else 0
-                track.append(mido.Message('note_off', note=midi_note, velocity=velocity, time=time))
+                yield (time, NOTE_OFF, midi_note, VELOCITY)
+
+        elif element.type == 'repeat':
+            count, body = element.value
+            if depth >= MAX_NESTING:
+                raise MIDIGenerationError(f"Blocks nested more than {MAX_NESTING} deep")
+            for _ in range(count):
+                yield from _iter_element_events(body, patterns, calling, depth + 1)
+
+        elif element.type == 'pattern':
+            name, body = element.value
+            patterns[name] = body
+
+        elif element.type == 'call':
+            name = element.value
+            body = patterns.get(name)
+            if body is None:
+                raise MIDIGenerationError(f"Undefined pattern: {name}")
+            if name in calling:
+                raise MIDIGenerationError(f"Pattern calls itself: {name}")
+            if depth >= MAX_NESTING:
+                raise MIDIGenerationError(f"Pattern calls nested more than {MAX_NESTING} deep: {name}")
+            calling.append(name)
+            yield from _iter_element_events(body, patterns, calling, depth + 1)
+            calling.pop()
+
+        elif element.type == 'track':
+            # split_tracks takes the top-level ones out.
+            raise MIDIGenerationError("Tracks must be at the top level of a score")
+
+def compact_events(events, velocity_zero_note_offs=False):
+    """Rewrites an event stream in fewer bytes without changing its timing.
+
+    Rests' silent placeholder notes are dropped, their delay carried into
+    the next event's delta (or, at the end, onto an END_OF_TRACK marker),
+    and the events of each tick are grouped note-offs first, so a status
+    byte is written once per group rather than once per event. With
+    velocity_zero_note_offs, note-offs become note-ons with velocity 0,
+    which MIDI treats the same, so every event shares one running status.
+    """
+    carry = 0
+    # The first event of the current tick, and any more at the same tick.
+    first = None
+    run = None
+    for event in events:
+        delta, status, note, velocity = event
+        if note == 0 and velocity == 0:
+            # Nothing below C0 is ever played, so this is a rest.
+            carry += delta
+            continue
+        if carry:
+            delta += carry
+            carry = 0
+            event = (delta, status, note, velocity)
+        if velocity_zero_note_offs and status == NOTE_OFF:
+            event = (delta, NOTE_ON, note, 0)
+        if delta or first is None:
+            if run is not None:
+                yield from _grouped(run)
+                run = None
+            elif first is not None:
+                yield first
+            first = event
+        elif run is None:
+            run = [first, event]
+        else:
+            run.append(event)
+    if run is not None:
+        yield from _grouped(run)
+    elif first is not None:
+        yield first
+    if carry:
+        yield (carry, END_OF_TRACK, 0, 0)
+
+def _grouped(run):
+    """Orders events of one tick note-offs first, if that changes nothing heard."""
+    if all(event[1] == run[0][1] for event in run):
+        return run
+    struck = set()
+    for _, status, note, velocity in run:
+        if status == NOTE_ON and velocity:
+            struck.add(note)
+        elif note in struck:
+            # Struck and released within the tick: the order matters.
+            return run
+    offs = [event for event in run if event[1] == NOTE_OFF]
+    ons = [event for event in run if event[1] != NOTE_OFF]
+    # The tick's delta moves to whichever event now comes first.
+    grouped = [(0, status, note, velocity) for _, status, note, velocity in offs + ons]
+    grouped[0] = (run[0][0],) + grouped[0][1:]
+    return grouped
+
+_MESSAGE_TYPES = {NOTE_ON: 'note_on', NOTE_OFF: 'note_off'}
+
+def _track_name(name):
+    # Pattern-style names lose their sigil in the track_name meta event.
+    return name[1:]
+
+def build_midi_file(composition: Composition, compact=False, velocity_zero_note_offs=False, checkpoint=None):
+    """Builds a mido.MidiFile with a track per voice (see split_tracks).
+
+    The tempo is set at the start of the first track. compact,
+    velocity_zero_note_offs and checkpoint are as for encode_midi.
+    """
+    mid = mido.MidiFile(ticks_per_beat=TICKS_PER_BEAT)
+    tempo = tempo_to_microseconds(composition.tempo)
+    for index, (name, elements) in enumerate(split_tracks(composition)):
+        track = mido.MidiTrack()
+        mid.tracks.append(track)
+        if name is not None:
+            track.append(mido.MetaMessage('track_name', name=_track_name(name)))
+        if index == 0:
+            track.append(mido.MetaMessage('set_tempo', tempo=tempo))
+        for delta, status, note, velocity in _track_events(elements, compact, velocity_zero_note_offs, checkpoint):
+            if status is END_OF_TRACK:
+                track.append(mido.MetaMessage('end_of_track', time=delta))
+            else:
+                track.append(mido.Message(_MESSAGE_TYPES[status], note=note, velocity=velocity, time=delta))
+    return mid
+
+def _track_events(elements, compact=False, velocity_zero_note_offs=False, checkpoint=None):
+    events = checkpointed(iter_track_events(elements), checkpoint)
+    if compact or velocity_zero_note_offs:
+        events = compact_events(events, velocity_zero_note_offs)
+    return events
+
+_VARIABLE_LENGTH_CACHE = {}
+
+def encode_variable_length(value):
+    """Encodes a delta time as a MIDI variable-length quantity."""
+    encoded = _VARIABLE_LENGTH_CACHE.get(value)
+    if encoded is None:
+        groups = [value & 0x7F]
+        remaining = value >> 7
+        while remaining:
+            groups.append((remaining & 0x7F) | 0x80)
+            remaining >>= 7
+        encoded = bytes(reversed(groups))
+        # Delta times are drawn from a handful of note lengths, so the cache
+        # stays tiny; the bound only guards against pathological input.
+        if len(_VARIABLE_LENGTH_CACHE) < 4096:
+            _VARIABLE_LENGTH_CACHE[value] = encoded
+    return encoded
+
+def iter_encoded_track(events, tempo, chunk_size=1 << 16, name=None):
+    """Encodes events into the body of an MTrk chunk, yielding it in pieces.
+
+    Matches mido's writer byte for byte: leading track_name (if name is
+    given) and set_tempo (unless tempo is None) meta events, running status
+    for repeated status bytes, and a final end_of_track, delayed by an
+    END_OF_TRACK marker's delta if the events end with one. Pieces are
+    yielded once they reach roughly chunk_size bytes, so callers can write
+    them out without holding the whole track.
+    """
+    data = bytearray()
+    if name is not None:
+        encoded_name = _track_name(name).encode('latin-1')
+        data += b'\x00\xff\x03' + encode_variable_length(len(encoded_name)) + encoded_name
+    if tempo is not None:
+        data += b'\x00\xff\x51\x03'
+        data += tempo.to_bytes(3, 'big')
+    append = data.append
+    extend = data.extend
+    vlq_cache = _VARIABLE_LENGTH_CACHE
+    running_status = None
+    for delta, status, note, velocity in events:
+        if delta < 0x80:
+            append(delta)
+        else:
+            extend(vlq_cache.get(delta) or encode_variable_length(delta))
+        if status != running_status:
+            if status is END_OF_TRACK:
+                # The marker's delta is already written.
+                extend(b'\xff\x2f\x00')
+                break
+            append(status)
+            running_status = status
+        append(note)
+        append(velocity)
+        if len(data) >= chunk_size:
+            yield data
+            data = bytearray()
+            append = data.append
+            extend = data.extend
+    else:
+        extend(b'\x00\xff\x2f\x00')
+    yield data
+
+def encode_track(events, tempo, name=None):
+    """Encodes events into the body of an MTrk chunk."""
+    return bytearray().join(iter_encoded_track(events, tempo, name=name))
+
+def _chunk(chunk_type, data):
+    return chunk_type + len(data).to_bytes(4, 'big') + data
+
+def _midi_file(track_bodies):
+    """Joins encoded MTrk bodies into a type 1 Standard MIDI File."""
+    track_bodies = list(track_bodies)
+    header = struct.pack('>hhh', 1, len(track_bodies), TICKS_PER_BEAT)
+    return _chunk(b'MThd', header) + b''.join(_chunk(b'MTrk', body) for body in track_bodies)
+
+def encode_events(events, tempo):
+    """Encodes (delta_ticks, status, note, velocity) events to Standard MIDI File bytes.
+
+    tempo is in microseconds per beat.
+    """
+    return _midi_file([encode_track(events, tempo)])
+
+def _encode_track_job(job, checkpoint=None):
+    # Module level, so process pools can pickle it.
+    name, elements, tempo, compact, velocity_zero_note_offs = job
+    return encode_track(_track_events(elements, compact, velocity_zero_note_offs, checkpoint), tempo, name)
+
+def encode_midi(composition: Composition, executor=None, compact=False, velocity_zero_note_offs=False,
+                checkpoint=None):
+    """Encodes composition to Standard MIDI File bytes without mido.Message objects.
+
+    The output is identical to saving build_midi_file(composition) with mido.
+    Each track is encoded independently; executor, such as a
+    concurrent.futures.ProcessPoolExecutor, encodes them in parallel.
+    compact passes each track's events through compact_events, for a
+    smaller file that plays the same; velocity_zero_note_offs implies it.
+    checkpoint, if given, is called every CHECKPOINT_EVENTS events and may
+    raise to abandon the encoding; the tracks are then encoded in this
+    thread, as a callback cannot be sent to the executor.
+    """
+    tempo = tempo_to_microseconds(composition.tempo)
+    tracks = split_tracks(composition)
+    if len(tracks) == 1:
+        return encode_events(_track_events(tracks[0][1], compact, velocity_zero_note_offs, checkpoint), tempo)
+    # Only the first track sets the tempo.
+    jobs = [(name, elements, None if index else tempo, compact, velocity_zero_note_offs)
+            for index, (name, elements) in enumerate(tracks)]
+    if executor is None or checkpoint is not None:
+        return _midi_file(_encode_track_job(job, checkpoint) for job in jobs)
+    return _midi_file(executor.map(_encode_track_job, jobs))
+
+def _profiled_encode(profiler, composition, compact=False, velocity_zero_note_offs=False, checkpoint=None):
+    """encode_midi with event construction and encoding timed as separate phases."""
+    tempo = tempo_to_microseconds(composition.tempo)
+    with profiler.phase('events') as counts:
+        tracks = [(name, list(_track_events(elements, compact, velocity_zero_note_offs, checkpoint)))
+                  for name, elements in split_tracks(composition)]
+        counts['events'] = sum(len(events) for _, events in tracks)
+    with profiler.phase('encode') as counts:
+        if len(tracks) == 1:
+            midi_data = encode_events(tracks[0][1], tempo)
+        else:
+            midi_data = _midi_file(encode_track(events, None if index else tempo, name)
+                                   for index, (name, events) in enumerate(tracks))
+        counts['bytes'] = len(midi_data)
+    return midi_data
+
+def _untracked(elements):
+    for element in elements:
+        if element is not None and element.type == 'track':
+            raise MIDIGenerationError("Scores with tracks cannot be streamed")
+        yield element
+
+def stream_midi(composition: Composition, output_file, compact=False, velocity_zero_note_offs=False):
+    """Writes composition to a binary file object while its events are generated.
+
+    Encoded events are flushed in bounded pieces, so when composition.elements
+    is a lazy iterator (see streaming.parse_stream) memory stays flat however
+    long the score is. Only single-track scores can be streamed. compact and
+    velocity_zero_note_offs are as for encode_midi. The track length is
+    patched in at the end, which needs a seekable output; otherwise the
+    track is buffered before writing. Returns the number of bytes written.
+    """
+    tempo = tempo_to_microseconds(composition.tempo)
+    header = _chunk(b'MThd', struct.pack('>hhh', 1, 1, TICKS_PER_BEAT))
+    tracks = split_tracks(composition)
+    if len(tracks) > 1:
+        raise MIDIGenerationError("Scores with tracks cannot be streamed")
+    pieces = iter_encoded_track(_track_events(tracks[0][1], compact, velocity_zero_note_offs), tempo)
+    try:
+        seekable = output_file.seekable()
+    except AttributeError:
+        seekable = False
+    try:
+        if not seekable:
+            data = header + _chunk(b'MTrk', bytearray().join(pieces))
+            output_file.write(data)
+            return len(data)
+
+        start = output_file.tell()
+        output_file.write(header + b'MTrk\x00\x00\x00\x00')
+        length = 0
+        for piece in pieces:
+            output_file.write(piece)
+            length += len(piece)
+        end = output_file.tell()
+        output_file.seek(start + len(header) + 4)
+        output_file.write(length.to_bytes(4, 'big'))
+        output_file.seek(end)
+        return end - start
+    except IOError:
+        raise MIDIGenerationError(f"Unable to write MIDI stream: {output_file}")
+
+def generate_midi(composition: Composition, output_file=None, fast=False, executor=None,
+                  compact=False, velocity_zero_note_offs=False, checkpoint=None):
+    """Renders composition as a MIDI file.
+
+    output_file may be a path or a writable binary file object. If it is
+    None, the file's contents are returned as bytes instead. fast selects
+    the direct encoder (encode_midi), which skips mido but writes the same
+    bytes, and can encode tracks in parallel on executor. compact and
+    velocity_zero_note_offs shrink the file, and checkpoint can abandon it
+    part way (see encode_midi). Under a profiling.Profiler the tracks are
+    encoded in this thread, phase by phase.
+    """
+    profiler = active_profiler()
+    if fast and profiler is not None:
+        midi_data = _profiled_encode(profiler, composition, compact, velocity_zero_note_offs, checkpoint)
+    elif fast:
+        midi_data = encode_midi(composition, executor, compact, velocity_zero_note_offs, checkpoint)
+    else:
+        with phase('events') as counts:
+            mid = build_midi_file(composition, compact, velocity_zero_note_offs, checkpoint)
+            counts['events'] = sum(len(track) for track in mid.tracks)
+        with phase('save') as counts:
+            buffer = BytesIO()
+            mid.save(file=buffer)
+            midi_data = buffer.getvalue()
+            counts['bytes'] = len(midi_data)
+
+    if output_file is None:
+        return midi_data
 
     try:
-        mid.save(output_file)
+        with phase('write'):
+            if hasattr(output_file, 'write'):
+                output_file.write(midi_data)
+            else:
+                with open(output_file, 'wb') as file:
+                    file.write(midi_data)
     except IOError:
         raise MIDIGenerationError(f"Unable to save MIDI file: {output_file}")
 
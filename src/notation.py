@@ -0,0 +1,35 @@
+"""Pitch, duration and scale tables shared by the parser and the MIDI generator."""
+
+NOTE_TO_MIDI = {
+    'C': 60, 'D': 62, 'E': 64, 'F': 65, 'G': 67, 'A': 69, 'B': 71
+}
+
+DURATION_TO_TICKS = {
+    # Note durations
+    'wn': 1920, 'hn': 960, 'qn': 480, 'en': 240, 'sn': 120,
+    # Rest durations (same timing as corresponding notes)
+    'wr': 1920, 'hr': 960, 'qr': 480, 'er': 240, 'sr': 120
+}
+
+SCALE_PATTERNS = {
+    'maj': [0, 2, 4, 5, 7, 9, 11, 12],
+    'min': [0, 2, 3, 5, 7, 8, 10, 12],
+    'maj pent': [0, 2, 4, 7, 9, 12],
+    'min pent': [0, 3, 5, 7, 10, 12],
+    'chrom': [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12]
+}
+
+def _build_pitch_table():
+    table = {}
+    for letter, base in NOTE_TO_MIDI.items():
+        for accidental, offset in (('', 0), ('#', 1), ('b', -1)):
+            for octave in range(10):
+                table[f"{letter}{accidental}{octave}"] = base + offset + (octave - 4) * 12
+    return table
+
+# Every spelling the lexer accepts as a NOTE (A0 to G#9, plain, sharp and
+# flat) mapped to its MIDI number, so resolving a note is one dict lookup.
+PITCH_TABLE = _build_pitch_table()
+
+def scale_key(scale_type, extension=None):
+    return f"{scale_type} {extension}" if extension else scale_type
@@ -1,19 +1,45 @@
-import ply.yacc as yacc
-from lexer import SymphonyLangLexerError, tokens, lexer
+import copy
+import threading
+from lexer import SymphonyLangLexerError, tokens, new_lexer
+from notation import DURATION_TO_TICKS, PITCH_TABLE, SCALE_PATTERNS, scale_key
+from profiling import active_profiler
+
+# Prebuilt LALR tables shipped next to this module, one per start symbol:
+# whole scores, and header-less segments of element lines (used by the
+# compilation cache). Regenerate them with build_tables.py after changing
+# the grammar.
+PARSETAB_MODULES = {
+    'composition': 'parsetab',
+    'element_list': 'parsetab_segment',
+}
 
 class SymphonyLangParserError(Exception):
     pass
 
 class MusicElement:
-    def __init__(self, element_type, value=None, duration=None):
+    # Slotted: large scores hold millions of these. pitches (a tuple of MIDI
+    # numbers) and ticks are resolved once by the parser; elements built by
+    # hand leave them as None and the generator resolves value/duration.
+    #
+    # Blocks are elements too: 'repeat' has value (count, body), 'pattern'
+    # (name, body), 'call' the pattern's name and 'track' (name or None,
+    # body). body is a list of elements kept as written, however often it
+    # is played; the generator expands it while encoding.
+    __slots__ = ('type', 'value', 'duration', 'pitches', 'ticks')
+
+    def __init__(self, element_type, value=None, duration=None, pitches=None, ticks=None):
         self.type = element_type
         self.value = value
         self.duration = duration
+        self.pitches = pitches
+        self.ticks = ticks
 
     def __repr__(self):
         return f"MusicElement({self.type}, {self.value}, {self.duration})"
 
 class Composition:
+    __slots__ = ('tempo', 'elements')
+
     def __init__(self, tempo, elements):
         self.tempo = tempo
         self.elements = elements
@@ -32,50 +58,95 @@ def p_tempo_setting(p):
 def p_element_list(p):
     '''element_list : element
                     | element_list element'''
+    # Append in place: copying the list on every reduction makes parsing
+    # quadratic in the length of the score. NEWLINE elements arrive as None
+    # and are dropped here rather than in a post-pass.
     if len(p) == 2:
-        p[0] = [p[1]]
+        p[0] = [] if p[1] is None else [p[1]]
     else:
-        p[0] = p[1] + [p[2]]
+        p[0] = p[1]
+        if p[2] is not None:
+            p[0].append(p[2])
 
 def p_element(p):
     '''element : note
                | scale
                | chord
                | rest
+               | repeat
+               | pattern
+               | call
+               | track
                | NEWLINE'''
     if len(p) == 2 and isinstance(p[1], MusicElement):
         p[0] = p[1]
     else:
         p[0] = None
 
+# Token values are fresh strings for every token. The parser maps them to
+# canonical shared values instead, so a large score costs little more than
+# its element objects. Only immutable values (note names, pitch tuples) are
+# shared; each element gets its own scale dict or chord list, so mutating one
+# element never changes another or a later parse.
+_durations = {duration: (duration, ticks) for duration, ticks in DURATION_TO_TICKS.items()}
+_notes = {}
+_scale_values = {}
+_chord_pitches = {}
+_MAX_SHARED_CHORDS = 4096
+
+def _note(note):
+    value = _notes.get(note)
+    if value is None:
+        value = _notes[note] = (note, (PITCH_TABLE[note],))
+    return value
+
+def _scale_value(root, scale_type, extension):
+    key = (_note(root)[0], scale_type, extension)
+    value = _scale_values.get(key)
+    if value is None:
+        pattern = SCALE_PATTERNS.get(scale_key(scale_type, extension))
+        # Unsupported combinations (e.g. 'maj chrom') stay unresolved so the
+        # generator reports them.
+        pitches = None if pattern is None else tuple(PITCH_TABLE[key[0]] + interval for interval in pattern)
+        value = _scale_values[key] = (key, pitches)
+    (root, scale_type, extension), pitches = value
+    return {'root': root, 'type': scale_type, 'extension': extension}, pitches
+
+def _chord_value(notes):
+    names = [_note(note)[0] for note in notes]
+    key = tuple(names)
+    pitches = _chord_pitches.get(key)
+    if pitches is None:
+        pitches = tuple(PITCH_TABLE[note] for note in names)
+        if len(_chord_pitches) < _MAX_SHARED_CHORDS:
+            _chord_pitches[key] = pitches
+    return names, pitches
+
 def p_rest(p):
     '''rest : REST'''
-    p[0] = MusicElement('rest', None, p[1])
+    duration, ticks = _durations[p[1]]
+    p[0] = MusicElement('rest', None, duration, (), ticks)
 
 def p_note(p):
     '''note : NOTE DURATION'''
-    p[0] = MusicElement('note', p[1], p[2])
+    note, pitches = _note(p[1])
+    duration, ticks = _durations[p[2]]
+    p[0] = MusicElement('note', note, duration, pitches, ticks)
 
 def p_scale(p):
     '''scale : NOTE SCALE_TYPE
              | NOTE SCALE_TYPE SCALE_EXTENSION'''
     if len(p) == 3:
-        scale_value = {
-            'root': p[1],
-            'type': p[2],
-            'extension': None
-        }
+        scale_value, pitches = _scale_value(p[1], p[2], None)
     elif len(p) == 4:
-        scale_value = {
-            'root': p[1],
-            'type': p[2],
-            'extension': p[3]
-        }
-    p[0] = MusicElement('scale', scale_value, 'qn')
+        scale_value, pitches = _scale_value(p[1], p[2], p[3])
+    p[0] = MusicElement('scale', scale_value, 'qn', pitches, DURATION_TO_TICKS['qn'])
 
 def p_chord(p):
     '''chord : LBRACKET note_list RBRACKET DURATION'''
-    p[0] = MusicElement('chord', p[2], p[4])
+    notes, pitches = _chord_value(p[2])
+    duration, ticks = _durations[p[4]]
+    p[0] = MusicElement('chord', notes, duration, pitches, ticks)
 
 def p_note_list(p):
     '''note_list : NOTE
@@ -83,7 +154,37 @@ def p_note_list(p):
     if len(p) == 2:
         p[0] = [p[1]]
     else:
-        p[0] = p[1] + [p[2]]
+        p[0] = p[1]
+        p[0].append(p[2])
+
+def p_repeat(p):
+    '''repeat : REPEAT NUMBER LBRACE element_list RBRACE'''
+    p[0] = MusicElement('repeat', (p[2], p[4]))
+
+def p_pattern(p):
+    '''pattern : PATTERN NAME LBRACE element_list RBRACE'''
+    p[0] = MusicElement('pattern', (p[2], p[4]))
+
+def p_call(p):
+    '''call : NAME'''
+    p[0] = MusicElement('call', p[1])
+
+def p_track(p):
+    '''track : TRACK LBRACE element_list RBRACE
+             | TRACK NAME LBRACE element_list RBRACE'''
+    if len(p) == 5:
+        p[0] = MusicElement('track', (None, p[3]))
+    else:
+        p[0] = MusicElement('track', (p[2], p[4]))
+
+def block_depth(line):
+    """Returns how many more blocks line opens than it closes.
+
+    Score splitters use it to keep a block's lines together, as a block
+    only parses as a whole.
+    """
+    code = line.split('#', 1)[0]
+    return code.count('{') - code.count('}')
 
 def p_error(p):
     if p:
@@ -91,19 +192,96 @@ def p_error(p):
     else:
         raise SymphonyLangParserError("Syntax error at EOF")
 
-parser = yacc.yacc()
+_parsers = {}
+_parser_lock = threading.Lock()
+
+def get_parser(start='composition'):
+    """Returns the template parser for start, loading its prebuilt tables on first use."""
+    parser = _parsers.get(start)
+    if parser is None:
+        with _parser_lock:
+            parser = _parsers.get(start)
+            if parser is None:
+                # Importing ply.yacc is most of the cost of building a parser,
+                # so it is deferred along with the table load. Nothing is
+                # written to disk: stale tables are rebuilt in memory only, and
+                # grammar warnings are left to build_tables.py.
+                import ply.yacc as yacc
+                parser = yacc.yacc(start=start, debug=False, write_tables=False,
+                                   tabmodule=PARSETAB_MODULES[start], errorlog=yacc.NullLogger())
+                _parsers[start] = parser
+    return parser
+
+def new_parser(start='composition'):
+    """Returns a parser with its own stacks, sharing the read-only LALR tables."""
+    return copy.copy(get_parser(start))
+
+class _TokenReplay:
+    """Stands in for the lexer, handing the parser tokens lexed beforehand.
+
+    error, the lexer error that ended the tokens if any, is raised in place
+    of the token that failed, so errors come out as they would unprofiled.
+    """
 
-def parse_symphony_lang(input_text):
+    def __init__(self, tokens, error=None):
+        self._tokens = iter(tokens)
+        self._error = error
+
+    def token(self):
+        token = next(self._tokens, None)
+        if token is None and self._error is not None:
+            raise self._error
+        return token
+
+def _profiled_parse(profiler, lexer_instance, parser_instance):
+    # PLY pulls tokens as it parses, so they are lexed up front to time the
+    # two phases apart.
+    with profiler.phase('lex') as counts:
+        tokens = []
+        error = None
+        try:
+            for token in iter(lexer_instance.token, None):
+                tokens.append(token)
+        except SymphonyLangLexerError as e:
+            error = e
+        counts['tokens'] = len(tokens)
+    with profiler.phase('parse') as counts:
+        result = parser_instance.parse(lexer=_TokenReplay(tokens, error))
+        counts['elements'] = len(result.elements if isinstance(result, Composition) else result)
+    return result
+
+def _run_parser(text, first_line, lexer_instance, parser_instance):
     try:
-        lexer.input(input_text.strip())
-        result = parser.parse(lexer=lexer)
-        # Filter out None elements that come from newlines
-        if result:
-            result.elements = [elem for elem in result.elements if elem is not None]
-        return result
+        lexer_instance.lineno = first_line
+        lexer_instance.input(text)
+        profiler = active_profiler()
+        if profiler is not None:
+            return _profiled_parse(profiler, lexer_instance, parser_instance)
+        return parser_instance.parse(lexer=lexer_instance)
     except SymphonyLangLexerError as e:
         raise SymphonyLangParserError(f"Lexer error: {str(e)}")
 
+def parse_symphony_lang(input_text, lexer_instance=None, parser_instance=None, strip=True):
+    # Like the lexer, the module-level parser is a template: PLY keeps the
+    # parse stacks on the parser object, so each call works on its own copy
+    # unless the caller supplies instances it owns (see SymphonyCompiler).
+    # strip=False is for callers that parse a score piecewise and have
+    # already stripped the whole text.
+    lexer_instance = lexer_instance or new_lexer()
+    parser_instance = parser_instance or new_parser()
+    return _run_parser(input_text.strip() if strip else input_text, 1, lexer_instance, parser_instance)
+
+def parse_segment(segment_text, first_line=1, lexer_instance=None, parser_instance=None):
+    """Parses element lines without a tempo header into a list of MusicElements.
+
+    first_line is the line the segment starts on within the whole score, so
+    error messages point at the right place. parser_instance, if given, must
+    come from new_parser('element_list').
+    """
+    lexer_instance = lexer_instance or new_lexer()
+    parser_instance = parser_instance or new_parser('element_list')
+    return _run_parser(segment_text, first_line, lexer_instance, parser_instance)
+
 if __name__ == "__main__":
     test_input = """
     tempo=120
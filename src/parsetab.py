@@ -0,0 +1,55 @@
+
+# parsetab.py
+# This file is automatically generated. Do not edit.
+# pylint: disable=W,C,R
+_tabversion = '3.10'
+
+_lr_method = 'LALR'
+
+_lr_signature = 'compositionCHORD DURATION EQUALS LBRACE LBRACKET NAME NEWLINE NOTE NUMBER PATTERN RBRACE RBRACKET REPEAT REST SCALE_EXTENSION SCALE_TYPE TEMPO TRACKcomposition : tempo_setting element_listtempo_setting : TEMPO EQUALS NUMBERelement_list : element\n                    | element_list elementelement : note\n               | scale\n               | chord\n               | rest\n               | repeat\n               | pattern\n               | call\n               | track\n               | NEWLINErest : RESTnote : NOTE DURATIONscale : NOTE SCALE_TYPE\n             | NOTE SCALE_TYPE SCALE_EXTENSIONchord : LBRACKET note_list RBRACKET DURATIONnote_list : NOTE\n                 | note_list NOTErepeat : REPEAT NUMBER LBRACE element_list RBRACEpattern : PATTERN NAME LBRACE element_list RBRACEcall : NAMEtrack : TRACK LBRACE element_list RBRACE\n             | TRACK NAME LBRACE element_list RBRACE'
+    
+_lr_action_items = {'TEMPO':([0,],[3,]),'$end':([1,4,5,6,7,8,9,10,11,12,13,14,17,20,23,24,25,33,40,43,45,46,47,],[0,-1,-3,-5,-6,-7,-8,-9,-10,-11,-12,-13,-14,-23,-4,-15,-16,-17,-18,-24,-21,-22,-25,]),'NEWLINE':([2,4,5,6,7,8,9,10,11,12,13,14,17,20,23,24,25,30,32,33,36,37,38,39,40,41,42,43,44,45,46,47,],[14,14,-3,-5,-6,-7,-8,-9,-10,-11,-12,-13,-14,-23,-4,-15,-16,14,-2,-17,14,14,14,14,-18,14,14,-24,14,-21,-22,-25,]),'NOTE':([2,4,5,6,7,8,9,10,11,12,13,14,16,17,20,23,24,25,26,27,30,32,33,35,36,37,38,39,40,41,42,43,44,45,46,47,],[15,15,-3,-5,-6,-7,-8,-9,-10,-11,-12,-13,27,-14,-23,-4,-15,-16,35,-19,15,-2,-17,-20,15,15,15,15,-18,15,15,-24,15,-21,-22,-25,]),'LBRACKET':([2,4,5,6,7,8,9,10,11,12,13,14,17,20,23,24,25,30,32,33,36,37,38,39,40,41,42,43,44,45,46,47,],[16,16,-3,-5,-6,-7,-8,-9,-10,-11,-12,-13,-14,-23,-4,-15,-16,16,-2,-17,16,16,16,16,-18,16,16,-24,16,-21,-22,-25,]),'REST':([2,4,5,6,7,8,9,10,11,12,13,14,17,20,23,24,25,30,32,33,36,37,38,39,40,41,42,43,44,45,46,47,],[17,17,-3,-5,-6,-7,-8,-9,-10,-11,-12,-13,-14,-23,-4,-15,-16,17,-2,-17,17,17,17,17,-18,17,17,-24,17,-21,-22,-25,]),'REPEAT':([2,4,5,6,7,8,9,10,11,12,13,14,17,20,23,24,25,30,32,33,36,37,38,39,40,41,42,43,44,45,46,47,],[18,18,-3,-5,-6,-7,-8,-9,-10,-11,-12,-13,-14,-23,-4,-15,-16,18,-2,-17,18,18,18,18,-18,18,18,-24,18,-21,-22,-25,]),'PATTERN':([2,4,5,6,7,8,9,10,11,12,13,14,17,20,23,24,25,30,32,33,36,37,38,39,40,41,42,43,44,45,46,47,],[19,19,-3,-5,-6,-7,-8,-9,-10,-11,-12,-13,-14,-23,-4,-15,-16,19,-2,-17,19,19,19,19,-18,19,19,-24,19,-21,-22,-25,]),'NAME':([2,4,5,6,7,8,9,10,11,12,13,14,17,19,20,21,23,24,25,30,32,33,36,37,38,39,40,41,42,43,44,45,46,47,],[20,20,-3,-5,-6,-7,-8,-9,-10,-11,-12,-13,-14,29,-23,31,-4,-15,-16,20,-2,-17,20,20,20,20,-18,20,20,-24,20,-21,-22,-25,]),'TRACK':([2,4,5,6,7,8,9,10,11,12,13,14,17,20,23,24,25,30,32,33,36,37,38,39,40,41,42,43,44,45,46,47,],[21,21,-3,-5,-6,-7,-8,-9,-10,-11,-12,-13,-14,-23,-4,-15,-16,21,-2,-17,21,21,21,21,-18,21,21,-24,21,-21,-22,-25,]),'EQUALS':([3,],[22,]),'RBRACE':([5,6,7,8,9,10,11,12,13,14,17,20,23,24,25,33,38,40,41,42,43,44,45,46,47,],[-3,-5,-6,-7,-8,-9,-10,-11,-12,-13,-14,-23,-4,-15,-16,-17,43,-18,45,46,-24,47,-21,-22,-25,]),'DURATION':([15,34,],[24,40,]),'SCALE_TYPE':([15,],[25,]),'NUMBER':([18,22,],[28,32,]),'LBRACE':([21,28,29,31,],[30,36,37,39,]),'SCALE_EXTENSION':([25,],[33,]),'RBRACKET':([26,27,35,],[34,-19,-20,]),}
+
+_lr_action = {}
+for _k, _v in _lr_action_items.items():
+   for _x,_y in zip(_v[0],_v[1]):
+      if not _x in _lr_action:  _lr_action[_x] = {}
+      _lr_action[_x][_k] = _y
+del _lr_action_items
+
+_lr_goto_items = {'composition':([0,],[1,]),'tempo_setting':([0,],[2,]),'element_list':([2,30,36,37,39,],[4,38,41,42,44,]),'element':([2,4,30,36,37,38,39,41,42,44,],[5,23,5,5,5,23,5,23,23,23,]),'note':([2,4,30,36,37,38,39,41,42,44,],[6,6,6,6,6,6,6,6,6,6,]),'scale':([2,4,30,36,37,38,39,41,42,44,],[7,7,7,7,7,7,7,7,7,7,]),'chord':([2,4,30,36,37,38,39,41,42,44,],[8,8,8,8,8,8,8,8,8,8,]),'rest':([2,4,30,36,37,38,39,41,42,44,],[9,9,9,9,9,9,9,9,9,9,]),'repeat':([2,4,30,36,37,38,39,41,42,44,],[10,10,10,10,10,10,10,10,10,10,]),'pattern':([2,4,30,36,37,38,39,41,42,44,],[11,11,11,11,11,11,11,11,11,11,]),'call':([2,4,30,36,37,38,39,41,42,44,],[12,12,12,12,12,12,12,12,12,12,]),'track':([2,4,30,36,37,38,39,41,42,44,],[13,13,13,13,13,13,13,13,13,13,]),'note_list':([16,],[26,]),}
+
+_lr_goto = {}
+for _k, _v in _lr_goto_items.items():
+   for _x, _y in zip(_v[0], _v[1]):
+       if not _x in _lr_goto: _lr_goto[_x] = {}
+       _lr_goto[_x][_k] = _y
+del _lr_goto_items
+_lr_productions = [
+  ("S' -> composition","S'",1,None,None,None),
+  ('composition -> tempo_setting element_list','composition',2,'p_composition','parser.py',50),
+  ('tempo_setting -> TEMPO EQUALS NUMBER','tempo_setting',3,'p_tempo_setting','parser.py',54),
+  ('element_list -> element','element_list',1,'p_element_list','parser.py',58),
+  ('element_list -> element_list element','element_list',2,'p_element_list','parser.py',59),
+  ('element -> note','element',1,'p_element','parser.py',71),
+  ('element -> scale','element',1,'p_element','parser.py',72),
+  ('element -> chord','element',1,'p_element','parser.py',73),
+  ('element -> rest','element',1,'p_element','parser.py',74),
+  ('element -> repeat','element',1,'p_element','parser.py',75),
+  ('element -> pattern','element',1,'p_element','parser.py',76),
+  ('element -> call','element',1,'p_element','parser.py',77),
+  ('element -> track','element',1,'p_element','parser.py',78),
+  ('element -> NEWLINE','element',1,'p_element','parser.py',79),
+  ('rest -> REST','rest',1,'p_rest','parser.py',123),
+  ('note -> NOTE DURATION','note',2,'p_note','parser.py',128),
+  ('scale -> NOTE SCALE_TYPE','scale',2,'p_scale','parser.py',134),
+  ('scale -> NOTE SCALE_TYPE SCALE_EXTENSION','scale',3,'p_scale','parser.py',135),
+  ('chord -> LBRACKET note_list RBRACKET DURATION','chord',4,'p_chord','parser.py',143),
+  ('note_list -> NOTE','note_list',1,'p_note_list','parser.py',149),
+  ('note_list -> note_list NOTE','note_list',2,'p_note_list','parser.py',150),
+  ('repeat -> REPEAT NUMBER LBRACE element_list RBRACE','repeat',5,'p_repeat','parser.py',158),
+  ('pattern -> PATTERN NAME LBRACE element_list RBRACE','pattern',5,'p_pattern','parser.py',162),
+  ('call -> NAME','call',1,'p_call','parser.py',166),
+  ('track -> TRACK LBRACE element_list RBRACE','track',4,'p_track','parser.py',170),
+  ('track -> TRACK NAME LBRACE element_list RBRACE','track',5,'p_track','parser.py',171),
+]
@@ -0,0 +1,55 @@
+
+# parsetab_segment.py
+# This file is automatically generated. Do not edit.
+# pylint: disable=W,C,R
+_tabversion = '3.10'
+
+_lr_method = 'LALR'
+
+_lr_signature = 'element_listCHORD DURATION EQUALS LBRACE LBRACKET NAME NEWLINE NOTE NUMBER PATTERN RBRACE RBRACKET REPEAT REST SCALE_EXTENSION SCALE_TYPE TEMPO TRACKcomposition : tempo_setting element_listtempo_setting : TEMPO EQUALS NUMBERelement_list : element\n                    | element_list elementelement : note\n               | scale\n               | chord\n               | rest\n               | repeat\n               | pattern\n               | call\n               | track\n               | NEWLINErest : RESTnote : NOTE DURATIONscale : NOTE SCALE_TYPE\n             | NOTE SCALE_TYPE SCALE_EXTENSIONchord : LBRACKET note_list RBRACKET DURATIONnote_list : NOTE\n                 | note_list NOTErepeat : REPEAT NUMBER LBRACE element_list RBRACEpattern : PATTERN NAME LBRACE element_list RBRACEcall : NAMEtrack : TRACK LBRACE element_list RBRACE\n             | TRACK NAME LBRACE element_list RBRACE'
+    
+_lr_action_items = {'NEWLINE':([0,1,2,3,4,5,6,7,8,9,10,11,14,17,19,20,21,26,28,31,32,33,34,35,36,37,38,39,40,41,42,],[11,11,-3,-5,-6,-7,-8,-9,-10,-11,-12,-13,-14,-23,-4,-15,-16,11,-17,11,11,11,11,-18,11,11,-24,11,-21,-22,-25,]),'NOTE':([0,1,2,3,4,5,6,7,8,9,10,11,13,14,17,19,20,21,22,23,26,28,30,31,32,33,34,35,36,37,38,39,40,41,42,],[12,12,-3,-5,-6,-7,-8,-9,-10,-11,-12,-13,23,-14,-23,-4,-15,-16,30,-19,12,-17,-20,12,12,12,12,-18,12,12,-24,12,-21,-22,-25,]),'LBRACKET':([0,1,2,3,4,5,6,7,8,9,10,11,14,17,19,20,21,26,28,31,32,33,34,35,36,37,38,39,40,41,42,],[13,13,-3,-5,-6,-7,-8,-9,-10,-11,-12,-13,-14,-23,-4,-15,-16,13,-17,13,13,13,13,-18,13,13,-24,13,-21,-22,-25,]),'REST':([0,1,2,3,4,5,6,7,8,9,10,11,14,17,19,20,21,26,28,31,32,33,34,35,36,37,38,39,40,41,42,],[14,14,-3,-5,-6,-7,-8,-9,-10,-11,-12,-13,-14,-23,-4,-15,-16,14,-17,14,14,14,14,-18,14,14,-24,14,-21,-22,-25,]),'REPEAT':([0,1,2,3,4,5,6,7,8,9,10,11,14,17,19,20,21,26,28,31,32,33,34,35,36,37,38,39,40,41,42,],[15,15,-3,-5,-6,-7,-8,-9,-10,-11,-12,-13,-14,-23,-4,-15,-16,15,-17,15,15,15,15,-18,15,15,-24,15,-21,-22,-25,]),'PATTERN':([0,1,2,3,4,5,6,7,8,9,10,11,14,17,19,20,21,26,28,31,32,33,34,35,36,37,38,39,40,41,42,],[16,16,-3,-5,-6,-7,-8,-9,-10,-11,-12,-13,-14,-23,-4,-15,-16,16,-17,16,16,16,16,-18,16,16,-24,16,-21,-22,-25,]),'NAME':([0,1,2,3,4,5,6,7,8,9,10,11,14,16,17,18,19,20,21,26,28,31,32,33,34,35,36,37,38,39,40,41,42,],[17,17,-3,-5,-6,-7,-8,-9,-10,-11,-12,-13,-14,25,-23,27,-4,-15,-16,17,-17,17,17,17,17,-18,17,17,-24,17,-21,-22,-25,]),'TRACK':([0,1,2,3,4,5,6,7,8,9,10,11,14,17,19,20,21,26,28,31,32,33,34,35,36,37,38,39,40,41,42,],[18,18,-3,-5,-6,-7,-8,-9,-10,-11,-12,-13,-14,-23,-4,-15,-16,18,-17,18,18,18,18,-18,18,18,-24,18,-21,-22,-25,]),'$end':([1,2,3,4,5,6,7,8,9,10,11,14,17,19,20,21,28,35,38,40,41,42,],[0,-3,-5,-6,-7,-8,-9,-10,-11,-12,-13,-14,-23,-4,-15,-16,-17,-18,-24,-21,-22,-25,]),'RBRACE':([2,3,4,5,6,7,8,9,10,11,14,17,19,20,21,28,33,35,36,37,38,39,40,41,42,],[-3,-5,-6,-7,-8,-9,-10,-11,-12,-13,-14,-23,-4,-15,-16,-17,38,-18,40,41,-24,42,-21,-22,-25,]),'DURATION':([12,29,],[20,35,]),'SCALE_TYPE':([12,],[21,]),'NUMBER':([15,],[24,]),'LBRACE':([18,24,25,27,],[26,31,32,34,]),'SCALE_EXTENSION':([21,],[28,]),'RBRACKET':([22,23,30,],[29,-19,-20,]),}
+
+_lr_action = {}
+for _k, _v in _lr_action_items.items():
+   for _x,_y in zip(_v[0],_v[1]):
+      if not _x in _lr_action:  _lr_action[_x] = {}
+      _lr_action[_x][_k] = _y
+del _lr_action_items
+
+_lr_goto_items = {'element_list':([0,26,31,32,34,],[1,33,36,37,39,]),'element':([0,1,26,31,32,33,34,36,37,39,],[2,19,2,2,2,19,2,19,19,19,]),'note':([0,1,26,31,32,33,34,36,37,39,],[3,3,3,3,3,3,3,3,3,3,]),'scale':([0,1,26,31,32,33,34,36,37,39,],[4,4,4,4,4,4,4,4,4,4,]),'chord':([0,1,26,31,32,33,34,36,37,39,],[5,5,5,5,5,5,5,5,5,5,]),'rest':([0,1,26,31,32,33,34,36,37,39,],[6,6,6,6,6,6,6,6,6,6,]),'repeat':([0,1,26,31,32,33,34,36,37,39,],[7,7,7,7,7,7,7,7,7,7,]),'pattern':([0,1,26,31,32,33,34,36,37,39,],[8,8,8,8,8,8,8,8,8,8,]),'call':([0,1,26,31,32,33,34,36,37,39,],[9,9,9,9,9,9,9,9,9,9,]),'track':([0,1,26,31,32,33,34,36,37,39,],[10,10,10,10,10,10,10,10,10,10,]),'note_list':([13,],[22,]),}
+
+_lr_goto = {}
+for _k, _v in _lr_goto_items.items():
+   for _x, _y in zip(_v[0], _v[1]):
+       if not _x in _lr_goto: _lr_goto[_x] = {}
+       _lr_goto[_x][_k] = _y
+del _lr_goto_items
+_lr_productions = [
+  ("S' -> element_list","S'",1,None,None,None),
+  ('composition -> tempo_setting element_list','composition',2,'p_composition','parser.py',50),
+  ('tempo_setting -> TEMPO EQUALS NUMBER','tempo_setting',3,'p_tempo_setting','parser.py',54),
+  ('element_list -> element','element_list',1,'p_element_list','parser.py',58),
+  ('element_list -> element_list element','element_list',2,'p_element_list','parser.py',59),
+  ('element -> note','element',1,'p_element','parser.py',71),
+  ('element -> scale','element',1,'p_element','parser.py',72),
+  ('element -> chord','element',1,'p_element','parser.py',73),
+  ('element -> rest','element',1,'p_element','parser.py',74),
+  ('element -> repeat','element',1,'p_element','parser.py',75),
+  ('element -> pattern','element',1,'p_element','parser.py',76),
+  ('element -> call','element',1,'p_element','parser.py',77),
+  ('element -> track','element',1,'p_element','parser.py',78),
+  ('element -> NEWLINE','element',1,'p_element','parser.py',79),
+  ('rest -> REST','rest',1,'p_rest','parser.py',123),
+  ('note -> NOTE DURATION','note',2,'p_note','parser.py',128),
+  ('scale -> NOTE SCALE_TYPE','scale',2,'p_scale','parser.py',134),
+  ('scale -> NOTE SCALE_TYPE SCALE_EXTENSION','scale',3,'p_scale','parser.py',135),
+  ('chord -> LBRACKET note_list RBRACKET DURATION','chord',4,'p_chord','parser.py',143),
+  ('note_list -> NOTE','note_list',1,'p_note_list','parser.py',149),
+  ('note_list -> note_list NOTE','note_list',2,'p_note_list','parser.py',150),
+  ('repeat -> REPEAT NUMBER LBRACE element_list RBRACE','repeat',5,'p_repeat','parser.py',158),
+  ('pattern -> PATTERN NAME LBRACE element_list RBRACE','pattern',5,'p_pattern','parser.py',162),
+  ('call -> NAME','call',1,'p_call','parser.py',166),
+  ('track -> TRACK LBRACE element_list RBRACE','track',4,'p_track','parser.py',170),
+  ('track -> TRACK NAME LBRACE element_list RBRACE','track',5,'p_track','parser.py',171),
+]
@@ -0,0 +1,126 @@
+"""Timing instrumentation for the compile pipeline.
+
+While a Profiler is active on a thread, the pipeline records each phase it
+goes through there: lexing and parsing (parser), event construction,
+encoding and writing (midi_generator). Each phase's wall time, number of
+calls, counts such as tokens or events, and optionally peak memory are
+summed per phase name:
+
+    with Profiler(memory=True) as profiler:
+        compiler.compile(source, 'out.mid')
+    print(profiler.to_json())
+
+With no active Profiler the pipeline runs as usual. A profiled compile does
+lex before it parses and build events before it encodes, holding each
+phase's output in full, so it needs more memory than a normal one.
+"""
+import json
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+def _shared_local():
+    # The pipeline modules import this one as profiling, but it can be
+    # loaded a second time as src.profiling. Both copies share one active
+    # profiler per thread, so a Profiler from either is seen by the pipeline.
+    for name in ('profiling', 'src.profiling'):
+        local = getattr(sys.modules.get(name), '_local', None)
+        if local is not None:
+            return local
+    return threading.local()
+
+_local = _shared_local()
+
+def active_profiler():
+    """Returns the Profiler active on this thread, or None."""
+    return getattr(_local, 'profiler', None)
+
+def phase(name):
+    """Times a phase with the active profiler; does nothing if there is none."""
+    profiler = active_profiler()
+    return nullcontext({}) if profiler is None else profiler.phase(name)
+
+class Profiler:
+    """Collects per-phase timings while it is active, as a context manager.
+
+    memory=True also records each phase's peak traced memory, starting
+    tracemalloc if needed; that slows everything down several times, so the
+    timings of such a run are only comparable with each other. callback, if
+    given, is called as callback(name, seconds, counts, peak_bytes) as each
+    phase ends, peak_bytes being None without memory tracking.
+    """
+
+    def __init__(self, memory=False, callback=None):
+        self.memory = memory
+        self.callback = callback
+        self.phases = {}
+        self._previous = None
+        self._started_tracing = False
+        # Peaks of the phases in progress, innermost last, covering the
+        # nested phases that have already ended.
+        self._peaks = []
+
+    def __enter__(self):
+        self._previous = active_profiler()
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        _local.profiler = self
+        return self
+
+    def __exit__(self, *exc_info):
+        _local.profiler = self._previous
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    @contextmanager
+    def phase(self, name):
+        """Times the enclosed code as phase name, yielding a dict for its counts.
+
+        Phases may nest; an outer phase's time and peak include its inner
+        phases.
+        """
+        counts = {}
+        if self.memory:
+            if self._peaks:
+                self._peaks[-1] = max(self._peaks[-1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            self._peaks.append(0)
+        start = time.perf_counter()
+        try:
+            yield counts
+        finally:
+            seconds = time.perf_counter() - start
+            peak = None
+            if self.memory:
+                peak = max(self._peaks.pop(), tracemalloc.get_traced_memory()[1])
+                if self._peaks:
+                    self._peaks[-1] = max(self._peaks[-1], peak)
+                tracemalloc.reset_peak()
+            self._record(name, seconds, counts, peak)
+
+    def _record(self, name, seconds, counts, peak):
+        record = self.phases.get(name)
+        if record is None:
+            record = self.phases[name] = {'calls': 0, 'seconds': 0.0}
+            if peak is not None:
+                record['peak_bytes'] = 0
+        record['calls'] += 1
+        record['seconds'] += seconds
+        if peak is not None:
+            record['peak_bytes'] = max(record['peak_bytes'], peak)
+        for key, value in counts.items():
+            record[key] = record.get(key, 0) + value
+        if self.callback is not None:
+            self.callback(name, seconds, counts, peak)
+
+    def results(self):
+        """Returns {phase: {'calls', 'seconds', 'peak_bytes'?, counts...}} in the order phases first ran."""
+        return {name: dict(record, seconds=round(record['seconds'], 6)) for name, record in self.phases.items()}
+
+    def to_json(self, **kwargs):
+        """Returns results() as a JSON string; kwargs go to json.dumps."""
+        return json.dumps(self.results(), **kwargs)
@@ -0,0 +1,103 @@
+"""Deterministic random scores, for benchmarks and stress tests.
+
+    python src/scoregen.py 1000000 --seed 1 > big.sym
+
+A score is a tempo line followed by the requested number of lines, each
+drawn from a weighted mix of line kinds. The same size, seed and mix always
+give the same score, and every generated score compiles.
+"""
+import argparse
+import random
+import sys
+
+NOTE_NAMES = [name + accidental for name in 'CDEFGAB' for accidental in ('', '#', 'b')]
+# Octaves whose notes all stay within the MIDI range, scales included.
+OCTAVES = '1234567'
+DURATIONS = ('wn', 'hn', 'qn', 'en', 'sn')
+RESTS = ('wr', 'hr', 'qr', 'er', 'sr')
+SCALE_TYPES = ('maj', 'min')
+COMMENTS = ('melody', 'bridge', 'left hand', 'TODO: dynamics', 'repeat from bar 12')
+
+# Relative weights of the kinds of line in a score.
+DEFAULT_MIX = {
+    'note': 50,
+    'chord': 15,
+    'rest': 15,
+    'scale': 5,
+    'comment': 10,
+    'blank': 5,
+}
+
+def parse_mix(text):
+    """Parses 'note=5,chord=2,...' into a mix; kinds left out get weight 0."""
+    mix = dict.fromkeys(DEFAULT_MIX, 0)
+    for item in text.split(','):
+        kind, _, weight = item.partition('=')
+        kind = kind.strip()
+        if kind not in DEFAULT_MIX:
+            raise ValueError(f"Unknown line kind: {kind}")
+        mix[kind] = float(weight)
+    return mix
+
+def _note(rng):
+    return rng.choice(NOTE_NAMES) + rng.choice(OCTAVES)
+
+def _line(kind, rng):
+    if kind == 'note':
+        line = f"{_note(rng)} {rng.choice(DURATIONS)}"
+    elif kind == 'chord':
+        notes = ' '.join(_note(rng) for _ in range(rng.randint(2, 4)))
+        line = f"[{notes}] {rng.choice(DURATIONS)}"
+    elif kind == 'rest':
+        line = rng.choice(RESTS)
+    elif kind == 'scale':
+        line = f"{_note(rng)} {rng.choice(SCALE_TYPES)}" + rng.choice(('', ' pent'))
+    elif kind == 'comment':
+        return f"# {rng.choice(COMMENTS)}"
+    else:
+        return ''
+    if rng.random() < 0.05:
+        line += f"  # {rng.choice(COMMENTS)}"
+    return line
+
+def generate_lines(lines, seed=0, mix=None, tempo=120):
+    """Yields the lines of a score, without newlines, one at a time.
+
+    lines counts the lines after the tempo line, so memory stays flat
+    however many are asked for.
+    """
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    kinds = [kind for kind in mix if mix[kind] > 0]
+    weights = [mix[kind] for kind in kinds]
+    yield f"tempo={tempo}"
+    # Kinds are drawn in whole batches, so a shorter score is a prefix of
+    # a longer one with the same seed.
+    batch = 4096
+    for start in range(0, lines, batch):
+        for kind in rng.choices(kinds, weights, k=batch)[:lines - start]:
+            yield _line(kind, rng)
+
+def generate_score(lines, seed=0, mix=None, tempo=120):
+    """Returns the text of a generated score (see generate_lines)."""
+    return '\n'.join(generate_lines(lines, seed, mix, tempo)) + '\n'
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(prog='scoregen', description='Write a random SymphonyLang score.')
+    arg_parser.add_argument('lines', type=int, help='number of lines after the tempo line')
+    arg_parser.add_argument('--seed', type=int, default=0)
+    arg_parser.add_argument('--mix', type=parse_mix, default=None,
+                            help='weights of line kinds, e.g. note=5,chord=2,rest=2,scale=1,comment=1,blank=1')
+    arg_parser.add_argument('-o', '--output', help='file to write (default: standard output)')
+    args = arg_parser.parse_args(argv)
+    output = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        for line in generate_lines(args.lines, args.seed, args.mix):
+            output.write(line + '\n')
+    finally:
+        if args.output:
+            output.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""Streaming compilation for scores too long to hold in memory.
+
+parse_stream reads a score from any iterable of lines (such as an open
+file) and returns a Composition whose elements are parsed chunk by chunk
+as they are consumed. Feeding it to midi_generator.stream_midi encodes and
+writes events as they are produced, so neither the element list nor the
+MIDI track is ever materialized. As a consequence, a score with more than
+one error reports the first one the stream reaches: an undefined pattern
+called before a syntax error fails the encoding before the syntax error is
+parsed, while a full parse would report the syntax error.
+"""
+import re
+from lexer import new_lexer
+from parser import Composition, block_depth, new_parser, parse_symphony_lang, parse_segment
+from midi_generator import stream_midi
+
+DEFAULT_CHUNK_LINES = 1024
+
+# A line the lexer turns into no tokens at all: blanks and a comment.
+_TOKENLESS_LINE = re.compile(r'[ \t]*(\#.*)?')
+
+def iter_chunks(lines, chunk_lines=DEFAULT_CHUNK_LINES):
+    """Groups score lines into (first_line, text, is_last) chunks.
+
+    Leading and trailing blank lines are dropped and the outermost lines
+    stripped, as parse_symphony_lang strips the whole text, so line numbers
+    agree with a full parse, and so does the message of a score's only
+    syntax error (see the module docstring for scores with several errors).
+    """
+    chunk = []
+    held_blanks = []
+    first_line = 1
+    started = False
+    # Chunks only end between blocks, as a block parses only as a whole.
+    depth = 0
+    for line in lines:
+        line = line.rstrip('\n')
+        if not started:
+            if not line.strip():
+                continue
+            line = line.lstrip()
+            started = True
+        if not line.strip():
+            # Only kept if more content follows; trailing blanks are stripped.
+            held_blanks.append(line)
+            continue
+        if len(chunk) >= chunk_lines and depth <= 0:
+            yield first_line, '\n'.join(chunk), False
+            first_line += len(chunk)
+            chunk = []
+        chunk.extend(held_blanks)
+        held_blanks = []
+        chunk.append(line)
+        depth += block_depth(line)
+    if chunk:
+        chunk[-1] = chunk[-1].rstrip()
+        yield first_line, '\n'.join(chunk), True
+
+def parse_stream(lines, chunk_lines=DEFAULT_CHUNK_LINES, fast_lexer=None):
+    """Parses a score from an iterable of lines into a lazily filled Composition.
+
+    The header chunk is parsed immediately so the tempo is known; the
+    returned composition's elements is a one-shot iterator that parses the
+    remaining chunks on demand and raises SymphonyLangParserError when it
+    reaches an error, so a consumer's own errors on earlier elements come
+    first. fast_lexer selects the lexer as for lexer.new_lexer.
+    """
+    chunks = iter_chunks(lines, chunk_lines)
+    thread_lexer = new_lexer(fast_lexer)
+    first = next(chunks, None)
+    if first is None:
+        # Let the full parser report the empty score.
+        return parse_symphony_lang('', thread_lexer)
+
+    _, text, is_last = first
+    # Every chunk but the last is followed by a newline in the original
+    # text; it is appended so the chunk parses exactly as it would in place.
+    header = parse_symphony_lang(text if is_last else text + '\n', thread_lexer, strip=False)
+
+    def elements():
+        yield from header.elements
+        segment_parser = new_parser('element_list')
+        for first_line, text, is_last in chunks:
+            # A trailing one-line chunk holding just a comment has no tokens
+            # of its own to parse; in the full text the preceding newline
+            # carried it.
+            if is_last and _TOKENLESS_LINE.fullmatch(text):
+                return
+            yield from parse_segment(text if is_last else text + '\n', first_line,
+                                     thread_lexer, segment_parser)
+
+    return Composition(header.tempo, elements())
+
+def compile_stream(lines, output_file, chunk_lines=DEFAULT_CHUNK_LINES, compact=False, fast_lexer=None):
+    """Compiles a score from an iterable of lines straight into a binary file object.
+
+    compact is as for SymphonyCompiler.compile, fast_lexer as for
+    parse_stream. Returns the number of bytes written.
+    """
+    return stream_midi(parse_stream(lines, chunk_lines, fast_lexer), output_file, compact, compact)
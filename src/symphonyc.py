@@ -0,0 +1,273 @@
+"""Headless batch compiler: renders SymphonyLang scores to MIDI files.
+
+Usage:
+    python src/symphonyc.py scores/ 'more/**/*.sym' -o out/ -j 8
+
+Inputs may be files, directories (searched recursively for *.sym) or glob
+patterns. One JSON object is printed per input with its status, timing and
+any error, and the exit status is non-zero if any input failed.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from pathlib import Path
+
+src_dir = Path(__file__).parent
+if str(src_dir) not in sys.path:
+    sys.path.insert(0, str(src_dir))
+
+from compiler import SymphonyCompiler, SymphonyLangParserError, MIDIGenerationError
+from cache import file_digest
+from profiling import Profiler, phase
+from streaming import compile_stream, parse_stream
+
+SOURCE_SUFFIX = '.sym'
+DEFAULT_STATE_FILE = '.symphonyc.json'
+
+_compiler = SymphonyCompiler()
+_fast_compiler = SymphonyCompiler(fast_lexer=True)
+
+def _glob_base(pattern):
+    """Returns the directory part of a glob pattern before its first wildcard."""
+    parts = []
+    for part in Path(pattern).parts[:-1]:
+        if glob.has_magic(part):
+            break
+        parts.append(part)
+    return os.path.join(*parts) if parts else '.'
+
+def find_input_roots(patterns):
+    """Expands files, directories and glob patterns into {score path: search root}.
+
+    The root is the directory searched, the base of the glob pattern or,
+    for a file named directly, its own directory. A score found by several
+    patterns keeps the root of the first.
+    """
+    found = {}
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths, root = (str(p) for p in Path(pattern).rglob(f'*{SOURCE_SUFFIX}')), pattern
+        elif glob.has_magic(pattern):
+            paths, root = (p for p in glob.glob(pattern, recursive=True) if os.path.isfile(p)), _glob_base(pattern)
+        else:
+            paths, root = [pattern], os.path.dirname(pattern) or '.'
+        for path in paths:
+            found.setdefault(path, root)
+    return found
+
+def find_inputs(patterns):
+    """Expands files, directories and glob patterns into a sorted list of score paths."""
+    return sorted(find_input_roots(patterns))
+
+def output_path_for(input_path, output_dir=None, root=None):
+    """Returns where the MIDI file for input_path is written.
+
+    Under output_dir, the output keeps the input's path relative to root
+    (its search root), so scores of the same name in different
+    subdirectories do not overwrite each other.
+    """
+    if output_dir is None:
+        return str(Path(input_path).with_suffix('.mid'))
+    relative = os.path.relpath(input_path, root) if root is not None else os.path.basename(input_path)
+    return str(Path(output_dir, relative).with_suffix('.mid'))
+
+def wav_path_for(output_path):
+    """Returns where the audio rendered alongside output_path is written."""
+    return str(Path(output_path).with_suffix('.wav'))
+
+def render_audio(source, output_path):
+    """Renders a Composition to a WAV file next to its MIDI file."""
+    try:
+        from synth import render_wav
+    except ImportError:
+        raise MIDIGenerationError("Rendering audio requires NumPy")
+    return render_wav(source, wav_path_for(output_path))
+
+def state_digest(input_path, compact=False):
+    """The digest recorded for an input, which also tells how it was compiled."""
+    digest = file_digest(input_path)
+    return digest + '-compact' if compact else digest
+
+def compile_file(input_path, output_path, stream=False, compact=False, wav=False, profile=False,
+                 fast_lexer=False):
+    """Compiles one score; runs inside a worker process and never raises.
+
+    With stream=True the score is parsed and written chunk by chunk, so
+    memory stays flat for arbitrarily long inputs, and the error reported is
+    the first one reached rather than the first syntax error. compact writes smaller
+    files that play the same (see SymphonyCompiler.compile). wav also
+    renders the score to audio next to the MIDI file. profile adds the
+    time, counts and peak memory of each phase (see profiling.Profiler).
+    fast_lexer uses lexer.FastLexer, which gives the same results.
+    """
+    start = time.perf_counter()
+    result = {'input': input_path, 'output': output_path}
+    profiler = Profiler(memory=True) if profile else nullcontext()
+    try:
+        result['digest'] = state_digest(input_path, compact)
+        with profiler:
+            _compile(input_path, output_path, result, stream, compact, wav, fast_lexer or None)
+        result['status'] = 'ok'
+    except (SymphonyLangParserError, MIDIGenerationError, OSError, UnicodeDecodeError) as e:
+        result['status'] = 'error'
+        result['error'] = str(e)
+    except Exception as e:
+        # Anything else is a bug, but it fails this score rather than the
+        # whole batch, whose other results would then go unreported.
+        result['status'] = 'error'
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['seconds'] = round(time.perf_counter() - start, 6)
+    if profile:
+        result['profile'] = profiler.results()
+    return result
+
+def _compile(input_path, output_path, result, stream, compact, wav, fast_lexer):
+    if stream:
+        # Stream into a temporary file beside the output, so a score that
+        # fails halfway leaves the previous output in place.
+        partial_path = f'{output_path}.{os.getpid()}.partial'
+        try:
+            with phase('stream'), open(input_path, 'r') as file, open(partial_path, 'wb') as output:
+                compile_stream(file, output, compact=compact, fast_lexer=fast_lexer)
+            os.replace(partial_path, output_path)
+        except BaseException:
+            if os.path.exists(partial_path):
+                os.unlink(partial_path)
+            raise
+        if wav:
+            # Parsed a second time, so the audio is streamed as well.
+            with phase('render'), open(input_path, 'r') as file:
+                result['frames'] = render_audio(parse_stream(file, fast_lexer=fast_lexer), output_path)
+    else:
+        with phase('read'), open(input_path, 'r') as file:
+            source = file.read()
+        compiler = _fast_compiler if fast_lexer else _compiler
+        composition = compiler.compile(source, output_path, compact)
+        result['elements'] = len(composition.elements)
+        if wav:
+            with phase('render'):
+                result['frames'] = render_audio(composition, output_path)
+
+def load_state(state_file):
+    try:
+        with open(state_file, 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+def save_state(state_file, state):
+    with open(state_file, 'w') as file:
+        json.dump(state, file, indent=1, sort_keys=True)
+
+def is_unchanged(input_path, output_path, state, compact=False, wav=False):
+    """True if the input's content matches the last successful compile and its output still exists."""
+    recorded = state.get(os.path.abspath(input_path))
+    if recorded is None or not os.path.exists(output_path):
+        return False
+    if wav and not os.path.exists(wav_path_for(output_path)):
+        return False
+    try:
+        return state_digest(input_path, compact) == recorded
+    except OSError:
+        return False
+
+def run(patterns, output_dir=None, workers=None, force=False, state_file=DEFAULT_STATE_FILE,
+        stream=False, out=sys.stdout, compact=False, wav=False, profile=False, fast_lexer=False):
+    """Compiles every matching score and writes one JSON line per input to out.
+
+    Returns the number of inputs that failed.
+    """
+    state = {} if state_file is None else load_state(state_file)
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+
+    roots = find_input_roots(patterns)
+    outputs = {input_path: output_path_for(input_path, output_dir, roots[input_path]) for input_path in roots}
+    # Inputs from different roots can still map to one output; none of
+    # them is compiled, rather than letting one silently replace another.
+    claimed = {}
+    for input_path in sorted(outputs):
+        claimed.setdefault(os.path.abspath(outputs[input_path]), []).append(input_path)
+
+    jobs = []
+    duplicates = []
+    for input_path in sorted(outputs):
+        output_path = outputs[input_path]
+        others = [other for other in claimed[os.path.abspath(output_path)] if other != input_path]
+        if others:
+            duplicates.append({'input': input_path, 'output': output_path, 'status': 'error', 'seconds': 0.0,
+                               'error': f"Output {output_path} is also the output of {', '.join(others)}"})
+            continue
+        if not force and is_unchanged(input_path, output_path, state, compact, wav):
+            report = {'input': input_path, 'output': output_path, 'status': 'skipped', 'seconds': 0.0}
+            out.write(json.dumps(report) + '\n')
+            continue
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        jobs.append((input_path, output_path))
+    failures = _report(duplicates, state, out)
+
+    if workers == 1 or len(jobs) <= 1:
+        results = (compile_file(*job, stream, compact, wav, profile, fast_lexer) for job in jobs)
+        failures += _report(results, state, out)
+    else:
+        # Batch small scores so per-task IPC doesn't dominate, while keeping
+        # several chunks per worker for load balancing.
+        chunksize = max(1, len(jobs) // (4 * (workers or os.cpu_count() or 1)))
+        inputs, outputs = zip(*jobs)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(compile_file, inputs, outputs, [stream] * len(jobs), [compact] * len(jobs),
+                               [wav] * len(jobs), [profile] * len(jobs), [fast_lexer] * len(jobs),
+                               chunksize=chunksize)
+            failures += _report(results, state, out)
+
+    if state_file is not None:
+        save_state(state_file, state)
+    return failures
+
+def _report(results, state, out):
+    failures = 0
+    for result in results:
+        key = os.path.abspath(result['input'])
+        if result['status'] == 'ok':
+            state[key] = result.pop('digest')
+        else:
+            failures += 1
+            result.pop('digest', None)
+            state.pop(key, None)
+        out.write(json.dumps(result) + '\n')
+        out.flush()
+    return failures
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(prog='symphonyc', description='Compile SymphonyLang scores to MIDI.')
+    arg_parser.add_argument('inputs', nargs='+', help='score files, directories or glob patterns')
+    arg_parser.add_argument('-o', '--output-dir', help='directory for MIDI files (default: next to each input)')
+    arg_parser.add_argument('-j', '--workers', type=int, default=None,
+                            help='worker processes (default: number of CPUs)')
+    arg_parser.add_argument('-f', '--force', action='store_true', help='recompile inputs even if unchanged')
+    arg_parser.add_argument('--state-file', default=DEFAULT_STATE_FILE,
+                            help=f'where source digests of compiled inputs are kept (default: {DEFAULT_STATE_FILE})')
+    arg_parser.add_argument('--stream', action='store_true',
+                            help='parse and write each score incrementally to bound memory on huge inputs')
+    arg_parser.add_argument('--compact', action='store_true',
+                            help='fold rests into delta times and use velocity-0 note-offs for smaller files')
+    arg_parser.add_argument('--wav', action='store_true',
+                            help='also render each score to a WAV file next to its MIDI file (requires NumPy)')
+    arg_parser.add_argument('--profile', action='store_true',
+                            help='report the time, counts and peak memory of each compile phase')
+    arg_parser.add_argument('--fast-lexer', action='store_true',
+                            help='tokenize with the hand-written lexer instead of PLY (same results, faster)')
+    args = arg_parser.parse_args(argv)
+
+    failures = run(args.inputs, args.output_dir, args.workers, args.force, args.state_file, args.stream,
+                   compact=args.compact, wav=args.wav, profile=args.profile,
+                   fast_lexer=args.fast_lexer)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""Offline audio rendering of scores, without a sound device.
+
+Notes are synthesized with NumPy from precomputed wavetables, one cycle
+per MIDI pitch, and the audio is produced in fixed-size chunks, so a render
+can be written to a WAV file as it goes and memory stays flat however long
+the piece is. Unlike the rest of the compiler this needs NumPy.
+"""
+import wave
+from io import BytesIO
+import numpy as np
+from mido import MidiFile, merge_tracks, tick2second
+from midi_generator import NOTE_ON, TICKS_PER_BEAT, iter_events, tempo_to_microseconds
+
+SAMPLE_RATE = 44100
+CHUNK_FRAMES = 8192
+
+# Samples per wavetable cycle; a power of two, so phases wrap with a mask.
+TABLE_SIZE = 2048
+MAX_HARMONICS = 8
+
+# A plucked, piano-like envelope: a short attack, an exponential decay
+# while the note is held and a linear release after it is let go.
+ATTACK_SECONDS = 0.005
+DECAY_SECONDS = 1.5
+RELEASE_SECONDS = 0.08
+
+# Headroom for chords: each voice at full velocity peaks at this level.
+VOICE_GAIN = 0.2
+
+def pitch_frequency(pitch):
+    """Returns the frequency in Hz of a MIDI pitch, with A4 (69) at 440 Hz."""
+    return 440.0 * 2 ** ((pitch - 69) / 12)
+
+def build_wavetables(sample_rate=SAMPLE_RATE, table_size=TABLE_SIZE):
+    """Returns a (128, table_size) array holding one cycle of each pitch's waveform.
+
+    A cycle sums harmonics of falling amplitude, keeping only those below
+    the Nyquist frequency so that high notes do not alias.
+    """
+    phase = np.arange(table_size) * (2 * np.pi / table_size)
+    tables = np.empty((128, table_size), dtype=np.float32)
+    for pitch in range(128):
+        harmonics = int(min(MAX_HARMONICS, max(1, sample_rate / 2 // pitch_frequency(pitch))))
+        cycle = sum(np.sin(k * phase) / k for k in range(1, harmonics + 1))
+        tables[pitch] = cycle / np.abs(cycle).max()
+    return tables
+
+_wavetables = {}
+
+def get_wavetables(sample_rate=SAMPLE_RATE):
+    """Returns the shared wavetables for sample_rate, building them on first use."""
+    tables = _wavetables.get(sample_rate)
+    if tables is None:
+        tables = _wavetables[sample_rate] = build_wavetables(sample_rate)
+    return tables
+
+def composition_frames(composition, sample_rate=SAMPLE_RATE):
+    """Yields the note events of a Composition as (frame, pitch, velocity), velocity 0 for note-offs."""
+    frames_per_tick = tempo_to_microseconds(composition.tempo) / 1e6 / TICKS_PER_BEAT * sample_rate
+    tick = 0
+    for delta, status, note, velocity in iter_events(composition):
+        tick += delta
+        yield (round(tick * frames_per_tick), note, velocity if status == NOTE_ON else 0)
+
+def midi_frames(midi_data, sample_rate=SAMPLE_RATE):
+    """Like composition_frames, for the contents of a MIDI file.
+
+    The end of the longest track counts as an event, so trailing silence
+    is kept.
+    """
+    midi = MidiFile(file=BytesIO(midi_data))
+    now = 0.0
+    tempo = 500000
+    for msg in merge_tracks(midi.tracks):
+        now += tick2second(msg.time, midi.ticks_per_beat, tempo)
+        if msg.type == 'set_tempo':
+            tempo = msg.tempo
+        elif msg.type == 'note_on' or msg.type == 'note_off':
+            yield (round(now * sample_rate), msg.note, msg.velocity if msg.type == 'note_on' else 0)
+        elif msg.type == 'end_of_track':
+            # Note 0 is never played, so releasing it only marks the time.
+            yield (round(now * sample_rate), 0, 0)
+
+class Voice:
+    """One struck note: its start frame and, once released, its off frame."""
+    __slots__ = ('pitch', 'amplitude', 'start', 'off')
+
+    def __init__(self, pitch, amplitude, start):
+        self.pitch = pitch
+        self.amplitude = amplitude
+        self.start = start
+        self.off = None
+
+class Synthesizer:
+    """Renders timed note events to mono audio, one chunk of samples at a time."""
+
+    def __init__(self, sample_rate=SAMPLE_RATE, chunk_frames=CHUNK_FRAMES):
+        self.sample_rate = sample_rate
+        self.chunk_frames = chunk_frames
+        self.tables = get_wavetables(sample_rate)
+        # Table positions advanced per output frame, for each pitch.
+        self.increments = [pitch_frequency(pitch) * TABLE_SIZE / sample_rate for pitch in range(128)]
+        self.attack_frames = max(1, round(ATTACK_SECONDS * sample_rate))
+        self.decay_rate = 1 / (DECAY_SECONDS * sample_rate)
+        self.release_frames = max(1, round(RELEASE_SECONDS * sample_rate))
+
+    def render(self, events):
+        """Yields float32 chunks of chunk_frames samples (the last one shorter).
+
+        events are (frame, pitch, velocity) in frame order, as from
+        composition_frames. The audio lasts until the last event, plus the
+        release of any note still sounding then.
+        """
+        chunk_frames = self.chunk_frames
+        voices = []
+        sounding = {}
+        chunk_start = 0
+        end = 0
+        for frame, pitch, velocity in events:
+            while frame >= chunk_start + chunk_frames:
+                yield self._render_chunk(voices, chunk_start, chunk_frames)
+                chunk_start += chunk_frames
+                voices = [voice for voice in voices
+                          if voice.off is None or voice.off + self.release_frames > chunk_start]
+            voice = sounding.pop(pitch, None)
+            if voice is not None:
+                voice.off = frame
+            if velocity:
+                voice = Voice(pitch, VOICE_GAIN * velocity / 127, frame)
+                voices.append(voice)
+                sounding[pitch] = voice
+            end = max(end, frame)
+        for voice in voices:
+            end = max(end, (frame if voice.off is None else voice.off) + self.release_frames)
+            if voice.off is None:
+                # Never released: cut off at the end like a note-off.
+                voice.off = frame
+        while chunk_start < end:
+            frames = min(chunk_frames, end - chunk_start)
+            yield self._render_chunk(voices, chunk_start, frames)
+            chunk_start += frames
+
+    def _render_chunk(self, voices, start, frames):
+        output = np.zeros(frames, dtype=np.float32)
+        stop = start + frames
+        mask = TABLE_SIZE - 1
+        for voice in voices:
+            first = max(voice.start, start)
+            last = stop if voice.off is None else min(stop, voice.off + self.release_frames)
+            if last <= first:
+                continue
+            # Frames since the note was struck.
+            age = np.arange(first - voice.start, last - voice.start)
+            samples = self.tables[voice.pitch][(age * self.increments[voice.pitch]).astype(np.int64) & mask]
+            envelope = np.exp(age * -self.decay_rate)
+            if age[0] < self.attack_frames:
+                attack = min(len(age), self.attack_frames - age[0])
+                envelope[:attack] *= age[:attack] / self.attack_frames
+            if voice.off is not None and last > voice.off:
+                released = max(voice.off - first, 0)
+                envelope[released:] *= 1 - (age[released:] - (voice.off - voice.start)) / self.release_frames
+            output[first - start:last - start] += samples * (envelope * voice.amplitude)
+        return output
+
+def render(source, sample_rate=SAMPLE_RATE, chunk_frames=CHUNK_FRAMES):
+    """Yields the audio of a Composition or of MIDI file contents as float32 chunks."""
+    if isinstance(source, (bytes, bytearray)):
+        events = midi_frames(source, sample_rate)
+    else:
+        events = composition_frames(source, sample_rate)
+    return Synthesizer(sample_rate, chunk_frames).render(events)
+
+def to_pcm(chunk):
+    """Converts float samples to 16-bit little-endian PCM bytes, clipping at full scale."""
+    return (np.clip(chunk, -1.0, 1.0) * 32767).astype('<i2').tobytes()
+
+def write_wav(chunks, output_file, sample_rate=SAMPLE_RATE):
+    """Writes float32 chunks to a mono 16-bit WAV file as they arrive.
+
+    output_file is a path or a seekable binary file object, as the header
+    is completed once the length is known. Returns the number of frames.
+    """
+    frames = 0
+    with wave.open(output_file, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        for chunk in chunks:
+            wav.writeframes(to_pcm(chunk))
+            frames += len(chunk)
+    return frames
+
+def render_wav(source, output_file, sample_rate=SAMPLE_RATE, chunk_frames=CHUNK_FRAMES):
+    """Renders a Composition or MIDI file contents to a WAV file; returns its length in frames."""
+    return write_wav(render(source, sample_rate, chunk_frames), output_file, sample_rate)
@@ -0,0 +1,304 @@
+"""Timed note schedules for driving playback visualization.
+
+A Timeline lists the note on/off events of a MIDI file against their
+absolute time in seconds, so a display can be advanced from a clock on the
+GUI thread (Tk after() callbacks) instead of sleeping through midi.play().
+A PlaybackClock supplies that time from the audio player's own position,
+so the display follows what is actually heard.
+
+Timelines also serve as the seek index for playback: the sounding notes are
+snapshotted every KEYFRAME_INTERVAL events, so the state at any time is
+found with a binary search and a short replay rather than by playing the
+song from the start.
+"""
+import time
+from bisect import bisect_left, bisect_right
+from io import BytesIO
+from itertools import islice
+from mido import MidiFile, merge_tracks, tick2second
+from midi_generator import (END_OF_TRACK, NOTE_OFF, NOTE_ON, TICKS_PER_BEAT, checkpointed, compact_events,
+                            encode_events, iter_events, tempo_to_microseconds)
+
+# Events between snapshots of the sounding notes.
+KEYFRAME_INTERVAL = 256
+
+# Assumed bar length, as the language has no time signatures.
+BEATS_PER_BAR = 4
+
+class Timeline:
+    """Note events of a song, sorted by time.
+
+    times[i] is when events[i] happens, in seconds from the start, and
+    ticks[i] the same in MIDI ticks; events are (note, velocity) pairs with
+    velocity 0 for a note-off. tempo is in microseconds per beat.
+    """
+    __slots__ = ('times', 'events', 'duration', 'ticks', 'tempo', 'ticks_per_beat', 'keyframes')
+
+    def __init__(self, times, events, duration, ticks=None, tempo=500000, ticks_per_beat=TICKS_PER_BEAT):
+        self.times = times
+        self.events = events
+        self.duration = duration
+        self.ticks = ticks
+        self.tempo = tempo
+        self.ticks_per_beat = ticks_per_beat
+        self.keyframes = self._build_keyframes()
+
+    def __len__(self):
+        return len(self.events)
+
+    def _build_keyframes(self):
+        """Snapshots the sounding notes before every KEYFRAME_INTERVAL-th event."""
+        keyframes = []
+        notes = ActiveNotes()
+        for index, (note, velocity) in enumerate(self.events):
+            if index % KEYFRAME_INTERVAL == 0:
+                keyframes.append(tuple(notes))
+            notes.note_on(note, velocity)
+        if len(self.events) % KEYFRAME_INTERVAL == 0:
+            keyframes.append(tuple(notes))
+        return keyframes
+
+    def advance(self, index, now):
+        """Returns the index just past the last event due at time now.
+
+        Events index..result-1 are the ones to apply; pass result back as
+        index on the next call.
+        """
+        if index >= len(self.times) or self.times[index] > now:
+            return index
+        return bisect_right(self.times, now, index)
+
+    def index_at(self, now):
+        """Returns the index of the first event at or after time now."""
+        return bisect_left(self.times, now)
+
+    def notes_at(self, index):
+        """Returns the ActiveNotes sounding just before events[index]."""
+        keyframe = index // KEYFRAME_INTERVAL
+        notes = ActiveNotes()
+        for pitch, velocity in self.keyframes[keyframe]:
+            notes.note_on(pitch, velocity)
+        for note, velocity in self.events[keyframe * KEYFRAME_INTERVAL:index]:
+            notes.note_on(note, velocity)
+        return notes
+
+    def bar_time(self, bar):
+        """Returns the time in seconds at which bar (counted from 1) starts."""
+        return (bar - 1) * BEATS_PER_BAR * self.tempo / 1e6
+
+    def tick_at(self, now):
+        """Converts a time in seconds to the nearest tick."""
+        return round(now * 1e6 / self.tempo * self.ticks_per_beat)
+
+    def tick_time(self, tick):
+        """Converts a tick to its time in seconds."""
+        return tick * self.tempo / 1e6 / self.ticks_per_beat
+
+    def midi_from(self, start, end=None):
+        """Returns MIDI file contents playing the song from start to end seconds.
+
+        Notes already sounding at start are struck at the beginning, and
+        with an end the notes still sounding there are released at it,
+        so the file lasts exactly end - start and can be looped seamlessly.
+        """
+        first = self.index_at(start)
+        last = len(self.events) if end is None else self.index_at(end)
+        start_tick = self.tick_at(start)
+        if first < len(self.ticks):
+            start_tick = min(start_tick, self.ticks[first])
+
+        def events():
+            for pitch, velocity in self.notes_at(first):
+                yield (0, NOTE_ON, pitch, velocity)
+            previous = start_tick
+            for tick, (note, velocity) in zip(islice(self.ticks, first, last), islice(self.events, first, last)):
+                yield (tick - previous, NOTE_ON if velocity else NOTE_OFF, note, velocity)
+                previous = tick
+            if end is not None:
+                end_tick = max(self.tick_at(end), previous)
+                sounding = list(self.notes_at(last))
+                if not sounding:
+                    # Nothing to release; the track just ends late.
+                    yield (end_tick - previous, END_OF_TRACK, 0, 0)
+                for i, (pitch, _) in enumerate(sounding):
+                    yield (end_tick - previous if i == 0 else 0, NOTE_OFF, pitch, 0)
+
+        return encode_events(events(), self.tempo)
+
+def build_timeline(midi_data):
+    """Builds the Timeline of in-memory MIDI file contents.
+
+    midi_from assumes the file keeps its first tempo throughout, as the
+    compiler's output does.
+    """
+    midi = MidiFile(file=BytesIO(midi_data))
+    times = []
+    ticks = []
+    events = []
+    now = 0.0
+    tick = 0
+    tempo = None
+    current_tempo = 500000
+    # Merge the tracks and convert delta ticks to seconds, as iterating a
+    # MidiFile does, without sleeping like midi.play().
+    for msg in merge_tracks(midi.tracks):
+        tick += msg.time
+        now += tick2second(msg.time, midi.ticks_per_beat, current_tempo)
+        if msg.type == 'set_tempo':
+            current_tempo = msg.tempo
+            if tempo is None:
+                tempo = msg.tempo
+        elif msg.type == 'note_on' or msg.type == 'note_off':
+            times.append(now)
+            ticks.append(tick)
+            events.append((msg.note, msg.velocity if msg.type == 'note_on' else 0))
+    return Timeline(times, events, now, ticks, tempo or 500000, midi.ticks_per_beat)
+
+def timeline_from_composition(composition, compact=False, checkpoint=None):
+    """Builds the Timeline of a composition straight from its MIDI events.
+
+    Equivalent to build_timeline on the compiled MIDI, without decoding it.
+    compact leaves out the silent notes standing in for rests (see
+    midi_generator.compact_events), which only a display would walk past.
+    checkpoint is as for midi_generator.encode_midi.
+    """
+    tempo = tempo_to_microseconds(composition.tempo)
+    seconds_per_tick = tempo / 1e6 / TICKS_PER_BEAT
+    times = []
+    ticks = []
+    events = []
+    tick = 0
+    source = checkpointed(iter_events(composition), checkpoint)
+    if compact:
+        source = compact_events(source)
+    for delta, status, note, velocity in source:
+        tick += delta
+        if status is END_OF_TRACK:
+            break
+        times.append(tick * seconds_per_tick)
+        ticks.append(tick)
+        events.append((note, velocity if status == NOTE_ON else 0))
+    return Timeline(times, events, tick * seconds_per_tick, ticks, tempo)
+
+class ActiveNotes:
+    """The notes sounding at a point in playback, in 128 pitch-indexed slots.
+
+    velocities[pitch] is the velocity the note was struck with, or 0 while
+    it is silent, and on_times[pitch] when it was struck. Turning a note on
+    or off is a constant-time store, and iteration is always in pitch order.
+    """
+    __slots__ = ('velocities', 'on_times', 'count')
+
+    def __init__(self):
+        self.velocities = [0] * 128
+        self.on_times = [0.0] * 128
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, pitch):
+        return self.velocities[pitch] > 0
+
+    def __iter__(self):
+        """Yields (pitch, velocity) for each sounding note, lowest first."""
+        velocities = self.velocities
+        return ((pitch, velocities[pitch]) for pitch in range(128) if velocities[pitch])
+
+    def note_on(self, pitch, velocity, time=0.0):
+        """Starts a note; velocity 0 is a note-off, as in MIDI."""
+        if velocity <= 0:
+            self.note_off(pitch)
+            return
+        if not self.velocities[pitch]:
+            self.count += 1
+        self.velocities[pitch] = velocity
+        self.on_times[pitch] = time
+
+    def note_off(self, pitch):
+        """Stops a note; stopping a silent note does nothing."""
+        if self.velocities[pitch]:
+            self.velocities[pitch] = 0
+            self.count -= 1
+
+    def clear(self):
+        """Silences every note."""
+        self.velocities[:] = [0] * 128
+        self.count = 0
+
+class SkewStats:
+    """Running summary of audio/visual clock skew samples, in seconds."""
+    __slots__ = ('samples', 'total', 'max_abs', 'last')
+
+    def __init__(self):
+        self.samples = 0
+        self.total = 0.0
+        self.max_abs = 0.0
+        self.last = 0.0
+
+    def record(self, skew):
+        self.samples += 1
+        self.total += abs(skew)
+        self.max_abs = max(self.max_abs, abs(skew))
+        self.last = skew
+
+    def summary(self):
+        """Returns the samples taken and the mean, max and last skew in ms."""
+        return {
+            'samples': self.samples,
+            'mean_ms': self.total / self.samples * 1000 if self.samples else 0.0,
+            'max_ms': self.max_abs * 1000,
+            'last_ms': self.last * 1000,
+        }
+
+class PlaybackClock:
+    """The current playback position, in seconds, locked to the audio.
+
+    audio_position is a callable returning the player's position in seconds,
+    or None once playback has stopped. Players typically report it in coarse
+    steps, so between readings the position is extrapolated from timer; each
+    new reading corrects the estimate and its difference from the estimate
+    is recorded in stats as the audio/visual skew. Without audio_position
+    the clock simply runs from timer.
+    """
+
+    def __init__(self, audio_position=None, timer=time.perf_counter):
+        self.audio_position = audio_position
+        self.timer = timer
+        self.stats = SkewStats()
+        self.origin = timer()
+        self.offset = 0.0
+        self.last_audio = None
+        self.last_position = 0.0
+        self.paused_at = None
+
+    def pause(self):
+        """Holds the position until resume()."""
+        if self.paused_at is None:
+            self.now()
+            self.paused_at = self.timer()
+
+    def resume(self):
+        """Continues from the held position."""
+        if self.paused_at is not None:
+            self.origin += self.timer() - self.paused_at
+            self.paused_at = None
+
+    def now(self):
+        """Returns the playback position, or None if playback has stopped."""
+        if self.paused_at is not None:
+            return self.last_position
+        wall = self.timer() - self.origin
+        if self.audio_position is not None:
+            audio = self.audio_position()
+            if audio is None:
+                return None
+            if audio != self.last_audio:
+                self.last_audio = audio
+                skew = audio - (wall + self.offset)
+                self.stats.record(skew)
+                self.offset += skew
+        # Corrections can step the estimate back slightly; the position the
+        # display has already reached is never taken back.
+        self.last_position = max(self.last_position, wall + self.offset)
+        return self.last_position
@@ -0,0 +1,133 @@
+"""Background compilation for the editor.
+
+CompileWorker compiles scores on a daemon thread so the Tk event loop keeps
+running; the GUI polls its results from an after() callback. Only the most
+recent request matters: submitting a new score cancels the compile in
+progress at its next segment, step or batch of events, and drops any
+request still waiting.
+"""
+import queue
+import threading
+from cache import CompilationCache
+from midi_generator import generate_midi
+from timeline import timeline_from_composition
+
+# Share of the progress bar given to parsing, and where it stands once the
+# MIDI is encoded; the rest covers the seek index.
+PARSE_SHARE = 0.9
+ENCODED_PROGRESS = 0.95
+
+class CompilationCancelled(Exception):
+    """Raised inside a compile that a newer request has superseded."""
+
+class CompileWorker:
+    """Compiles scores on a background thread, newest request first.
+
+    Results are put on the results queue as tuples tagged with the request
+    id that submit() returned:
+
+    - ('progress', request_id, fraction) while compiling;
+    - ('done', request_id, (composition, midi_data, timeline)) on success;
+    - ('error', request_id, exception) if the score does not compile.
+
+    A cancelled request produces no further results.
+    """
+
+    def __init__(self, cache=None):
+        self.cache = cache or CompilationCache()
+        self.results = queue.Queue()
+        self._condition = threading.Condition()
+        self._latest = 0
+        self._pending = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="symphony-compile", daemon=True)
+        self._thread.start()
+
+    def submit(self, source, composition=None):
+        """Queues source for compilation, superseding earlier requests; returns its id.
+
+        composition, if the caller has already parsed source (as live
+        editing does), is rendered as it is instead of being parsed again.
+        """
+        with self._condition:
+            self._latest += 1
+            self._pending = (self._latest, source, composition)
+            self._condition.notify()
+            return self._latest
+
+    def cancel(self):
+        """Abandons the compile in progress and any waiting request."""
+        with self._condition:
+            self._latest += 1
+            self._pending = None
+
+    def is_current(self, request_id):
+        """Tells whether request_id is still the newest request."""
+        return request_id == self._latest
+
+    def poll(self):
+        """Returns the results that have arrived since the last poll, without blocking."""
+        results = []
+        while True:
+            try:
+                results.append(self.results.get_nowait())
+            except queue.Empty:
+                return results
+
+    def close(self):
+        """Stops the worker thread once the compile in progress is abandoned."""
+        with self._condition:
+            self._closed = True
+            self._latest += 1
+            self._pending = None
+            self._condition.notify()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                request_id, source, composition = self._pending
+                self._pending = None
+            try:
+                result = self._compile(request_id, source, composition)
+            except CompilationCancelled:
+                continue
+            except Exception as e:
+                # Usually a SymphonyLangParserError or MIDIGenerationError,
+                # but anything else is reported too rather than letting the
+                # thread die.
+                if self.is_current(request_id):
+                    self.results.put(('error', request_id, e))
+                continue
+            if self.is_current(request_id):
+                self.results.put(('done', request_id, result))
+
+    def _compile(self, request_id, source, composition=None):
+        def checkpoint():
+            if not self.is_current(request_id):
+                raise CompilationCancelled()
+
+        def report(fraction):
+            checkpoint()
+            self.results.put(('progress', request_id, fraction))
+
+        def progress(done, total):
+            report(PARSE_SHARE * done / total)
+
+        # Repeats make encoding and the seek index cost as much as the
+        # expanded score, however short its text, so both check in too.
+        if composition is None:
+            composition, midi_data = self.cache.compile(source, progress, checkpoint)
+        else:
+            progress(1, 1)
+            midi_data = generate_midi(composition, fast=True, checkpoint=checkpoint)
+        # Encoding a large score takes a while too, so this is a step of
+        # its own before the seek index is built.
+        report(ENCODED_PROGRESS)
+        # The display and seeking have no use for rests' placeholder notes.
+        timeline = timeline_from_composition(composition, compact=True, checkpoint=checkpoint)
+        return composition, midi_data, timeline
@@ -0,0 +1,95 @@
+import importlib.util
+import io
+import json
+
+import pytest
+from src.benchmark import benchmark, find_regressions, main, run, startup
+from src.midi_generator import generate_midi
+from src.parser import parse_symphony_lang
+from src.scoregen import DEFAULT_MIX, generate_lines, generate_score, parse_mix
+
+def test_generated_scores_are_deterministic():
+    assert generate_score(500, seed=1) == generate_score(500, seed=1)
+    assert generate_score(500, seed=1) != generate_score(500, seed=2)
+    lines = list(generate_lines(10000, seed=3))
+    assert len(lines) == 10001
+    assert lines[0] == "tempo=120"
+    # Lines are produced lazily, so the first ones do not depend on the size.
+    assert list(generate_lines(100, seed=3)) == lines[:101]
+
+def test_generated_scores_compile():
+    for seed in range(5):
+        composition = parse_symphony_lang(generate_score(2000, seed=seed))
+        assert generate_midi(composition, fast=True)
+
+def test_mix_selects_line_kinds():
+    lines = list(generate_lines(1000, mix=parse_mix("rest=1")))[1:]
+    assert all(line.split("  #")[0] in ("wr", "hr", "qr", "er", "sr") for line in lines)
+    lines = list(generate_lines(1000, mix=parse_mix("chord=1,comment=1")))[1:]
+    assert {line[0] for line in lines} == {"[", "#"}
+    assert parse_mix("note=2")["chord"] == 0 and set(parse_mix("note=2")) == set(DEFAULT_MIX)
+    with pytest.raises(ValueError):
+        parse_mix("arpeggio=1")
+
+def test_benchmark_reports_every_phase():
+    results = benchmark(300, repeat=1)
+    phases = ("lex", "fast_lex", "parse", "edit", "note_lookup", "generate", "mido_generate", "compact_generate",
+              "timeline", "end_to_end")
+    units = ("tokens", "tokens", "lines", "edits", "notes", "events", "events", "events", "events", "lines")
+    # The GUI phases only run with a display, and render with NumPy.
+    optional = {"visualizer_events_per_s", "visualizer_peak_bytes", "highlight_keystrokes_per_s",
+                "highlight_peak_bytes", "render_frames_per_s", "render_peak_bytes"}
+    assert ("render_frames_per_s" in results) == (importlib.util.find_spec("numpy") is not None)
+    assert set(results) - optional == {f"{phase}_{unit}_per_s" for phase, unit in zip(phases, units)} \
+        | {f"{phase}_peak_bytes" for phase in phases} | {"generate_output_bytes", "compact_generate_output_bytes"}
+    assert all(value > 0 for value in results.values())
+    assert results["compact_generate_output_bytes"] < results["generate_output_bytes"]
+    # Above the in-memory limit only the streaming compile runs.
+    assert set(benchmark(300, repeat=1, memory=False, in_memory_limit=100)) == {"end_to_end_lines_per_s"}
+
+def test_startup_is_timed_in_fresh_interpreters():
+    results = startup(runs=1)
+    assert set(results) == {"startup_import_seconds", "startup_first_parse_seconds"}
+    assert results["startup_first_parse_seconds"] >= results["startup_import_seconds"] > 0
+
+def test_find_regressions():
+    baseline = {"1000": {"parse_lines_per_s": 1000.0, "parse_peak_bytes": 1000, "lex_tokens_per_s": 1000.0}}
+    assert find_regressions({"1000": {"parse_lines_per_s": 800.0, "parse_peak_bytes": 1200}}, baseline) == []
+    regressions = find_regressions({"1000": {"parse_lines_per_s": 700.0, "parse_peak_bytes": 1300,
+                                             "generate_events_per_s": 1.0},
+                                    "10": {"lex_tokens_per_s": 1.0}}, baseline)
+    assert regressions == ["1000 lines: parse_lines_per_s 700 vs baseline 1,000 (-30%)",
+                           "1000 lines: parse_peak_bytes 1,300 vs baseline 1,000 (+30%)"]
+    assert find_regressions({"1000": {"parse_lines_per_s": 700.0}}, baseline, threshold=0.5) == []
+    # Times regress when they grow.
+    assert find_regressions({"startup": {"startup_import_seconds": 0.03}}, {"startup": {"startup_import_seconds": 0.02}}) \
+        == ["startup: startup_import_seconds 0.03 vs baseline 0.02 (+50%)"]
+
+def test_baseline_round_trip(tmp_path):
+    baseline_file = str(tmp_path / "baseline.json")
+    assert main(["--lines", "200", "300", "--repeat", "1", "--startup-runs", "1", "--baseline", baseline_file,
+                 "--update"]) == 0
+    with open(baseline_file) as file:
+        stored = json.load(file)
+    assert stored["config"] == {"seed": 0, "mix": None}
+    # Startup is measured once, not per size.
+    assert set(stored["results"]) == {"startup", "200", "300"}
+    assert set(stored["results"]["startup"]) == {"startup_import_seconds", "startup_first_parse_seconds"}
+    assert not any(name.startswith("startup") for name in stored["results"]["200"])
+
+    # Pretend the baseline machine parsed ten times faster; the other
+    # metrics are left out, as timings this small are noisy.
+    stored["results"]["200"] = {"parse_lines_per_s": stored["results"]["200"]["parse_lines_per_s"] * 10}
+    with open(baseline_file, "w") as file:
+        json.dump(stored, file)
+    out = io.StringIO()
+    assert run([200], repeat=1, memory=False, startup_runs=0, baseline_file=baseline_file, threshold=10, out=out) == 0
+    out = io.StringIO()
+    assert run([200], repeat=1, memory=False, startup_runs=0, baseline_file=baseline_file, out=out) == 1
+    report = json.loads(out.getvalue())
+    assert report["lines"] == 200
+    assert len(report["regressions"]) == 1 and "parse_lines_per_s" in report["regressions"][0]
+
+    # A baseline of other scores is not compared with.
+    with pytest.raises(ValueError):
+        run([200], seed=1, repeat=1, memory=False, startup_runs=0, baseline_file=baseline_file, out=io.StringIO())
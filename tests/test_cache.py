@@ -0,0 +1,150 @@
+import io
+import pytest
+from src import cache as cache_module
+from src.cache import CompilationCache, LRUCache, split_segments
+from src.midi_generator import generate_midi
+from src.parser import parse_symphony_lang
+
+SCORE = """
+tempo=120
+# intro
+C4 qn
+E4 qn
+
+[C4 E4 G4] wn
+qr
+
+# just a comment
+
+C4 maj pent
+D#4 hn
+"""
+
+def summarize(composition):
+    return composition.tempo, [(e.type, e.value, e.duration) for e in composition.elements]
+
+def render(composition):
+    buffer = io.BytesIO()
+    generate_midi(composition, buffer)
+    return buffer.getvalue()
+
+def test_split_segments_keeps_line_numbers():
+    text = "tempo=120\nC4 qn\n  \t\nD4 qn\n\n\nE4 qn"
+    assert split_segments(text) == [(1, "tempo=120\nC4 qn"), (4, "D4 qn"), (7, "E4 qn")]
+
+@pytest.mark.parametrize('source', [
+    SCORE,
+    "tempo=120\nC4 qn",
+    "tempo=120\n\nC4 qn",
+    "tempo=90 C4 qn\n\n\n[C4 E4] hn # chord",
+])
+def test_segmented_parse_matches_full_parse(source):
+    assert summarize(CompilationCache().parse(source)) == summarize(parse_symphony_lang(source))
+
+@pytest.mark.parametrize('source', [
+    "C4 qn",
+    "tempo=120",
+    "tempo=120\nC4 qn\n\nC4 qn D4\n\nE4 qn",
+    "tempo=120\n\nC4 qn\r\n\nE4 qn",
+    "tempo=120\nC4 qn\n\n$",
+])
+def test_segmented_parse_reports_same_errors(source):
+    with pytest.raises(Exception) as expected:
+        parse_symphony_lang(source)
+    with pytest.raises(Exception) as actual:
+        CompilationCache().parse(source)
+    assert str(actual.value) == str(expected.value)
+
+def test_unchanged_score_is_served_from_cache():
+    cache = CompilationCache()
+    composition, midi_data = cache.compile(SCORE)
+    assert midi_data == render(parse_symphony_lang(SCORE))
+    assert cache.compile(SCORE) == (composition, midi_data)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_edit_only_reparses_changed_segment():
+    cache = CompilationCache()
+    cache.compile(SCORE)
+    parsed = cache.segment_misses
+    edited = SCORE.replace("[C4 E4 G4] wn", "[C4 Eb4 G4] wn")
+    composition, midi_data = cache.compile(edited)
+    assert cache.segment_misses == parsed + 1
+    assert summarize(composition) == summarize(parse_symphony_lang(edited))
+    assert midi_data == render(parse_symphony_lang(edited))
+
+def test_lru_evicts_least_recently_used():
+    lru = LRUCache(2)
+    lru.put('a', 1)
+    lru.put('b', 2)
+    assert lru.get('a') == 1
+    lru.put('c', 3)
+    assert 'b' not in lru
+    assert lru.get('a') == 1 and lru.get('c') == 3
+    assert len(lru) == 2
+
+def test_disk_cache_survives_restart_and_compiler_upgrade(tmp_path, monkeypatch):
+    first = CompilationCache(cache_dir=str(tmp_path))
+    _, midi_data = first.compile(SCORE)
+
+    second = CompilationCache(cache_dir=str(tmp_path))
+    assert second.compile(SCORE)[1] == midi_data
+    assert (second.hits, second.misses) == (1, 0)
+
+    monkeypatch.setattr(cache_module, 'COMPILER_VERSION', 'next')
+    third = CompilationCache(cache_dir=str(tmp_path))
+    third.compile(SCORE)
+    assert third.misses == 1
+
+def test_disk_cache_respects_size_limit(tmp_path):
+    cache = CompilationCache(cache_dir=str(tmp_path), max_disk_bytes=1)
+    cache.compile(SCORE)
+    cache.compile(SCORE + "E4 qn\n")
+    assert len(list(tmp_path.glob('*.pickle'))) <= 1
+
+BLOCK_SCORE = """tempo=120
+pattern @riff {
+  C4 en
+
+  E4 en
+}
+
+repeat 4 {
+  @riff
+
+  qr
+}
+"""
+
+def test_split_segments_keeps_blocks_together():
+    assert split_segments(BLOCK_SCORE.strip()) == [
+        (1, "tempo=120\npattern @riff {\n  C4 en\n\n  E4 en\n}"),
+        (8, "repeat 4 {\n  @riff\n\n  qr\n}"),
+    ]
+    assert render(CompilationCache().parse(BLOCK_SCORE)) == render(parse_symphony_lang(BLOCK_SCORE))
+
+def test_long_runs_of_lines_are_split():
+    text = "tempo=120\n" + "\n".join(["C4 qn"] * 9)
+    assert split_segments(text, max_lines=4) == [
+        (1, "tempo=120\nC4 qn\nC4 qn\nC4 qn"), (5, "C4 qn\nC4 qn\nC4 qn\nC4 qn"), (9, "C4 qn\nC4 qn"),
+    ]
+    # But never inside a block.
+    text = "tempo=120\nrepeat 2 {\n" + "\n".join(["C4 qn"] * 5) + "\n}\nD4 qn"
+    assert split_segments(text, max_lines=2) == [(1, text[:-len("\nD4 qn")]), (9, "D4 qn")]
+    source = "tempo=120\n" + "\n".join(["C4 qn", "[C4 E4 G4] hn", "qr", "A3 min"] * 1000)
+    reports = []
+    composition = CompilationCache().parse(source, lambda done, total: reports.append((done, total)))
+    assert len(reports) == 4
+    assert summarize(composition) == summarize(parse_symphony_lang(source))
+
+def test_progress_can_abandon_the_fallback_parse():
+    def progress(done, total):
+        reports.append(done)
+        if len(reports) > 1:
+            raise KeyboardInterrupt
+
+    reports = []
+    source = "tempo=120\nC4 qn\n\nC4 xx\n\nD4 qn"
+    with pytest.raises(KeyboardInterrupt):
+        CompilationCache().parse(source, progress)
+    # Reported again, at the same point, before the full parse.
+    assert reports == [1, 1]
@@ -0,0 +1,75 @@
+import random
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from src.compiler import SymphonyCompiler, SymphonyLangParserError
+from src.parser import parse_symphony_lang
+
+NOTES = ['C4', 'D#4', 'Eb3', 'F5', 'G2', 'A4', 'B6']
+DURATIONS = ['wn', 'hn', 'qn', 'en', 'sn']
+RESTS = ['wr', 'hr', 'qr', 'er', 'sr']
+
+def make_score(seed):
+    """Builds a distinct score and the (type, value, duration) triples it should parse to."""
+    rng = random.Random(seed)
+    tempo = 40 + seed
+    lines = [f"tempo={tempo}"]
+    expected = []
+    for _ in range(rng.randint(1, 40)):
+        kind = rng.choice(['note', 'rest', 'chord', 'scale'])
+        if kind == 'note':
+            note, duration = rng.choice(NOTES), rng.choice(DURATIONS)
+            lines.append(f"{note} {duration}")
+            expected.append(('note', note, duration))
+        elif kind == 'rest':
+            rest = rng.choice(RESTS)
+            lines.append(rest)
+            expected.append(('rest', None, rest))
+        elif kind == 'chord':
+            notes = rng.sample(NOTES, rng.randint(2, 4))
+            duration = rng.choice(DURATIONS)
+            lines.append(f"[{' '.join(notes)}] {duration}")
+            expected.append(('chord', notes, duration))
+        else:
+            root = rng.choice(NOTES)
+            lines.append(f"{root} maj pent  # scale")
+            expected.append(('scale', {'root': root, 'type': 'maj', 'extension': 'pent'}, 'qn'))
+    return "\n".join(lines), tempo, expected
+
+def summarize(composition):
+    return composition.tempo, [(e.type, e.value, e.duration) for e in composition.elements]
+
+@pytest.fixture
+def fast_thread_switching():
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+def test_compiler_parse():
+    compiler = SymphonyCompiler()
+    source, tempo, expected = make_score(1)
+    assert summarize(compiler.parse(source)) == (tempo, expected)
+
+def test_compiler_reports_line_numbers_per_call():
+    compiler = SymphonyCompiler()
+    for _ in range(3):
+        compiler.parse("tempo=120\nC4 qn\nC4 qn")
+        with pytest.raises(SymphonyLangParserError, match="at line 2"):
+            compiler.parse("tempo=120\nC4 qn qn")
+
+def test_parallel_parsing_stress(fast_thread_switching):
+    compiler = SymphonyCompiler()
+    scores = [make_score(seed) for seed in range(3000)]
+
+    def check(score):
+        source, tempo, expected = score
+        assert summarize(compiler.parse(source)) == (tempo, expected)
+        assert summarize(parse_symphony_lang(source)) == (tempo, expected)
+        tokens = compiler.tokenize(source)
+        assert tokens[2].value == tempo
+        return True
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        assert all(pool.map(check, scores))
@@ -0,0 +1,90 @@
+import statistics
+import time
+import tkinter as tk
+
+import pytest
+from src.gui.highlighter import DIRTY, SyntaxHighlighter, line_tags
+
+@pytest.fixture
+def root():
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        pytest.skip("no display available")
+    root.geometry("400x300")
+    yield root
+    root.destroy()
+
+def score(lines):
+    return "tempo=120\n" + "\n".join(["C4 qn  # melody", "qr", "A3 min pent", "[C4 E4] hn"] * (lines // 4))
+
+def test_line_tags():
+    assert line_tags("C4 qn  # melody") == [('NOTE', 0, 2), ('DURATION', 3, 5), ('COMMENT', 7, 15)]
+    assert line_tags("tempo=120") == [('TEMPO', 0, 5), ('NUMBER', 6, 9)]
+    assert line_tags("A3 min pent") == [('NOTE', 0, 2), ('SCALE_TYPE', 3, 6), ('SCALE_EXTENSION', 7, 11)]
+    # Brackets are left alone, and lexing stops at an illegal character.
+    assert line_tags("[C4 E4] qr") == [('NOTE', 1, 3), ('NOTE', 4, 6), ('REST', 8, 10)]
+    assert line_tags("C4 x qn") == [('NOTE', 0, 2), ('ERROR', 3, 4)]
+
+def make_editor(root, text):
+    editor = tk.Text(root, height=20)
+    editor.pack()
+    highlighter = SyntaxHighlighter(editor)
+    editor.insert("1.0", text)
+    root.update()
+    return editor, highlighter
+
+def test_visible_lines_are_highlighted(root):
+    editor, highlighter = make_editor(root, score(400))
+    visible = highlighter.visible_lines()
+    assert 10 < len(visible) < 30
+    assert editor.tag_nextrange('NOTE', '2.0', '2.end') == ('2.0', '2.2')
+    assert editor.tag_nextrange('COMMENT', '2.0', '2.end') == ('2.7', '2.15')
+    assert editor.tag_nextrange('REST', '3.0', '3.end') == ('3.0', '3.2')
+    # Lines below the window are left until they are scrolled to.
+    assert highlighter.lines_tagged == len(visible)
+    assert not editor.tag_nextrange('NOTE', '300.0', '300.end')
+    editor.see('300.0')
+    root.update()
+    assert editor.tag_nextrange('NOTE', '300.0', '300.end') == ('300.0', '300.2')
+
+def test_only_edited_lines_are_retagged(root):
+    editor, highlighter = make_editor(root, score(400))
+    tagged = highlighter.lines_tagged
+    editor.insert('3.0', 'E4 en  ')
+    root.update()
+    assert highlighter.lines_tagged == tagged + 1
+    assert editor.tag_nextrange('NOTE', '3.0', '3.end') == ('3.0', '3.2')
+    assert editor.tag_nextrange('REST', '3.0', '3.end') == ('3.7', '3.9')
+
+    # Inserting lines shifts the highlighting below along with the text.
+    editor.insert('2.0', 'G4 wn\nG4 wn\n')
+    root.update()
+    assert highlighter.lines_tagged == tagged + 4
+    assert editor.tag_nextrange('REST', '5.0', '5.end') == ('5.7', '5.9')
+    assert editor.tag_nextrange(DIRTY, '1.0', '10.0') == ()
+
+    editor.delete('2.0', '4.0')
+    editor.delete('2.0', '2.2')
+    root.update()
+    assert editor.tag_nextrange('NOTE', '2.0', '2.end') == ()
+    assert editor.tag_nextrange('DURATION', '2.0', '2.end') == ('2.1', '2.3')
+
+def test_keystroke_latency_does_not_grow_with_document(root):
+    def keystroke_latency(lines):
+        editor, highlighter = make_editor(root, score(lines))
+        middle = highlighter.visible_lines()[5]
+        samples = []
+        for i in range(50):
+            start = time.perf_counter()
+            editor.insert(f'{middle}.0', 'E4 qn\n' if i % 10 == 0 else 'C')
+            highlighter.highlight_visible()
+            samples.append(time.perf_counter() - start)
+        root.update()
+        editor.destroy()
+        return statistics.median(samples)
+
+    keystroke_latency(100)  # warm up
+    small = keystroke_latency(1000)
+    large = keystroke_latency(100000)
+    assert large < small * 3 + 0.001
@@ -0,0 +1,162 @@
+import random
+
+from src.incremental import IncrementalCompiler, lex_line
+from src.parser import parse_symphony_lang
+
+LINES = ["C4 qn", "[C4 E4 G4] hn", "qr", "A3 min pent", "D#5 en  # trailing", "# comment", "", "  ", "\t"]
+# Lines that break the score in different ways, or move its header.
+BROKEN = ["C4", "C4 qn qn", "tempo=120", "tempo=96 C4 hn", "x", "[C4", "C4 xx", "hn", "C4 qn $", "E4 wn]"]
+BLOCKS = ["repeat 2 {", "}", "pattern @riff {", "@riff", "track @bass {", "repeat 3 { C4 qn }", "} C4 qn",
+          "} repeat 2 {", "C4 qn # {", "  } # }", "repeat 2 { {"]
+
+def summarize(parse):
+    try:
+        composition = parse()
+    except Exception as error:
+        return 'error', str(error)
+    # Block bodies hold elements, which compare by identity.
+    return composition.tempo, [(e.type, repr(e.value), e.duration, e.pitches, e.ticks) for e in composition.elements]
+
+def roles(compiler):
+    return [(result.role, result.is_last) for result in compiler.results]
+
+def test_random_edits_match_full_parse():
+    rng = random.Random(17)
+    for _ in range(200):
+        compiler = IncrementalCompiler()
+        lines = [rng.choice(["tempo=120", "  tempo=90", "", "tempo=100 C4 qn"])]
+        lines += [rng.choice(LINES) for _ in range(rng.randrange(12))]
+        for _ in range(15):
+            operation = rng.random()
+            if operation < 0.4 and lines:
+                lines[rng.randrange(len(lines))] = rng.choice(LINES + BROKEN)
+            elif operation < 0.7:
+                lines.insert(rng.randrange(len(lines) + 1), rng.choice(LINES + BROKEN))
+            elif lines:
+                del lines[rng.randrange(len(lines))]
+            text = "\n".join(lines)
+            compiler.update(text)
+            assert summarize(compiler.compile) == summarize(lambda: parse_symphony_lang(text)), text
+            fresh = IncrementalCompiler()
+            fresh.update(text)
+            assert roles(compiler) == roles(fresh)
+
+def test_random_block_edits_match_full_parse():
+    rng = random.Random(29)
+    for _ in range(200):
+        compiler = IncrementalCompiler()
+        lines = [rng.choice(["tempo=120", "tempo=120 repeat 2 {", "tempo=100 C4 qn"])]
+        lines += [rng.choice(LINES + BLOCKS) for _ in range(rng.randrange(12))]
+        for _ in range(15):
+            operation = rng.random()
+            if operation < 0.4 and lines:
+                lines[rng.randrange(len(lines))] = rng.choice(LINES + BLOCKS + BROKEN)
+            elif operation < 0.7:
+                lines.insert(rng.randrange(len(lines) + 1), rng.choice(LINES + BLOCKS))
+            elif lines:
+                del lines[rng.randrange(len(lines))]
+            text = "\n".join(lines)
+            compiler.update(text)
+            assert summarize(compiler.compile) == summarize(lambda: parse_symphony_lang(text)), text
+
+def test_character_edits_keep_lines_in_step():
+    # Edits that split and join lines, typed a character at a time.
+    rng = random.Random(23)
+    alphabet = "C4 qn\n[E]#1w"
+    for _ in range(100):
+        compiler = IncrementalCompiler()
+        text = "tempo=120\n" + "\n".join(rng.choice(LINES) for _ in range(rng.randrange(8)))
+        compiler.update(text)
+        for _ in range(30):
+            position = rng.randrange(len(text) + 1)
+            if rng.random() < 0.6:
+                text = text[:position] + rng.choice(alphabet) + text[position:]
+            else:
+                text = text[:position] + text[position + rng.randrange(1, 4):]
+            compiler.update(text)
+            assert compiler.lines == text.split("\n")
+            assert summarize(compiler.compile) == summarize(lambda: parse_symphony_lang(text)), text
+
+def test_errors_after_blank_lines_read_as_in_full_parse():
+    # The lexer reports a run of empty lines as one NEWLINE token.
+    for text in ["tempo=120\nC4\n\n\nD4 qn", "\n\ntempo=120\n  C4 qn\nC4 $\n", "tempo=120\nC4 qn\nD4", "  \n# only a comment"]:
+        compiler = IncrementalCompiler()
+        compiler.update(text)
+        assert summarize(compiler.compile) == summarize(lambda: parse_symphony_lang(text))
+
+def test_only_edited_lines_are_parsed():
+    lines = ["tempo=120"] + [f"C{octave} qn # {i}" for i, octave in enumerate([3, 4, 5] * 300)]
+    compiler = IncrementalCompiler()
+    compiler.update("\n".join(lines))
+    assert compiler.lines_parsed == len(lines)
+    lines[500] = "D4 hn"
+    assert compiler.update("\n".join(lines)) == (500, 501)
+    assert compiler.lines_parsed == len(lines) + 1
+    # Undoing the edit finds the old line in the cache.
+    lines[500] = "C4 qn # 499"
+    compiler.update("\n".join(lines))
+    assert compiler.lines_parsed == len(lines) + 1
+    lines.insert(100, "E4 wn")
+    assert compiler.update("\n".join(lines)) == (100, 101)
+    assert len(compiler.compile().elements) == len(lines) - 1
+
+def test_lex_line_ranges():
+    assert lex_line("[C4 E4] qn  # chord") == [
+        ('LBRACKET', 0, 1), ('NOTE', 1, 3), ('NOTE', 4, 6), ('RBRACKET', 6, 7),
+        ('DURATION', 8, 10), ('COMMENT', 12, 19),
+    ]
+    assert lex_line("tempo=120") == [('TEMPO', 0, 5), ('EQUALS', 5, 6), ('NUMBER', 6, 9)]
+    assert lex_line("A3 min pent") == [('NOTE', 0, 2), ('SCALE_TYPE', 3, 6), ('SCALE_EXTENSION', 7, 11)]
+    assert lex_line("C4 $ qn") == [('NOTE', 0, 2), ('ERROR', 3, 4)]
+    assert lex_line("   ") == []
+
+def test_edits_on_large_score_parse_only_the_edited_line():
+    rng = random.Random(5)
+    lines = ["tempo=120"] + [f"{rng.choice('ABCDEFG')}{rng.randrange(2, 6)} {rng.choice(['qn', 'hn', 'en'])}"
+                             for _ in range(100000)]
+    compiler = IncrementalCompiler()
+    compiler.update("\n".join(lines))
+    compiler.compile()
+    for edit in range(40):
+        index = rng.randrange(1, len(lines))
+        lines[index] = "C4 qn D4" if edit % 2 else lines[index] + " "
+        parsed = compiler.lines_parsed
+        compiler.update("\n".join(lines))
+        assert compiler.lines_parsed <= parsed + 1
+        try:
+            compiler.compile()
+        except Exception as error:
+            assert f"line {index + 1}" in str(error)
+        lines[index] = "C4 qn"
+        compiler.update("\n".join(lines))
+
+def test_scores_with_blocks_match_full_parse():
+    compiler = IncrementalCompiler()
+    text = "tempo=120\npattern @riff {\n  C4 en\n}\nrepeat 2 { @riff }\n"
+    compiler.update(text)
+    expected = parse_symphony_lang(text)
+    composition = compiler.compile()
+    assert [(e.type, e.value[0]) for e in composition.elements] == [(e.type, e.value[0]) for e in expected.elements]
+    text = text.replace("{ @riff }", "{ @riff")
+    compiler.update(text)
+    assert summarize(compiler.compile) == summarize(lambda: parse_symphony_lang(text))
+
+def test_blocks_are_parsed_as_cached_units():
+    lines = ["tempo=120", "track @melody {", "  # a comment with a {", ""] + ["  C4 qn"] * 200 + ["}", "D4 hn"]
+    compiler = IncrementalCompiler()
+    compiler.update("\n".join(lines))
+    assert len(compiler.compile().elements) == 2
+    assert compiler.blocks_parsed == 1
+    # Edits outside the block neither parse it again nor the whole score.
+    lines[-1] = "E4 hn"
+    compiler.update("\n".join(lines))
+    compiler.compile()
+    assert compiler.blocks_parsed == 1
+    # Nor do they when the block is broken: its failure is cached too.
+    lines[100] = "  C4"
+    for duration in ("qn", "hn", "wn"):
+        lines[-1] = f"E4 {duration}"
+        text = "\n".join(lines)
+        compiler.update(text)
+        assert summarize(compiler.compile) == summarize(lambda: parse_symphony_lang(text))
+    assert compiler.blocks_parsed == 2
@@ -1,5 +1,9 @@
+import random
+
 import pytest
-from src.lexer import get_all_tokens, SymphonyLangLexerError
+from src.lexer import FastLexer, Token, get_all_tokens, lexer, new_lexer, tokenize, SymphonyLangLexerError
+from src.parser import parse_symphony_lang
+from src.scoregen import generate_score
 
 def test_basic_note_tokenization():
     input_text = "C4 qn"
@@ -56,3 +60,51 @@ def test_comment_handling():
     assert len(tokens) == 2  # Comments should be ignored
     assert tokens[0].type == 'NOTE'
     assert tokens[1].type == 'DURATION'
+
+# Fragments the fuzzer strings together: tokens, near misses, blanks and
+# characters the lexer rejects.
+FRAGMENTS = ["C4", "C#4", "Db5", "B#9", "qn", "sr", "maj", "min", "pent", "chrom", "tempo", "=", "120", "007",
+             "[", "]", "{", "}", "@riff_2", "@", "repeat", "pattern", "track", "voice", "# note", "#", " ", "\t",
+             "\n", "\n\n", "  \n", "mi", "pe", "b", "A", "H", "9", "\r", "\u00e9", "\u0663", "$"]
+
+def lex_all(lexer_instance, text):
+    """Returns the tokens of text with the lexer's position after each, then the error and final position."""
+    lexer_instance.input(text)
+    tokens = []
+    try:
+        for token in iter(lexer_instance.token, None):
+            tokens.append(((token.type, token.value, token.lineno, token.lexpos), lexer_instance.lexpos))
+    except SymphonyLangLexerError as e:
+        return tokens, str(e), lexer_instance.lexpos
+    return tokens, None, lexer_instance.lexpos
+
+def test_fast_lexer_matches_ply_on_fuzzed_input():
+    rng = random.Random(0)
+    for _ in range(3000):
+        text = "".join(rng.choice(FRAGMENTS) + rng.choice(("", " ")) for _ in range(rng.randint(0, 20)))
+        assert lex_all(FastLexer(), text) == lex_all(lexer.clone(), text), repr(text)
+    text = generate_score(5000, seed=1)
+    expected = get_all_tokens(text, lexer.clone())
+    tokens = get_all_tokens(text, FastLexer())
+    assert tokens == list(tokenize(text)) == [(t.type, t.value, t.lineno, t.lexpos) for t in expected]
+    assert all(type(token) is Token for token in tokens)
+
+def test_fast_lexer_errors():
+    for text in ("C4 qn $", "C4 qn\n\n  maj\tx", "tempo=120\r\n", "C4 qnx"):
+        with pytest.raises(SymphonyLangLexerError) as expected:
+            get_all_tokens(text, lexer.clone())
+        with pytest.raises(SymphonyLangLexerError) as fast:
+            get_all_tokens(text, FastLexer())
+        assert str(fast.value) == str(expected.value)
+
+def test_fast_lexer_parses_the_same():
+    for source in (generate_score(2000, seed=2), "tempo=90\nrepeat 2 {\n  @a\n}\n", "tempo=90\nC4 qn D4"):
+        results = []
+        for lexer_instance in (lexer.clone(), FastLexer()):
+            try:
+                results.append(repr(parse_symphony_lang(source, lexer_instance)))
+            except Exception as e:
+                results.append(f"{type(e).__name__}: {e}")
+        assert results[0] == results[1]
+    assert isinstance(new_lexer(fast=True), FastLexer)
+    assert not isinstance(new_lexer(fast=False), FastLexer)
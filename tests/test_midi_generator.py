@@ -1,12 +1,22 @@
+import io
+import random
+import time
+import tracemalloc
 import pytest
 import os
+import mido
+from concurrent.futures import ProcessPoolExecutor
 from src.midi_generator import (
     note_to_midi_number,
     generate_scale_notes,
     generate_midi,
+    iter_events,
+    compact_events,
+    END_OF_TRACK,
     MIDIGenerationError
 )
-from src.parser import Composition, MusicElement
+from src.notation import PITCH_TABLE
+from src.parser import Composition, MusicElement, parse_symphony_lang
 
 def test_note_to_midi_number():
     # Test basic notes
@@ -112,3 +122,327 @@ def test_invalid_midi_generation():
     
     with pytest.raises(MIDIGenerationError):
         generate_midi(invalid_composition, 'test_invalid.mid')
+
+def test_midi_generation_in_memory():
+    composition = Composition(
+        tempo=120,
+        elements=[
+            MusicElement('note', 'C4', 'qn'),
+            MusicElement('chord', ['C4', 'E4', 'G4'], 'wn'),
+        ]
+    )
+
+    midi_data = generate_midi(composition)
+    assert midi_data.startswith(b'MThd')
+
+    buffer = io.BytesIO()
+    assert generate_midi(composition, buffer) is None
+    assert buffer.getvalue() == midi_data
+
+    test_output = 'test_in_memory.mid'
+    generate_midi(composition, test_output)
+    with open(test_output, 'rb') as file:
+        assert file.read() == midi_data
+    os.remove(test_output)
+
+    notes = [msg.note for msg in mido.MidiFile(file=io.BytesIO(midi_data)).tracks[0] if msg.type == 'note_on']
+    assert notes == [60, 60, 64, 67]
+
+def random_composition(seed, size):
+    rng = random.Random(seed)
+    notes = ['C4', 'D#5', 'Eb3', 'F#2', 'G9', 'Cb0', 'A4', 'B7']
+    durations = ['wn', 'hn', 'qn', 'en', 'sn']
+    elements = []
+    for _ in range(size):
+        kind = rng.choice(['note', 'rest', 'chord', 'scale'])
+        if kind == 'note':
+            elements.append(MusicElement('note', rng.choice(notes), rng.choice(durations)))
+        elif kind == 'rest':
+            elements.append(MusicElement('rest', None, rng.choice(['wr', 'hr', 'qr', 'er', 'sr'])))
+        elif kind == 'chord':
+            elements.append(MusicElement('chord', rng.sample(notes, 3), rng.choice(durations)))
+        else:
+            scale = {'root': rng.choice(['C4', 'A3', 'F#5']), 'type': rng.choice(['maj', 'min']),
+                     'extension': rng.choice([None, 'pent'])}
+            elements.append(MusicElement('scale', scale, 'qn'))
+    return Composition(tempo=rng.choice([30, 120, 333]), elements=elements)
+
+@pytest.mark.parametrize('seed', range(20))
+def test_fast_encoder_matches_mido(seed):
+    composition = random_composition(seed, 200)
+    assert generate_midi(composition, fast=True) == generate_midi(composition)
+
+def test_fast_encoder_rejects_invalid_input():
+    for elements in ([MusicElement('note', 'H4', 'qn')],
+                     [MusicElement('note', 'C4', 'invalid')],
+                     [MusicElement('note', 'G#9', 'qn')]):
+        for fast in (False, True):
+            with pytest.raises(MIDIGenerationError):
+                generate_midi(Composition(tempo=120, elements=elements), fast=fast)
+    with pytest.raises(MIDIGenerationError):
+        generate_midi(Composition(tempo=0, elements=[]), fast=True)
+
+def test_fast_encoder_benchmark():
+    composition = random_composition(0, 20_000)
+    events = sum(1 for _ in iter_events(composition))
+
+    rates = {}
+    for fast in (False, True):
+        start = time.perf_counter()
+        generate_midi(composition, fast=fast)
+        rates[fast] = events / (time.perf_counter() - start)
+    # Absolute rates are measured by benchmark.py.
+    assert rates[True] > 2 * rates[False]
+
+def heard(midi_data):
+    """What a player hears: the notes struck and released at each tick, and the length."""
+    mid = mido.MidiFile(file=io.BytesIO(midi_data))
+    tick = 0
+    ticks = {}
+    for msg in mido.merge_tracks(mid.tracks):
+        tick += msg.time
+        if msg.type in ('note_on', 'note_off') and not (msg.note == 0 and msg.velocity == 0):
+            released = msg.type == 'note_off' or msg.velocity == 0
+            offs, ons = ticks.setdefault(tick, ([], []))
+            (offs if released else ons).append(msg.note)
+    return sorted((tick, sorted(offs), sorted(ons)) for tick, (offs, ons) in ticks.items()), tick
+
+@pytest.mark.parametrize('seed', range(10))
+def test_compact_encoding_plays_the_same(seed):
+    composition = random_composition(seed, 300)
+    # End on a rest, whose delay has no following event to carry it.
+    composition.elements.append(MusicElement('rest', None, 'hr'))
+    plain = generate_midi(composition, fast=True)
+    for options in ({'compact': True}, {'velocity_zero_note_offs': True}):
+        compact = generate_midi(composition, fast=True, **options)
+        assert generate_midi(composition, **options) == compact
+        assert heard(compact) == heard(plain)
+        assert len(compact) < len(plain)
+
+def test_compact_encoding_of_tracks_plays_the_same():
+    composition = parse_symphony_lang("tempo=120\ntrack { C4 qn qr E4 qn }\ntrack { wr G3 qn hr }\nC2 hn")
+    plain = generate_midi(composition, fast=True)
+    compact = generate_midi(composition, fast=True, velocity_zero_note_offs=True)
+    assert heard(compact) == heard(plain)
+    # The second track's trailing rest delays its end of track.
+    assert mido.MidiFile(file=io.BytesIO(compact)).tracks[2][-1] == mido.MetaMessage('end_of_track', time=960)
+
+def test_compact_events():
+    events = [
+        (0, 0x90, 60, 64), (480, 0x80, 60, 64),
+        (240, 0x90, 0, 0), (0, 0x80, 0, 0),  # rest
+        (0, 0x90, 64, 64), (0, 0x90, 67, 64),
+        (480, 0x90, 62, 64), (0, 0x80, 64, 64), (0, 0x80, 67, 64),
+        (480, 0x80, 62, 64),
+        (120, 0x90, 0, 0), (0, 0x80, 0, 0),  # trailing rest
+    ]
+    assert list(compact_events(events)) == [
+        (0, 0x90, 60, 64), (480, 0x80, 60, 64),
+        (240, 0x90, 64, 64), (0, 0x90, 67, 64),
+        # Note-offs move ahead of the note-on struck with them.
+        (480, 0x80, 64, 64), (0, 0x80, 67, 64), (0, 0x90, 62, 64),
+        (480, 0x80, 62, 64),
+        (120, END_OF_TRACK, 0, 0),
+    ]
+    assert list(compact_events(events, velocity_zero_note_offs=True))[:3] == [
+        (0, 0x90, 60, 64), (480, 0x90, 60, 0), (240, 0x90, 64, 64)]
+    # A note struck and released within one tick keeps its order.
+    same_tick = [(0, 0x90, 60, 64), (0, 0x80, 60, 64), (0, 0x80, 62, 64)]
+    assert list(compact_events(same_tick)) == same_tick
+
+def test_compact_corpus_size():
+    # Encoding rates and sizes on generated scores are measured by benchmark.py.
+    corpus = [random_composition(seed, 2000) for seed in range(10)]
+    sizes = {}
+    for name, options in [('plain', {}), ('compact', {'compact': True}),
+                          ('velocity 0', {'velocity_zero_note_offs': True})]:
+        sizes[name] = sum(len(generate_midi(composition, fast=True, **options)) for composition in corpus)
+    assert sizes['compact'] < sizes['plain'] * 0.97
+    assert sizes['velocity 0'] < sizes['plain'] * 0.85
+
+def reference_note_to_midi_number(note):
+    """note_to_midi_number as it was before the pitch table, kept to check equivalence."""
+    base = {'C': 60, 'D': 62, 'E': 64, 'F': 65, 'G': 67, 'A': 69, 'B': 71}
+    try:
+        base_note = note[0]
+        if base_note not in base:
+            raise MIDIGenerationError(f"Invalid note name: {base_note}")
+        try:
+            octave = int(note[-1])
+        except (ValueError, IndexError):
+            raise MIDIGenerationError(f"Invalid octave in note: {note}")
+        midi_number = base[base_note] + (octave - 4) * 12
+        if '#' in note:
+            midi_number += 1
+        elif 'b' in note:
+            midi_number -= 1
+        elif any(c not in '0123456789' for c in note[1:]) and note[1] not in '#b':
+            raise MIDIGenerationError(f"Invalid note format: {note}")
+        return midi_number
+    except Exception as e:
+        if isinstance(e, MIDIGenerationError):
+            raise
+        raise MIDIGenerationError(f"Invalid note: {note}")
+
+def outcome(function, note):
+    try:
+        return function(note)
+    except MIDIGenerationError as e:
+        return ('error', str(e))
+
+ALL_SPELLINGS = [f"{letter}{accidental}{octave}"
+                 for letter in 'ABCDEFG' for accidental in ('', '#', 'b') for octave in range(10)]
+
+def test_pitch_table_covers_every_spelling():
+    assert sorted(PITCH_TABLE) == sorted(ALL_SPELLINGS)
+    for note in ALL_SPELLINGS:
+        assert note_to_midi_number(note) == reference_note_to_midi_number(note)
+
+def test_note_to_midi_number_matches_reference_on_fuzzed_input():
+    rng = random.Random(0)
+    alphabet = 'ABCDEFGHcx#b0123456789 -'
+    samples = [''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 5))) for _ in range(20_000)]
+    for note in samples + ['', 'C', '#4', 'C44', 'Cb#4', None, 4, ['C4']]:
+        assert outcome(note_to_midi_number, note) == outcome(reference_note_to_midi_number, note), note
+
+def test_pitch_table_microbenchmark():
+    notes = ALL_SPELLINGS * 200
+    timings = {}
+    for name, function in (('reference', reference_note_to_midi_number), ('table', note_to_midi_number)):
+        start = time.perf_counter()
+        for note in notes:
+            function(note)
+        timings[name] = time.perf_counter() - start
+    # Absolute rates are measured by benchmark.py.
+    assert timings['table'] * 3 < timings['reference']
+
+def test_repeats_and_patterns_play_as_written_out():
+    blocks = parse_symphony_lang("""tempo=100
+pattern @arpeggio {
+  C4 en
+  E4 en
+  G4 en
+}
+repeat 3 {
+  @arpeggio
+  repeat 2 { [C4 E4] qn qr }
+}
+A3 min pent
+@arpeggio
+""")
+    arpeggio = "C4 en\nE4 en\nG4 en\n"
+    written_out = parse_symphony_lang("tempo=100\n" + (arpeggio + "[C4 E4] qn qr\n" * 2) * 3 + "A3 min pent\n" + arpeggio)
+    assert list(iter_events(blocks)) == list(iter_events(written_out))
+    assert generate_midi(blocks) == generate_midi(written_out)
+    assert generate_midi(blocks, fast=True) == generate_midi(written_out, fast=True)
+
+def test_invalid_pattern_calls():
+    for text, message in [
+        ("tempo=120\n@riff\npattern @riff { C4 qn }", "Undefined pattern: @riff"),
+        ("tempo=120\npattern @riff { C4 qn @riff }\n@riff", "Pattern calls itself: @riff"),
+        ("tempo=120\npattern @a { @b }\npattern @b { @a }\n@a", "Pattern calls itself: @a"),
+    ]:
+        with pytest.raises(MIDIGenerationError) as error:
+            generate_midi(parse_symphony_lang(text), fast=True)
+        assert str(error.value) == message
+
+def test_deep_nesting_is_an_error():
+    chain = "tempo=120\npattern @p0 { C4 qn }\n" + "".join(f"pattern @p{i} {{ @p{i - 1} }}\n" for i in range(1, 1200))
+    repeats = "tempo=120\n" + "repeat 2 { " * 1200 + "C4 qn" + " }" * 1200
+    for text in (chain + "@p1199\n", repeats):
+        composition = parse_symphony_lang(text)
+        for fast in (False, True):
+            with pytest.raises(MIDIGenerationError, match="nested more than"):
+                generate_midi(composition, fast=fast)
+    shallow = parse_symphony_lang(chain + "@p150\n")
+    assert generate_midi(shallow, fast=True) == generate_midi(parse_symphony_lang("tempo=120\nC4 qn"), fast=True)
+
+def test_checkpoint_can_abandon_encoding():
+    composition = parse_symphony_lang("tempo=120\nrepeat 100000 { C4 sn [E4 G4] sn }\ntrack { C4 qn }")
+    class Abandoned(Exception):
+        pass
+    calls = []
+    def checkpoint():
+        calls.append(len(calls))
+        if len(calls) == 3:
+            raise Abandoned()
+    for fast in (False, True):
+        calls.clear()
+        with pytest.raises(Abandoned):
+            generate_midi(composition, fast=fast, checkpoint=checkpoint)
+        assert len(calls) == 3
+    assert generate_midi(composition, fast=True, checkpoint=lambda: None) == generate_midi(composition, fast=True)
+
+def test_repeats_expand_lazily():
+    composition = parse_symphony_lang("tempo=120\nrepeat 10000 {\n  repeat 10 { C4 sn [E4 G4] sn }\n  qr\n}")
+    tracemalloc.start()
+    try:
+        events = sum(1 for _ in iter_events(composition))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert events == 10000 * (10 * 6 + 2)
+    # Nothing is materialized per repetition.
+    assert peak < 64 * 1024
+
+TRACK_SCORE = """tempo=90
+pattern @walk { C3 qn D3 qn }
+track @melody {
+  repeat 2 { C5 en E5 en G5 qn }
+  [C5 E5] hn
+}
+voice @bass {
+  @walk
+  qr
+  @walk
+}
+C4 wn
+"""
+
+def test_tracks_become_parallel_midi_tracks():
+    composition = parse_symphony_lang(TRACK_SCORE)
+    midi_data = generate_midi(composition)
+    assert generate_midi(composition, fast=True) == midi_data
+    mid = mido.MidiFile(file=io.BytesIO(midi_data))
+    assert mid.type == 1
+    assert len(mid.tracks) == 3
+    assert [track.name for track in mid.tracks] == ['', 'melody', 'bass']
+    assert [[msg.type for msg in track if msg.is_meta] for track in mid.tracks] == [
+        ['set_tempo', 'end_of_track'], ['track_name', 'end_of_track'], ['track_name', 'end_of_track']]
+
+    def notes(track):
+        # (tick, pitch) of each note struck, leaving out rest placeholders.
+        tick = 0
+        struck = []
+        for msg in track:
+            tick += msg.time
+            if msg.type == 'note_on' and msg.velocity:
+                struck.append((tick, msg.note))
+        return struck
+    # Every track starts at the beginning.
+    assert notes(mid.tracks[0]) == [(0, 60)]
+    assert notes(mid.tracks[1])[:3] == [(0, 72), (240, 76), (480, 79)]
+    assert notes(mid.tracks[2]) == [(0, 48), (480, 50), (1440, 48), (1920, 50)]
+
+def test_tracks_encode_in_parallel():
+    composition = parse_symphony_lang(TRACK_SCORE)
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        assert generate_midi(composition, fast=True, executor=executor) == generate_midi(composition, fast=True)
+
+def test_iter_events_merges_tracks_like_mido():
+    composition = parse_symphony_lang(TRACK_SCORE)
+    merged = mido.merge_tracks(mido.MidiFile(file=io.BytesIO(generate_midi(composition))).tracks)
+    expected = [(msg.time, msg.type, msg.note) for msg in merged if not msg.is_meta]
+    actual = [(delta, 'note_on' if status == 0x90 else 'note_off', note) for delta, status, note, _ in iter_events(composition)]
+    # mido carries the delta of dropped meta events over to the next message.
+    assert [(kind, note) for _, kind, note in actual] == [(kind, note) for _, kind, note in expected]
+    assert sum(delta for delta, _, _ in actual) == sum(msg.time for msg in merged)
+
+def test_invalid_tracks():
+    for text, message in [
+        ("tempo=120\nrepeat 2 { track { C4 qn } }", "Tracks must be at the top level of a score"),
+        ("tempo=120\ntrack { @riff }\npattern @riff { C4 qn }", "Undefined pattern: @riff"),
+    ]:
+        with pytest.raises(MIDIGenerationError) as error:
+            generate_midi(parse_symphony_lang(text), fast=True)
+        assert str(error.value) == message
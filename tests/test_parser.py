@@ -1,3 +1,9 @@
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
 import pytest
 from src.parser import parse_symphony_lang, SymphonyLangParserError, MusicElement
 
@@ -87,3 +93,152 @@ def test_invalid_syntax():
     """
     with pytest.raises(SymphonyLangParserError):
         parse_symphony_lang(input_text)
+
+def _timed_parse(text, repeats=3):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = parse_symphony_lang(text)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def test_parse_time_scales_linearly():
+    # Set SYMPHONY_BENCH_MAX_ELEMENTS=1000000 to run the full 1k..1M sweep.
+    max_elements = int(os.environ.get('SYMPHONY_BENCH_MAX_ELEMENTS', 100_000))
+    block = "C4 qn\n[C4 E4 G4] wn\nqr\n\nC4 maj pent\n"
+    sizes = [n for n in (1_000, 10_000, 100_000, 1_000_000) if n <= max_elements]
+
+    per_element = {}
+    for size in sizes:
+        text = "tempo=120\n" + block * (size // 4)
+        elapsed, result = _timed_parse(text, repeats=3 if size <= 10_000 else 1)
+        assert len(result.elements) == size
+        per_element[size] = elapsed / size
+
+    # A quadratic parser is ~100x slower per element at each decade; allow
+    # generous slack for timer noise on small inputs.
+    assert per_element[sizes[-1]] < per_element[sizes[0]] * 3
+
+@pytest.mark.parametrize('start', ['composition', 'element_list'])
+def test_prebuilt_tables_match_grammar(start):
+    # Fails when the grammar changed without running src/build_tables.py.
+    import importlib
+    import ply.yacc as yacc
+    from src import parser as parser_module
+    tables = importlib.import_module('src.' + parser_module.PARSETAB_MODULES[start])
+    grammar = yacc.ParserReflect({**vars(parser_module), 'start': start})
+    grammar.get_all()
+    assert tables._lr_signature == grammar.signature()
+
+def test_import_is_lazy_and_read_only(tmp_path):
+    src_dir = os.path.join(os.path.dirname(__file__), os.pardir, 'src')
+    tables = os.path.join(src_dir, 'parsetab.py')
+    tables_mtime = os.path.getmtime(tables)
+    script = (
+        "import sys, parser\n"
+        "assert 'ply.yacc' not in sys.modules\n"
+        "assert parser.parse_symphony_lang('tempo=120\\nC4 qn').tempo == 120\n"
+    )
+    subprocess.run([sys.executable, '-c', script], cwd=tmp_path, check=True,
+                   env={**os.environ, 'PYTHONPATH': src_dir})
+    assert list(tmp_path.iterdir()) == []
+    assert not os.path.exists(os.path.join(src_dir, 'parser.out'))
+    assert os.path.getmtime(tables) == tables_mtime
+
+def test_parser_resolves_pitches_and_ticks():
+    result = parse_symphony_lang("""
+    tempo=120
+    C#4 qn
+    qr
+    [C4 Eb4 G4] hn
+    A4 min pent
+    """)
+    note, rest, chord, scale = result.elements
+    assert (note.pitches, note.ticks) == ((61,), 480)
+    assert (rest.pitches, rest.ticks) == ((), 480)
+    assert (chord.pitches, chord.ticks) == ((60, 63, 67), 960)
+    assert (scale.pitches, scale.ticks) == ((69, 72, 74, 76, 79, 81), 480)
+    # Unsupported scale combinations are left for the generator to report.
+    assert parse_symphony_lang("tempo=120\nC4 maj chrom").elements[0].pitches is None
+
+def test_compact_element_representation():
+    assert not hasattr(MusicElement('note', 'C4', 'qn'), '__dict__')
+    text = "tempo=120\n" + "C4 qn\n[C4 E4 G4] wn\nqr\nC4 maj pent\n" * 2_500
+    tracemalloc.start()
+    try:
+        result = parse_symphony_lang(text)
+        retained = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    assert len(result.elements) == 10_000
+    assert retained / len(result.elements) < 200
+
+def test_mutating_parsed_values_does_not_leak():
+    text = "tempo=120\n[C4 E4 G4] qn\nC4 maj pent\n"
+    first = parse_symphony_lang(text).elements
+    second = parse_symphony_lang(text).elements
+    first[0].value.append('B4')
+    first[1].value['root'] = 'D4'
+    assert second[0].value == ['C4', 'E4', 'G4']
+    assert second[1].value['root'] == 'C4'
+    third = parse_symphony_lang(text).elements
+    assert [e.value for e in third] == [['C4', 'E4', 'G4'], {'root': 'C4', 'type': 'maj', 'extension': 'pent'}]
+    assert third[0].pitches is second[0].pitches
+
+def test_parse_repeat_and_patterns():
+    result = parse_symphony_lang("""
+    tempo=120
+    pattern @riff {
+      C4 en
+      [E4 G4] en
+    }
+    repeat 3 { @riff qr }
+    @riff
+    """)
+    pattern, repeat, call = result.elements
+    assert pattern.type == 'pattern'
+    name, body = pattern.value
+    assert name == '@riff'
+    assert [(e.type, e.value) for e in body] == [('note', 'C4'), ('chord', ['E4', 'G4'])]
+    assert repeat.type == 'repeat'
+    count, body = repeat.value
+    assert count == 3
+    assert [(e.type, e.value) for e in body] == [('call', '@riff'), ('rest', None)]
+    assert (call.type, call.value) == ('call', '@riff')
+
+def test_invalid_blocks():
+    for text, message in [
+        ("tempo=120\nrepeat { C4 qn }", "Syntax error at token LBRACE with value '{' at line 2"),
+        ("tempo=120\nrepeat 2 {\nC4 qn", "Syntax error at EOF"),
+        ("tempo=120\nC4 qn }", "Syntax error at token RBRACE with value '}' at line 2"),
+        ("tempo=120\npattern riff { C4 qn }", "Lexer error: Illegal character 'r' at line 2"),
+    ]:
+        with pytest.raises(SymphonyLangParserError) as error:
+            parse_symphony_lang(text)
+        assert str(error.value) == message
+
+def test_repeat_is_parsed_once_whatever_its_count():
+    # The body is held once, so a 10k-repeat loop takes no more memory than
+    # a 10-repeat one.
+    def retained(count):
+        text = f"tempo=120\nrepeat {count} {{\n  C4 qn\n  [C4 E4 G4] wn\n  qr\n}}"
+        tracemalloc.start()
+        try:
+            result = parse_symphony_lang(text)
+            return result, tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+    few, few_memory = retained(10)
+    many, many_memory = retained(10_000)
+    assert len(many.elements) == 1
+    assert len(many.elements[0].value[1]) == 3
+    assert many_memory < few_memory + 1024
+
+def test_parse_tracks():
+    result = parse_symphony_lang("tempo=120\nC4 qn\ntrack @melody {\n  E4 qn\n}\nvoice { G3 wn }")
+    note, melody, bass = result.elements
+    assert note.type == 'note'
+    assert (melody.type, melody.value[0]) == ('track', '@melody')
+    assert [e.value for e in melody.value[1]] == ['E4']
+    assert (bass.type, bass.value[0]) == ('track', None)
+    assert [e.value for e in bass.value[1]] == ['G3']
@@ -0,0 +1,98 @@
+import json
+import threading
+
+import pytest
+from src.compiler import SymphonyCompiler
+from src.lexer import get_all_tokens
+from src.midi_generator import generate_midi, iter_events
+from src.parser import SymphonyLangParserError, parse_segment, parse_symphony_lang
+from src.profiling import Profiler, active_profiler, phase
+
+SCORE = "tempo=120\n" + "\n".join(["C4 qn", "[C4 E4 G4] hn", "qr", "A3 min pent"] * 50)
+TRACK_SCORE = SCORE + "\ntrack @bass {\n  repeat 4 { C2 hn }\n}\n"
+
+def test_phases_are_recorded(tmp_path):
+    output = tmp_path / "out.mid"
+    with Profiler() as profiler:
+        composition = SymphonyCompiler().compile(SCORE, str(output))
+    results = profiler.results()
+    assert list(results) == ['lex', 'parse', 'events', 'encode', 'write']
+    assert all(record['calls'] == 1 and record['seconds'] >= 0 for record in results.values())
+    assert results['lex']['tokens'] == len(get_all_tokens(SCORE.strip()))
+    assert results['parse']['elements'] == len(composition.elements) == 200
+    assert results['events']['events'] == sum(1 for _ in iter_events(composition))
+    assert results['encode']['bytes'] == output.stat().st_size
+    assert 'peak_bytes' not in results['lex']
+    assert json.loads(profiler.to_json()) == results
+    assert active_profiler() is None
+
+def test_profiled_output_is_unchanged():
+    for source in (SCORE, TRACK_SCORE):
+        composition = parse_symphony_lang(source)
+        for kwargs in ({'fast': True}, {'fast': False}, {'fast': True, 'compact': True}):
+            expected = generate_midi(composition, **kwargs)
+            with Profiler() as profiler:
+                assert generate_midi(parse_symphony_lang(source), **kwargs) == expected
+            assert profiler.results()['events']['calls'] == 1
+        with Profiler():
+            assert repr(parse_symphony_lang(source)) == repr(composition)
+
+@pytest.mark.parametrize("source", [
+    "tempo=120\nC4 qn\nC4 x qn",  # lexer error
+    "tempo=120\nC4 qn D4\nC4 x qn",  # syntax error before a lexer error
+    "tempo=120\nC4 qn\nrepeat 2 {",  # error at EOF
+])
+def test_profiled_errors_are_unchanged(source):
+    with pytest.raises(SymphonyLangParserError) as expected:
+        parse_symphony_lang(source)
+    with Profiler() as profiler, pytest.raises(SymphonyLangParserError) as profiled:
+        parse_symphony_lang(source)
+    assert str(profiled.value) == str(expected.value)
+    # The phases still count the time up to the error.
+    assert profiler.results()['parse']['calls'] == 1
+
+def test_segments_and_nested_phases_add_up():
+    calls = []
+    with Profiler(memory=True, callback=lambda *args: calls.append(args)) as profiler:
+        with phase('outer') as counts:
+            for first_line in range(3):
+                parse_segment("C4 qn\nqr\n", first_line + 1)
+            data = [bytes(1 << 20)]
+            counts['segments'] = 3
+            del data
+    results = profiler.results()
+    assert results['lex']['calls'] == results['parse']['calls'] == 3
+    assert results['lex']['tokens'] == 3 * 5
+    assert results['parse']['elements'] == 6
+    assert results['outer']['segments'] == 3
+    assert results['outer']['peak_bytes'] >= 1 << 20 > results['parse']['peak_bytes']
+    assert results['outer']['seconds'] >= results['lex']['seconds'] + results['parse']['seconds']
+    assert [call[0] for call in calls] == ['lex', 'parse'] * 3 + ['outer']
+    assert calls[-1][2] == {'segments': 3} and calls[-1][3] == results['outer']['peak_bytes']
+
+def test_profiler_is_per_thread():
+    def compile_elsewhere():
+        parse_symphony_lang(SCORE)
+
+    with Profiler() as profiler:
+        thread = threading.Thread(target=compile_elsewhere)
+        thread.start()
+        thread.join()
+        with Profiler() as inner:
+            parse_symphony_lang(SCORE)
+        assert active_profiler() is profiler
+    assert profiler.results() == {}
+    assert inner.results()['parse']['calls'] == 1
+
+def test_profiler_is_seen_through_either_import_path():
+    # The pipeline modules import profiling top-level (pytest.ini puts src
+    # on the path), a second copy of the module beside src.profiling.
+    import profiling
+    import src.profiling
+    assert profiling is not src.profiling
+    with src.profiling.Profiler() as profiler:
+        assert profiling.active_profiler() is profiler
+        parse_symphony_lang(SCORE)
+    assert profiler.results()['parse']['calls'] == 1
+    with profiling.Profiler() as profiler:
+        assert src.profiling.active_profiler() is profiler
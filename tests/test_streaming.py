@@ -0,0 +1,109 @@
+import io
+import itertools
+import random
+import tracemalloc
+
+import pytest
+from src.streaming import compile_stream, iter_chunks, parse_stream
+from src.midi_generator import generate_midi
+from src.parser import parse_symphony_lang
+
+LINES = ["C4 qn", "[C4 E4 G4] wn", "qr", "", "# comment", "A3 min pent", "  D#5 en  # trailing", "\t"]
+
+def random_score(seed, size):
+    rng = random.Random(seed)
+    body = [rng.choice(LINES) for _ in range(size)]
+    return "\n  \n" + rng.choice(["tempo=120", "  tempo=96 C4 hn"]) + "\n" + "\n".join(body) + rng.choice(["", "\n\n  \n", "\n# end"])
+
+def summarize(composition):
+    return composition.tempo, [(e.type, e.value, e.duration) for e in composition.elements]
+
+def error_message(parse):
+    with pytest.raises(Exception) as error:
+        summarize(parse())
+    return str(error.value)
+
+def test_iter_chunks_strips_like_full_parse():
+    lines = ["\n", "  tempo=120\n", "C4 qn\n", "\n", "D4 qn  \n", "\n", "\n"]
+    assert list(iter_chunks(lines, chunk_lines=2)) == [
+        (1, "tempo=120\nC4 qn", False),
+        (3, "\nD4 qn", True),
+    ]
+
+@pytest.mark.parametrize('seed', range(10))
+@pytest.mark.parametrize('chunk_lines', [1, 2, 7, 1024])
+def test_stream_parse_matches_full_parse(seed, chunk_lines):
+    source = random_score(seed, 60)
+    streamed = parse_stream(io.StringIO(source), chunk_lines)
+    assert summarize(streamed) == summarize(parse_symphony_lang(source))
+
+@pytest.mark.parametrize('source', [
+    "",
+    "tempo=120",
+    "tempo=120\n\n",
+    "C4 qn\ntempo=120",
+    "tempo=120\nC4 qn\nD4\nE4 qn",
+    "tempo=120\nC4 qn\nE4 qn\nD4",
+    "tempo=120\nC4 qn\n\n\nE4 qn $",
+])
+@pytest.mark.parametrize('chunk_lines', [1, 2, 1024])
+def test_stream_parse_reports_same_errors(source, chunk_lines):
+    expected = error_message(lambda: parse_symphony_lang(source))
+    assert error_message(lambda: parse_stream(io.StringIO(source), chunk_lines)) == expected
+
+def test_stream_compile_reports_first_error_reached():
+    # The call fails to encode before the syntax error after it is parsed;
+    # a full parse stops at the syntax error first.
+    source = "tempo=120\n@a\n" + "C4 qn\n" * 10 + "C4 qn D4\n"
+    assert error_message(lambda: generate_midi(parse_symphony_lang(source))).startswith("Syntax error")
+    assert error_message(lambda: compile_stream(io.StringIO(source), io.BytesIO(), chunk_lines=4)) \
+        == "Undefined pattern: @a"
+
+def test_compile_stream_matches_generate_midi():
+    source = random_score(1, 500)
+    expected = generate_midi(parse_symphony_lang(source))
+
+    output = io.BytesIO()
+    assert compile_stream(io.StringIO(source), output, chunk_lines=16) == len(expected)
+    assert output.getvalue() == expected
+
+    class Unseekable(io.RawIOBase):
+        def __init__(self):
+            self.data = bytearray()
+        def writable(self):
+            return True
+        def write(self, data):
+            self.data += data
+            return len(data)
+
+    unseekable = Unseekable()
+    compile_stream(io.StringIO(source), unseekable, chunk_lines=16)
+    assert bytes(unseekable.data) == expected
+
+def peak_streaming_memory(lines, tmp_path):
+    score = itertools.chain(["tempo=120\n"], itertools.islice(itertools.cycle(
+        ["C4 qn\n", "[C4 E4 G4] wn\n", "qr\n", "C4 maj\n"]), lines))
+    with open(tmp_path / f"stream_{lines}.mid", "wb") as output:
+        tracemalloc.start()
+        try:
+            compile_stream(score, output, chunk_lines=256)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+def test_streaming_memory_is_flat(tmp_path):
+    small = peak_streaming_memory(2_000, tmp_path)
+    large = peak_streaming_memory(20_000, tmp_path)
+    assert large < small * 1.5
+
+@pytest.mark.parametrize('chunk_lines', [1, 2, 1024])
+def test_stream_parse_keeps_blocks_together(chunk_lines):
+    source = "tempo=120\npattern @riff {\n  C4 en\n\n  E4 en\n}\nrepeat 3 {\n  @riff\n  qr\n}\n@riff\n"
+    streamed = parse_stream(io.StringIO(source), chunk_lines)
+    buffer = io.BytesIO()
+    generate_midi(streamed, buffer)
+    assert buffer.getvalue() == generate_midi(parse_symphony_lang(source))
+    assert [text for _, text, _ in iter_chunks(io.StringIO(source), chunk_lines=1)][1:3] == [
+        "pattern @riff {\n  C4 en\n\n  E4 en\n}",
+        "repeat 3 {\n  @riff\n  qr\n}",
+    ]
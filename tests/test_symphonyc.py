@@ -0,0 +1,182 @@
+import io
+import json
+import os
+
+import pytest
+
+from src.symphonyc import run, find_inputs
+
+VALID_SCORE = "tempo=120\nC4 qn\n[C4 E4 G4] wn\n"
+
+def write_scores(directory, count):
+    paths = []
+    for i in range(count):
+        path = directory / f"score_{i}.sym"
+        path.write_text(VALID_SCORE + f"C{i % 8 + 1} hn\n")
+        paths.append(str(path))
+    return paths
+
+def run_json(*args, **kwargs):
+    out = io.StringIO()
+    failures = run(*args, out=out, **kwargs)
+    return failures, [json.loads(line) for line in out.getvalue().splitlines()]
+
+def test_find_inputs_expands_directories_and_globs(tmp_path):
+    (tmp_path / "nested").mkdir()
+    a = write_scores(tmp_path, 2)
+    b = write_scores(tmp_path / "nested", 1)
+    (tmp_path / "notes.txt").write_text("not a score")
+    assert find_inputs([str(tmp_path)]) == sorted(a + b)
+    assert find_inputs([str(tmp_path / "*.sym")]) == sorted(a)
+    assert find_inputs([str(tmp_path / "**" / "*.sym")]) == sorted(a + b)
+
+def test_output_dir_keeps_relative_paths(tmp_path):
+    for name in ("a", "b"):
+        (tmp_path / "scores" / name).mkdir(parents=True)
+        (tmp_path / "scores" / name / "x.sym").write_text(VALID_SCORE + f"{name.upper()}4 hn\n")
+    out_dir = tmp_path / "out"
+    for pattern in (str(tmp_path / "scores"), str(tmp_path / "scores" / "*" / "x.sym")):
+        failures, reports = run_json([pattern], output_dir=str(out_dir), workers=2, state_file=None)
+        assert failures == 0
+        assert sorted(r['output'] for r in reports) == [str(out_dir / "a" / "x.mid"), str(out_dir / "b" / "x.mid")]
+    with open(out_dir / "a" / "x.mid", 'rb') as first, open(out_dir / "b" / "x.mid", 'rb') as second:
+        assert first.read() != second.read()
+
+def test_colliding_outputs_are_reported(tmp_path):
+    for name in ("a", "b"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "x.sym").write_text(VALID_SCORE)
+    out_dir = tmp_path / "out"
+    failures, reports = run_json([str(tmp_path / "a"), str(tmp_path / "b")], output_dir=str(out_dir), workers=2,
+                                 state_file=str(tmp_path / "state.json"))
+    assert failures == 2
+    assert {r['status'] for r in reports} == {'error'}
+    assert all('also the output of' in r['error'] for r in reports)
+    assert not (out_dir / "x.mid").exists()
+
+def test_parallel_batch_compile(tmp_path):
+    inputs = write_scores(tmp_path, 12)
+    (tmp_path / "broken.sym").write_text("tempo=120\nC4 qn D4\n")
+    out_dir = tmp_path / "out"
+    state_file = str(tmp_path / "state.json")
+
+    failures, reports = run_json([str(tmp_path)], output_dir=str(out_dir), workers=3, state_file=state_file)
+    assert failures == 1
+    by_input = {r['input']: r for r in reports}
+    assert len(by_input) == 13
+    assert by_input[str(tmp_path / "broken.sym")]['status'] == 'error'
+    assert 'Syntax error' in by_input[str(tmp_path / "broken.sym")]['error']
+    for path in inputs:
+        report = by_input[path]
+        assert report['status'] == 'ok'
+        assert report['elements'] == 3
+        assert report['seconds'] >= 0
+        assert os.path.getsize(report['output']) > 0
+
+    # Unchanged inputs are skipped; edited and previously failing ones are rebuilt.
+    with open(inputs[0], 'a') as file:
+        file.write("qr\n")
+    failures, reports = run_json([str(tmp_path)], output_dir=str(out_dir), workers=3, state_file=state_file)
+    statuses = {r['input']: r['status'] for r in reports}
+    assert statuses.pop(inputs[0]) == 'ok'
+    assert statuses.pop(str(tmp_path / "broken.sym")) == 'error'
+    assert set(statuses.values()) == {'skipped'}
+
+    _, reports = run_json([str(tmp_path)], output_dir=str(out_dir), workers=1, force=True, state_file=state_file)
+    assert {r['status'] for r in reports} == {'ok', 'error'}
+
+def test_missing_input_is_reported(tmp_path):
+    failures, reports = run_json([str(tmp_path / "missing.sym")], state_file=None)
+    assert failures == 1
+    assert reports[0]['status'] == 'error'
+
+def test_deep_pattern_chain_fails_only_its_score(tmp_path):
+    write_scores(tmp_path, 1)
+    chain = "".join(f"pattern @p{i} {{ @p{i - 1} }}\n" for i in range(1, 1200))
+    (tmp_path / "deep.sym").write_text("tempo=120\npattern @p0 { C4 qn }\n" + chain + "@p1199\n")
+    state_file = tmp_path / "state.json"
+    for workers in (1, 2):
+        failures, reports = run_json([str(tmp_path)], workers=workers, force=True, state_file=str(state_file))
+        statuses = {os.path.basename(r['input']): r['status'] for r in reports}
+        assert failures == 1 and statuses == {'deep.sym': 'error', 'score_0.sym': 'ok'}
+        assert state_file.exists()
+
+def test_stream_mode_writes_same_midi(tmp_path):
+    inputs = write_scores(tmp_path, 3)
+    _, buffered = run_json(inputs, output_dir=str(tmp_path / "buffered"), workers=1, state_file=None)
+    _, streamed = run_json(inputs, output_dir=str(tmp_path / "streamed"), workers=2, state_file=None, stream=True)
+    assert {r['status'] for r in buffered + streamed} == {'ok'}
+    for a, b in zip(sorted(buffered, key=lambda r: r['input']), sorted(streamed, key=lambda r: r['input'])):
+        with open(a['output'], 'rb') as first, open(b['output'], 'rb') as second:
+            assert first.read() == second.read()
+
+def test_failed_stream_keeps_previous_output(tmp_path):
+    inputs = write_scores(tmp_path, 1)
+    out_dir = tmp_path / "out"
+    _, reports = run_json(inputs, output_dir=str(out_dir), workers=1, state_file=None, stream=True)
+    with open(reports[0]['output'], 'rb') as file:
+        previous = file.read()
+    # Enough good lines that some output is written before the error.
+    with open(inputs[0], 'w') as file:
+        file.write("tempo=120\n" + "C4 qn\n\n" * 5000 + "C4 x qn\n")
+    failures, reports = run_json(inputs, output_dir=str(out_dir), workers=1, state_file=None, stream=True)
+    assert failures == 1 and reports[0]['status'] == 'error'
+    with open(reports[0]['output'], 'rb') as file:
+        assert file.read() == previous
+    assert os.listdir(out_dir) == [os.path.basename(reports[0]['output'])]
+
+def test_compact_mode_writes_smaller_files_and_recompiles(tmp_path):
+    inputs = write_scores(tmp_path, 2)
+    state_file = str(tmp_path / "state.json")
+    _, plain = run_json(inputs, output_dir=str(tmp_path / "plain"), workers=1, state_file=None)
+    _, compact = run_json(inputs, output_dir=str(tmp_path / "out"), workers=1, state_file=state_file, compact=True)
+    assert {r['status'] for r in plain + compact} == {'ok'}
+    for a, b in zip(plain, compact):
+        assert os.path.getsize(b['output']) < os.path.getsize(a['output'])
+    # Outputs written the other way are not up to date.
+    _, reports = run_json(inputs, output_dir=str(tmp_path / "out"), workers=1, state_file=state_file)
+    assert {r['status'] for r in reports} == {'ok'}
+    _, reports = run_json(inputs, output_dir=str(tmp_path / "out"), workers=1, state_file=state_file)
+    assert {r['status'] for r in reports} == {'skipped'}
+
+def test_wav_mode_renders_audio(tmp_path):
+    pytest.importorskip("numpy")
+    inputs = write_scores(tmp_path, 2)
+    state_file = str(tmp_path / "state.json")
+    _, buffered = run_json(inputs, output_dir=str(tmp_path / "buffered"), workers=1, state_file=state_file)
+    _, reports = run_json(inputs, output_dir=str(tmp_path / "buffered"), workers=1, state_file=state_file, wav=True)
+    _, streamed = run_json(inputs, output_dir=str(tmp_path / "streamed"), workers=2, state_file=None, stream=True,
+                           wav=True)
+    # Missing audio counts as out of date.
+    assert {r['status'] for r in buffered + reports + streamed} == {'ok'}
+    for a, b in zip(sorted(reports, key=lambda r: r['input']), sorted(streamed, key=lambda r: r['input'])):
+        assert a['frames'] == b['frames'] > 0
+        with open(a['output'][:-4] + '.wav', 'rb') as first, open(b['output'][:-4] + '.wav', 'rb') as second:
+            assert first.read() == second.read()
+
+def test_profile_mode_reports_phases(tmp_path):
+    inputs = write_scores(tmp_path, 2)
+    _, reports = run_json(inputs, workers=2, state_file=None, profile=True)
+    _, streamed = run_json(inputs, workers=1, state_file=None, stream=True, profile=True)
+    for report in reports:
+        assert list(report['profile']) == ['read', 'lex', 'parse', 'events', 'encode', 'write']
+        assert report['profile']['parse']['elements'] == report['elements']
+        assert all(record['peak_bytes'] > 0 for record in report['profile'].values())
+    for report in streamed:
+        assert {'stream', 'lex', 'parse'} <= set(report['profile'])
+    _, plain = run_json(inputs, workers=1, state_file=None, force=True)
+    assert all('profile' not in report for report in plain)
+
+def test_fast_lexer_mode_writes_same_midi(tmp_path):
+    inputs = write_scores(tmp_path, 3)
+    (tmp_path / "broken.sym").write_text("tempo=120\nC4 qn $\n")
+    inputs.append(str(tmp_path / "broken.sym"))
+    _, plain = run_json(inputs, output_dir=str(tmp_path / "plain"), workers=1, state_file=None)
+    for stream in (False, True):
+        _, fast = run_json(inputs, output_dir=str(tmp_path / f"fast{stream}"), workers=2, state_file=None,
+                           stream=stream, fast_lexer=True)
+        for a, b in zip(sorted(plain, key=lambda r: r['input']), sorted(fast, key=lambda r: r['input'])):
+            assert (a['status'], a.get('error')) == (b['status'], b.get('error'))
+            if a['status'] == 'ok':
+                with open(a['output'], 'rb') as first, open(b['output'], 'rb') as second:
+                    assert first.read() == second.read()
@@ -0,0 +1,91 @@
+import io
+import random
+import tracemalloc
+import wave
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src.midi_generator import generate_midi
+from src.parser import parse_symphony_lang
+from src.synth import (SAMPLE_RATE, RELEASE_SECONDS, Synthesizer, build_wavetables, composition_frames,
+                       pitch_frequency, render, render_wav)
+
+LINES = ["C4 qn", "[C4 E4 G4] hn", "qr", "A3 min pent", "D#5 en", "[F3 A3 C4 E4] wn", "G2 sn"]
+
+def random_score(lines, seed=0):
+    rng = random.Random(seed)
+    return "tempo=120\n" + "\n".join(rng.choice(LINES) for _ in range(lines))
+
+def audio(source, **kwargs):
+    return np.concatenate(list(render(source, **kwargs)))
+
+def test_wavetables_are_band_limited():
+    tables = build_wavetables()
+    assert tables.shape[0] == 128
+    assert np.abs(tables).max() == pytest.approx(1.0)
+    for pitch in (21, 60, 100, 127):
+        spectrum = np.abs(np.fft.rfft(tables[pitch]))
+        harmonics = np.nonzero(spectrum > spectrum.max() * 1e-3)[0]
+        assert harmonics[0] == 1
+        assert harmonics[-1] * pitch_frequency(pitch) < SAMPLE_RATE / 2
+
+def test_note_timing_and_pitch():
+    # A4 for a quarter note at 120 bpm: half a second, then the release.
+    samples = audio(parse_symphony_lang("tempo=120\nA4 qn"))
+    assert len(samples) == round(SAMPLE_RATE * (0.5 + RELEASE_SECONDS))
+    held = samples[:SAMPLE_RATE // 2]
+    spectrum = np.abs(np.fft.rfft(held))
+    assert np.argmax(spectrum) * SAMPLE_RATE / len(held) == pytest.approx(440, abs=3)
+    assert np.abs(samples[-100:]).max() < 0.01
+
+    # A rest keeps its silence, and a trailing rest lengthens the audio.
+    samples = audio(parse_symphony_lang("tempo=120\nqr\nA4 qn\nhr"))
+    assert np.abs(samples[:SAMPLE_RATE // 2]).max() == 0
+    assert np.abs(samples[SAMPLE_RATE // 2:SAMPLE_RATE]).max() > 0.1
+    assert len(samples) == 2 * SAMPLE_RATE
+
+def test_chunk_size_does_not_change_the_audio():
+    composition = parse_symphony_lang(random_score(200))
+    whole = audio(composition, chunk_frames=1 << 30)
+    for chunk_frames in (1000, 4096, 44100):
+        chunks = list(render(composition, chunk_frames=chunk_frames))
+        assert all(len(chunk) == chunk_frames for chunk in chunks[:-1])
+        assert np.array_equal(np.concatenate(chunks), whole)
+
+def test_midi_renders_like_the_composition():
+    for source in (random_score(100), random_score(50, seed=1) + "\ntrack @bass { C2 wn G2 wn }"):
+        composition = parse_symphony_lang(source)
+        expected = audio(composition)
+        assert np.array_equal(audio(generate_midi(composition)), expected)
+        assert np.array_equal(audio(generate_midi(composition, compact=True, velocity_zero_note_offs=True)),
+                              expected)
+
+def test_render_wav(tmp_path):
+    composition = parse_symphony_lang(random_score(40))
+    path = tmp_path / "out.wav"
+    frames = render_wav(composition, str(path))
+    with wave.open(str(path), 'rb') as wav:
+        assert (wav.getnchannels(), wav.getsampwidth(), wav.getframerate()) == (1, 2, SAMPLE_RATE)
+        assert wav.getnframes() == frames
+        pcm = np.frombuffer(wav.readframes(frames), dtype='<i2')
+    expected = audio(composition)
+    assert np.abs(pcm / 32767 - expected).max() < 1e-4
+
+    buffer = io.BytesIO()
+    assert render_wav(generate_midi(composition), buffer) == frames
+    assert buffer.getvalue() == path.read_bytes()
+
+def test_memory_is_flat_for_long_pieces():
+    def peak(lines):
+        chunks = render(parse_symphony_lang(random_score(lines)))
+        tracemalloc.start()
+        for _ in chunks:
+            pass
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak
+
+    small, large = peak(50), peak(1000)
+    assert large < small * 2
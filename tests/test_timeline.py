@@ -0,0 +1,279 @@
+import random
+import time
+
+import pytest
+from src.midi_generator import generate_midi
+from src.parser import parse_symphony_lang
+from src.timeline import (KEYFRAME_INTERVAL, ActiveNotes, PlaybackClock, SkewStats, Timeline,
+                          build_timeline, timeline_from_composition)
+
+def timeline_of(score):
+    return build_timeline(generate_midi(parse_symphony_lang(score)))
+
+def test_timeline_times_and_events():
+    # At 120 bpm a quarter note lasts 0.5 s.
+    timeline = timeline_of("tempo=120\nC4 qn\nqr\n[C4 E4] hn")
+    assert timeline.events == [
+        (60, 64), (60, 0),
+        (0, 0), (0, 0),  # the rest's silent placeholder notes
+        (60, 64), (64, 64), (60, 0), (64, 0),
+    ]
+    assert timeline.times == pytest.approx([0.0, 0.5, 1.0, 1.0, 1.0, 1.0, 2.0, 2.0])
+    assert timeline.duration == pytest.approx(2.0)
+    assert len(timeline) == 8
+
+def test_advance_returns_events_due_by_now():
+    timeline = Timeline([0.0, 0.5, 0.5, 1.0], [(60, 64), (60, 0), (62, 64), (62, 0)], 1.0)
+    assert timeline.advance(0, -0.1) == 0
+    assert timeline.advance(0, 0.0) == 1
+    assert timeline.advance(1, 0.49) == 1
+    assert timeline.advance(1, 0.5) == 3
+    assert timeline.advance(3, 5.0) == 4
+    assert timeline.advance(4, 6.0) == 4
+
+def test_advance_skips_ahead_after_a_stall():
+    # A late frame applies everything that came due in one step.
+    timeline = timeline_of("tempo=240\n" + "C4 en\n" * 1000)
+    assert timeline.advance(0, timeline.duration) == len(timeline)
+
+def test_frame_work_is_independent_of_song_length():
+    # Advancing the clock one frame costs a binary search, not a scan over
+    # the events already played.
+    frame = 1 / 60
+    def frame_time(notes):
+        timeline = timeline_of("tempo=240\n" + "C4 sn\n" * notes)
+        index = timeline.advance(0, timeline.duration / 2)
+        start = time.perf_counter()
+        for step in range(1000):
+            index = timeline.advance(index, timeline.duration / 2 + step * frame)
+        elapsed = time.perf_counter() - start
+        assert index == timeline.advance(0, timeline.duration / 2 + 999 * frame)
+        return elapsed
+    frame_time(1000)  # warm up
+    short = min(frame_time(1000) for _ in range(3))
+    long = min(frame_time(20000) for _ in range(3))
+    assert long < short * 3
+
+def test_active_notes_on_off():
+    notes = ActiveNotes()
+    notes.note_on(60, 64, 0.5)
+    notes.note_on(48, 100, 0.75)
+    notes.note_on(60, 90, 1.0)  # restruck while sounding
+    assert len(notes) == 2
+    assert list(notes) == [(48, 100), (60, 90)]
+    assert notes.on_times[60] == 1.0
+    notes.note_on(48, 0)  # velocity 0 is a note-off
+    notes.note_off(72)  # not sounding
+    assert len(notes) == 1
+    assert 48 not in notes and 60 in notes
+    notes.clear()
+    assert len(notes) == 0 and list(notes) == []
+
+def test_active_notes_match_reference_under_heavy_polyphony():
+    rng = random.Random(13)
+    notes = ActiveNotes()
+    reference = {}
+    for step in range(200000):
+        pitch = rng.randrange(128)
+        if rng.random() < 0.6:
+            velocity = rng.randrange(128)
+            notes.note_on(pitch, velocity, step)
+            if velocity:
+                reference[pitch] = velocity
+            else:
+                reference.pop(pitch, None)
+        else:
+            notes.note_off(pitch)
+            reference.pop(pitch, None)
+        if step % 1000 == 0:
+            assert list(notes) == sorted(reference.items())
+    assert len(notes) == len(reference) > 64
+    assert list(notes) == sorted(reference.items())
+
+def test_active_note_updates_take_constant_time():
+    def time_updates(polyphony):
+        notes = ActiveNotes()
+        for pitch in range(polyphony):
+            notes.note_on(pitch, 64)
+        start = time.perf_counter()
+        for _ in range(20000):
+            notes.note_off(127)
+            notes.note_on(127, 64)
+        return time.perf_counter() - start
+    time_updates(1)  # warm up
+    few = min(time_updates(1) for _ in range(3))
+    many = min(time_updates(127) for _ in range(3))
+    assert many < few * 3
+
+def test_index_at():
+    timeline = Timeline([0.0, 0.5, 0.5, 1.0], [(60, 64), (60, 0), (62, 64), (62, 0)], 1.0)
+    assert timeline.index_at(0.0) == 0
+    assert timeline.index_at(0.5) == 1
+    assert timeline.index_at(0.7) == 3
+    assert timeline.index_at(2.0) == 4
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 100.0
+    def __call__(self):
+        return self.now
+
+def test_clock_without_audio_follows_timer():
+    timer = FakeTimer()
+    clock = PlaybackClock(timer=timer)
+    timer.now += 1.25
+    assert clock.now() == 1.25
+    assert clock.stats.samples == 0
+
+def test_clock_follows_drifting_audio():
+    # The audio runs 2% slow and reports its position in 20 ms steps, while
+    # the display ticks at 60 Hz for a 10 minute piece.
+    timer = FakeTimer()
+    audio = {'position': 0.0}
+    clock = PlaybackClock(lambda: audio['position'], timer=timer)
+    frame = 1 / 60
+    for frame_number in range(1, 36000):
+        timer.now += frame
+        elapsed = frame_number * frame
+        audio['position'] = int(elapsed * 0.98 / 0.02) * 0.02
+        position = clock.now()
+        # Within one audio step of the audio, where a free-running clock
+        # would be 12 seconds ahead by the end.
+        assert abs(position - audio['position']) <= 0.02 + frame
+    report = clock.stats.summary()
+    assert report['samples'] > 1000
+    assert report['max_ms'] < 25
+
+def test_clock_never_runs_backwards():
+    timer = FakeTimer()
+    audio = {'position': 0.0}
+    clock = PlaybackClock(lambda: audio['position'], timer=timer)
+    timer.now += 0.5
+    assert clock.now() == 0.0  # corrected to the audio
+    timer.now += 0.1
+    assert clock.now() == pytest.approx(0.1)
+    audio['position'] = 0.05  # the audio lags the estimate
+    assert clock.now() == pytest.approx(0.1)
+    assert clock.stats.last == pytest.approx(-0.05)
+    timer.now += 0.1
+    assert clock.now() == pytest.approx(0.15)
+
+def test_clock_reports_stopped_audio():
+    clock = PlaybackClock(lambda: None, timer=FakeTimer())
+    assert clock.now() is None
+
+def test_skew_stats_summary():
+    stats = SkewStats()
+    assert stats.summary() == {'samples': 0, 'mean_ms': 0.0, 'max_ms': 0.0, 'last_ms': 0.0}
+    for skew in (0.002, -0.004, 0.003):
+        stats.record(skew)
+    assert stats.summary() == pytest.approx({'samples': 3, 'mean_ms': 3.0, 'max_ms': 4.0, 'last_ms': 3.0})
+
+SEEK_LINES = ["C4 qn", "[C4 E4 G4] hn", "qr", "A3 min pent", "D#5 en", "[F3 A3 C4 E4] wn", "G2 sn"]
+
+def random_composition(seed, size):
+    rng = random.Random(seed)
+    return parse_symphony_lang("tempo=132\n" + "\n".join(rng.choice(SEEK_LINES) for _ in range(size)))
+
+def replayed_notes(timeline, index):
+    notes = ActiveNotes()
+    for note, velocity in timeline.events[:index]:
+        notes.note_on(note, velocity)
+    return list(notes)
+
+def test_timeline_from_composition_matches_decoded_midi():
+    composition = random_composition(1, 500)
+    decoded = build_timeline(generate_midi(composition))
+    timeline = timeline_from_composition(composition)
+    assert timeline.events == decoded.events
+    assert timeline.ticks == decoded.ticks
+    assert timeline.times == pytest.approx(decoded.times)
+    assert timeline.duration == pytest.approx(decoded.duration)
+    assert timeline.tempo == decoded.tempo == 454545
+
+def test_notes_at_matches_replay_from_start():
+    timeline = timeline_from_composition(random_composition(2, 2000))
+    assert len(timeline) > 4 * KEYFRAME_INTERVAL
+    rng = random.Random(2)
+    indices = [0, 1, KEYFRAME_INTERVAL - 1, KEYFRAME_INTERVAL, KEYFRAME_INTERVAL + 1, len(timeline)]
+    indices += [rng.randrange(len(timeline) + 1) for _ in range(200)]
+    for index in indices:
+        assert list(timeline.notes_at(index)) == replayed_notes(timeline, index)
+
+def test_notes_at_with_exact_keyframe_multiple():
+    events = [(60 + i % 2, 64 if i % 4 < 2 else 0) for i in range(2 * KEYFRAME_INTERVAL)]
+    timeline = Timeline([i * 0.1 for i in range(len(events))], events, 100.0)
+    assert list(timeline.notes_at(len(events))) == replayed_notes(timeline, len(events))
+
+def test_seek_cost_does_not_grow_with_position():
+    timeline = timeline_from_composition(parse_symphony_lang("tempo=120\n" + "[C4 E4 G4] en\n" * 20000))
+    def seek_time(base):
+        # Many positions, so the replay from the nearest keyframe averages out.
+        positions = [base + i * 0.37 for i in range(200)]
+        start = time.perf_counter()
+        for position in positions:
+            timeline.notes_at(timeline.index_at(position))
+        return time.perf_counter() - start
+    seek_time(0.0)  # warm up
+    early = min(seek_time(timeline.duration * 0.05) for _ in range(3))
+    late = min(seek_time(timeline.duration * 0.9) for _ in range(3))
+    assert late < early * 3
+
+def test_bar_time_and_ticks():
+    timeline = timeline_from_composition(parse_symphony_lang("tempo=120\nC4 wn"))
+    assert timeline.bar_time(1) == 0.0
+    assert timeline.bar_time(3) == pytest.approx(4.0)
+    assert timeline.tick_at(0.5) == 480
+    assert timeline.tick_time(480) == pytest.approx(0.5)
+
+def test_midi_from_start_plays_whole_song():
+    timeline = timeline_from_composition(random_composition(3, 300))
+    replay = build_timeline(timeline.midi_from(0.0))
+    assert replay.events == timeline.events
+    assert replay.ticks == timeline.ticks
+
+def test_midi_from_position_restrikes_sounding_notes():
+    # 120 bpm: the chord sounds from 0.5 s to 2.5 s.
+    timeline = timeline_from_composition(parse_symphony_lang("tempo=120\nC4 qn\n[E4 G4] wn\nA4 qn"))
+    replay = build_timeline(timeline.midi_from(1.0))
+    assert replay.events == [(64, 64), (67, 64), (64, 0), (67, 0), (69, 64), (69, 0)]
+    assert replay.times == pytest.approx([0.0, 0.0, 1.5, 1.5, 1.5, 2.0])
+
+def test_midi_from_region_lasts_exactly_the_region():
+    timeline = timeline_from_composition(random_composition(4, 400))
+    rng = random.Random(4)
+    for _ in range(20):
+        start, end = sorted(rng.uniform(0, timeline.duration) for _ in range(2))
+        start = timeline.tick_time(timeline.tick_at(start))
+        end = timeline.tick_time(timeline.tick_at(end))
+        if end <= start:
+            continue
+        replay = build_timeline(timeline.midi_from(start, end))
+        assert replay.duration == pytest.approx(end - start)
+        # Nothing is left sounding when the loop wraps around.
+        assert list(replay.notes_at(len(replay))) == []
+        first = timeline.index_at(start)
+        last = timeline.index_at(end)
+        sounding = list(timeline.notes_at(first))
+        assert replay.events[:len(sounding)] == sounding
+        assert replay.events[len(sounding):len(sounding) + last - first] == timeline.events[first:last]
+
+def test_clock_pause_and_resume():
+    timer = FakeTimer()
+    clock = PlaybackClock(timer=timer)
+    timer.now += 1.0
+    clock.pause()
+    timer.now += 5.0
+    assert clock.now() == 1.0
+    clock.resume()
+    timer.now += 0.5
+    assert clock.now() == pytest.approx(1.5)
+
+def test_timeline_merges_tracks():
+    composition = parse_symphony_lang("tempo=120\ntrack { C4 hn E4 hn }\ntrack { G3 qn qr A3 hn }\nC2 wn")
+    decoded = build_timeline(generate_midi(composition))
+    timeline = timeline_from_composition(composition)
+    assert timeline.events == decoded.events
+    assert timeline.ticks == decoded.ticks
+    assert timeline.duration == pytest.approx(decoded.duration) == pytest.approx(2.0)
+    assert list(timeline.notes_at(timeline.index_at(0.1))) == [(36, 64), (55, 64), (60, 64)]
@@ -0,0 +1,80 @@
+import colorsys
+import random
+import tkinter as tk
+
+import pytest
+from src.gui.visualizer import BAR_HEIGHTS, COLOR_TABLE, Visualizer
+
+@pytest.fixture
+def root():
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        pytest.skip("no display available")
+    root.withdraw()
+    yield root
+    root.destroy()
+
+def reference_color(pitch, velocity):
+    # The per-note computation draw_bar_chart used to do.
+    note_in_octave = (pitch - 21) % 12
+    rgb = colorsys.hsv_to_rgb(note_in_octave / 12, 0.7, 0.8 + ((velocity / 127) * 0.2))
+    return f'#{int(rgb[0]*255):02x}{int(rgb[1]*255):02x}{int(rgb[2]*255):02x}'
+
+def test_color_table_matches_hsv_colors():
+    assert len(COLOR_TABLE) == 128
+    for pitch in range(128):
+        assert len(COLOR_TABLE[pitch]) == 128
+        for velocity in range(128):
+            assert COLOR_TABLE[pitch][velocity] == reference_color(pitch, velocity)
+
+def test_bar_heights():
+    assert BAR_HEIGHTS[21] == 0
+    assert BAR_HEIGHTS[108] == 180
+    assert BAR_HEIGHTS[60] == pytest.approx((60 - 21) / 87 * 180)
+
+def test_bars_are_reused_across_redraws(root):
+    visualizer = Visualizer(root)
+    canvas = visualizer.visualization_canvas
+    visualizer.apply_events([(60, 64), (64, 64), (67, 64)])
+    visualizer.draw_bar_chart()
+    items = canvas.find_all()
+    assert len(items) == 3
+
+    visualizer.apply_events([(64, 0)])
+    visualizer.draw_bar_chart()
+    assert canvas.find_all() == items
+    visible = [item for item in items if canvas.itemcget(item, "state") != "hidden"]
+    assert len(visible) == 2
+    assert canvas.itemcget(visualizer.bars[64], "state") == "hidden"
+    assert canvas.itemcget(visualizer.bars[67], "fill") == COLOR_TABLE[67][64]
+
+    visualizer.stop_visualization()
+    assert canvas.find_all() == items
+    assert all(canvas.itemcget(item, "state") == "hidden" for item in items)
+
+def test_dense_events_keep_one_bar_per_key(root):
+    # Random polyphony up to 16 voices, drawn once per batch of events as
+    # _tick does once per frame.
+    rng = random.Random(12)
+    events = []
+    sounding = set()
+    for _ in range(50000):
+        if len(sounding) < 16 and (not sounding or rng.random() < 0.5):
+            note = rng.randrange(21, 109)
+            sounding.add(note)
+            events.append((note, rng.randrange(1, 128)))
+        else:
+            note = rng.choice(sorted(sounding))
+            sounding.discard(note)
+            events.append((note, 0))
+
+    visualizer = Visualizer(root)
+    for i in range(0, len(events), 8):
+        visualizer.apply_events(events[i:i + 8])
+        visualizer.draw_bar_chart()
+    canvas = visualizer.visualization_canvas
+    # One bar per piano key, shown exactly for the sounding notes.
+    assert len(canvas.find_all()) <= 88
+    visible = [item for item in canvas.find_all() if canvas.itemcget(item, "state") != "hidden"]
+    assert len(visible) == len(visualizer.active_notes) == len(sounding)
@@ -0,0 +1,132 @@
+import time
+
+import pytest
+from src.worker import CompileWorker
+from src.cache import source_digest
+from src.midi_generator import generate_midi
+from src.parser import parse_symphony_lang
+
+def wait_for(worker, request_id, timeout=30):
+    """Polls like the GUI does until request_id finishes; returns all its results."""
+    results = []
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        for result in worker.poll():
+            if result[1] == request_id:
+                results.append(result)
+                if result[0] != 'progress':
+                    return results
+        time.sleep(0.005)
+    raise AssertionError("compile did not finish")
+
+def segmented_score(segments, lines_per_segment=10):
+    segment = "\n".join(["C4 qn", "[C4 E4 G4] hn", "qr", "A3 min"] * (lines_per_segment // 4 + 1))
+    # Numbered so no segment is served from the segment cache.
+    return "tempo=120\n" + "\n\n".join(f"{segment}\n# {i}" for i in range(segments))
+
+@pytest.fixture
+def worker():
+    worker = CompileWorker()
+    yield worker
+    worker.close()
+
+def test_compiles_in_background(worker):
+    source = "tempo=120\nC4 qn\n\nE4 qn"
+    results = wait_for(worker, worker.submit(source))
+    kind, _, (composition, midi_data, timeline) = results[-1]
+    assert kind == 'done'
+    assert midi_data == generate_midi(parse_symphony_lang(source))
+    assert composition.tempo == 120
+    assert timeline.events == [(60, 64), (60, 0), (64, 64), (64, 0)]
+
+def test_reports_progress_per_segment(worker):
+    results = wait_for(worker, worker.submit(segmented_score(20)))
+    progress = [payload for kind, _, payload in results if kind == 'progress']
+    # One per segment, and one once the MIDI is encoded.
+    assert len(progress) == 21
+    assert progress == sorted(progress)
+    assert 0 < progress[0] and progress[-1] <= 1.0
+    assert results[-1][0] == 'done'
+
+def test_reports_errors(worker):
+    results = wait_for(worker, worker.submit("tempo=120\nC4 xx"))
+    kind, _, error = results[-1]
+    assert kind == 'error'
+    assert "Syntax error" in str(error) or "Lexer error" in str(error)
+    # The worker survives and keeps compiling.
+    assert wait_for(worker, worker.submit("tempo=120\nC4 qn"))[-1][0] == 'done'
+
+def test_newer_request_cancels_stale_compile(worker):
+    big_source = segmented_score(3000)
+    big = worker.submit(big_source)
+    # Let the big compile get under way, then supersede it.
+    deadline = time.monotonic() + 30
+    while not any(kind == 'progress' for kind, _, _ in worker.poll()):
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+    small = worker.submit("tempo=120\nD4 qn")
+    results = wait_for(worker, small)
+    assert results[-1][0] == 'done'
+    time.sleep(0.05)
+    stale = [result for result in worker.poll() if result[1] == big]
+    assert all(kind == 'progress' for kind, _, _ in stale)
+    assert source_digest(big_source) not in worker.cache.scores  # never finished
+
+def test_newer_request_cancels_stale_encoding(worker):
+    # A one-line score whose encoding takes far longer than its parse.
+    huge = worker.submit("tempo=120\nrepeat 1000000 { C4 sn [E4 G4] sn }")
+    deadline = time.monotonic() + 30
+    while not any(kind == 'progress' for kind, _, _ in worker.poll()):
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+    start = time.perf_counter()
+    results = wait_for(worker, worker.submit("tempo=120\nD4 qn"))
+    answered = time.perf_counter() - start
+    assert results[-1][0] == 'done'
+    # Quicker than encoding even a tenth of the stale score.
+    start = time.perf_counter()
+    generate_midi(parse_symphony_lang("tempo=120\nrepeat 100000 { C4 sn [E4 G4] sn }"), fast=True)
+    assert answered < time.perf_counter() - start
+    time.sleep(0.05)
+    assert all(kind == 'progress' for kind, request_id, _ in worker.poll() if request_id == huge)
+
+def test_long_scores_report_progress_without_blank_lines(worker):
+    source = "tempo=120\n" + "\n".join(["C4 qn", "[C4 E4 G4] hn", "qr", "A3 min"] * 2500)
+    results = wait_for(worker, worker.submit(source))
+    assert results[-1][0] == 'done'
+    assert len([kind for kind, _, _ in results if kind == 'progress']) > 10
+
+def test_waiting_requests_are_dropped(worker):
+    ids = [worker.submit(f"tempo=120\nC4 qn\n# {i}") for i in range(50)]
+    results = wait_for(worker, ids[-1])
+    assert results[-1][0] == 'done'
+    time.sleep(0.05)
+    assert not [result for result in worker.poll() if result[0] == 'done']
+    assert len(worker.cache.scores) < 50
+
+def test_caller_stays_responsive_during_large_compile(worker):
+    # 100k lines: the polling thread, standing in for the Tk event loop,
+    # keeps getting scheduled while the worker compiles.
+    source = "tempo=120\n" + "\n".join(["C4 qn", "[C4 E4 G4] hn", "qr", "A3 min"] * 25000)
+    request_id = worker.submit(source)
+    longest_gap = 0.0
+    last = time.perf_counter()
+    results = []
+    while not results or results[-1][0] == 'progress':
+        time.sleep(0.001)
+        now = time.perf_counter()
+        longest_gap = max(longest_gap, now - last)
+        last = now
+        results += [result for result in worker.poll() if result[1] == request_id]
+    assert results[-1][0] == 'done'
+    assert longest_gap < 0.1
+
+def test_renders_a_parsed_composition(worker):
+    source = "tempo=120\nC4 qn"
+    composition = parse_symphony_lang(source)
+    results = wait_for(worker, worker.submit(source, composition))
+    kind, _, (rendered, midi_data, _) = results[-1]
+    assert kind == 'done'
+    assert rendered is composition
+    assert midi_data == generate_midi(composition)
+    assert worker.cache.misses == 0